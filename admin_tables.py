@@ -0,0 +1,168 @@
+import pandas as pd
+
+from document_schema import canonical_certificates
+
+# ✅ Display columns of the admin tables (formatting is applied at render time by app.py column configs)
+EMPLOYEE_COLUMNS = [
+    "worker_id", "first_name", "middle_name", "sur_name", "phone_number", "home_address", "have_car",
+    "role", "skills", "certificates", "availability", "rating"
+]
+JOB_SITE_COLUMNS = [
+    "Site ID", "Job Status", "Work Start Date", "Work End Date", "Site Name", "Company",
+    "Superintendent", "Contact Number", "Address", "# Required Workers", "# Filled", "# Open", "Required Roles"
+]
+ASSIGNMENT_COLUMNS = [
+    "Site Name", "Company", "Address", "Num Workers", "Required Role", "Full Name", "Phone Number",
+    "Home Address", "Has Car", "Employee Role", "Skills", "Certificates", "Availability", "Rating", "Distance (km)"
+]
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Vectorized helpers
+
+def _column(df, name, default=None):
+    """Column from a raw frame, or a column of `default` when no record has the field."""
+    return df[name] if name in df else pd.Series(default, index=df.index, dtype=object)
+
+
+def join_lists(series, missing="N/A"):
+    """
+    ", ".join for a column holding lists, single strings or nothing.
+
+    explode() turns every list into rows (strings stay scalars); the rows are
+    pivoted by their position in the list and concatenated column by column,
+    so the cost is a few vectorized string ops, not one Python call per row.
+    """
+    exploded = series.explode()
+    exploded = exploded[exploded.notna()].astype(str)
+    exploded = exploded[exploded != ""]
+    index = series.index.unique()  # Input may already be exploded
+    if exploded.empty:
+        return pd.Series(missing, index=index, dtype=object)
+
+    position = exploded.groupby(level=0).cumcount()
+    wide = exploded.to_frame("value").set_index(position, append=True)["value"].unstack()
+    joined = wide[0]
+    for col in wide.columns[1:]:
+        joined = joined.where(wide[col].isna(), joined + ", " + wide[col])
+    return joined.reindex(index).fillna(missing)
+
+
+def certificate_labels(series):
+    """
+    Certificates ({name: {"issue_date", "expiration_date"}}, or a legacy list
+    of names) as one "name (Issued: ..., Exp: ...)" label per row; rows
+    without any stay missing.
+    """
+    pairs = series.dropna().map(lambda certificates: list(canonical_certificates(certificates).items())).explode().dropna()
+    if pairs.empty:
+        return pd.Series(None, index=series.index, dtype=object)
+    info = pd.DataFrame(pairs.str[1].tolist(), index=pairs.index).reindex(columns=["issue_date", "expiration_date"])
+    labels = (
+        pairs.str[0].astype(str) + " (Issued: " + info["issue_date"].fillna("N/A").astype(str)
+        + ", Exp: " + info["expiration_date"].fillna("N/A").astype(str) + ")"
+    )
+    return pd.concat([labels, pd.Series(None, index=series.index.difference(labels.index), dtype=object)])
+
+
+def full_name(first, middle, last):
+    return (
+        first.fillna("N/A").astype(str).str.cat([middle.fillna("").astype(str), last.fillna("N/A").astype(str)], sep=" ")
+        .str.replace(r"\s+", " ", regex=True).str.strip()
+    )
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Table builders: raw Firestore dicts in, typed display frames out
+
+def employees_frame(records):
+    raw = pd.DataFrame.from_records(records, index=range(len(records))) if records else pd.DataFrame(index=pd.RangeIndex(0))
+    df = pd.DataFrame(index=raw.index)
+    for col in ["worker_id", "first_name", "middle_name", "sur_name", "phone_number", "home_address"]:
+        df[col] = _column(raw, col).fillna("N/A").astype(str)
+    df["have_car"] = _column(raw, "have_car").fillna("No").astype("category")
+    for col in ["role", "skills", "availability"]:
+        df[col] = join_lists(_column(raw, col))
+    df["certificates"] = join_lists(certificate_labels(_column(raw, "certificates")), missing="None")
+    df["rating"] = pd.to_numeric(_column(raw, "rating"), errors="coerce").astype("float64")
+    return df[EMPLOYEE_COLUMNS]
+
+
+def _required_roles_long(sites):
+    """One row per (site, role) with its headcount and shifts."""
+    rows = [
+        (index, role, details.get("num_workers", 0), details.get("work_schedule", []))
+        for index, roles in sites["required_roles"].dropna().items()
+        for role, details in roles.items()
+    ]
+    return pd.DataFrame(rows, columns=["site", "role", "num_workers", "work_schedule"])
+
+
+def job_sites_frame(records, coverage=None):
+    """Job sites table; `coverage` documents (coverage.CoverageStore) fill "# Filled" / "# Open", empty before any run."""
+    raw = pd.DataFrame.from_records(records, index=range(len(records))) if records else pd.DataFrame(index=pd.RangeIndex(0))
+    raw["required_roles"] = _column(raw, "required_roles")
+    roles = _required_roles_long(raw)
+    roles["label"] = (
+        roles["role"].astype(str) + " (" + roles["num_workers"].astype(str) + " workers, "
+        + join_lists(roles["work_schedule"], missing="").astype(str) + ")"
+    )
+    grouped = roles.groupby("site")
+
+    df = pd.DataFrame(index=raw.index)
+    df["Site ID"] = _column(raw, "site_id").fillna("N/A").astype(str)
+    df["Job Status"] = _column(raw, "job_status").fillna("N/A").astype("category")
+    df["Work Start Date"] = pd.to_datetime(_column(raw, "work_start_date"), errors="coerce")
+    df["Work End Date"] = pd.to_datetime(_column(raw, "work_end_date"), errors="coerce")
+    df["Site Name"] = _column(raw, "site_name").fillna("N/A").astype(str)
+    df["Company"] = _column(raw, "site_company").fillna("N/A").astype(str)
+    df["Superintendent"] = _column(raw, "site_superintendent").fillna("N/A").astype(str)
+    df["Contact Number"] = _column(raw, "site_contact_number").fillna("N/A").astype(str)
+    df["Address"] = _column(raw, "address").fillna("N/A").astype(str)
+    df["# Required Workers"] = grouped["num_workers"].sum().reindex(df.index).fillna(0).astype("int64")
+    counters = pd.DataFrame.from_records(coverage or [], columns=["site_id", "filled", "open"]).drop_duplicates("site_id").set_index("site_id")
+    df["# Filled"] = df["Site ID"].map(counters["filled"]).astype("Int64")
+    df["# Open"] = df["Site ID"].map(counters["open"]).astype("Int64")
+    df["Required Roles"] = join_lists(roles.set_index("site")["label"]).reindex(df.index).fillna("N/A")
+    return df[JOB_SITE_COLUMNS]
+
+
+def assignments_frame(assignments, employees, job_sites):
+    """Joins assignments with employees (on worker_id) and job sites (on site_id) with merges, not per-row lookups."""
+    if not assignments:
+        return pd.DataFrame(columns=ASSIGNMENT_COLUMNS)
+
+    a = pd.DataFrame.from_records(assignments)
+    e = pd.DataFrame.from_records(employees) if employees else pd.DataFrame(columns=["worker_id"])
+    s = pd.DataFrame.from_records(job_sites) if job_sites else pd.DataFrame(columns=["site_id", "required_roles"])
+    if "required_roles" not in s:
+        s["required_roles"] = None
+    s = s.reset_index(drop=True)
+    s["num_workers"] = _required_roles_long(s).groupby("site")["num_workers"].sum().reindex(s.index).fillna(0).astype("int64")
+
+    e = e.drop_duplicates("worker_id").add_prefix("emp_")
+    s = s.drop_duplicates("site_id").add_prefix("site_")
+    df = (
+        a.merge(e, how="left", left_on="employee_id", right_on="emp_worker_id")
+         .merge(s, how="left", left_on="job_site_id", right_on="site_site_id")
+    )
+
+    out = pd.DataFrame(index=df.index)
+    out["Site Name"] = _column(df, "site_site_name").fillna("N/A").astype(str)
+    out["Company"] = _column(df, "site_site_company").fillna("N/A").astype(str)
+    out["Address"] = _column(df, "site_address").fillna("N/A").astype(str)
+    out["Num Workers"] = _column(df, "site_num_workers").fillna(0).astype("int64")
+    out["Required Role"] = _column(df, "role").fillna("N/A").astype(str)
+    out["Full Name"] = full_name(_column(df, "emp_first_name"), _column(df, "emp_middle_name"), _column(df, "emp_sur_name"))
+    out["Phone Number"] = _column(df, "emp_phone_number").fillna("N/A").astype(str)
+    out["Home Address"] = _column(df, "emp_home_address").fillna("N/A").astype(str)
+    out["Has Car"] = _column(df, "emp_have_car").fillna("N/A").astype("category")
+    out["Employee Role"] = join_lists(_column(df, "emp_role"))
+    out["Skills"] = join_lists(_column(df, "emp_skills"))
+    out["Certificates"] = join_lists(certificate_labels(_column(df, "emp_certificates")))
+    out["Availability"] = join_lists(_column(df, "emp_availability"))
+    out["Rating"] = pd.to_numeric(_column(df, "emp_rating"), errors="coerce").astype("float64")
+    out["Distance (km)"] = pd.to_numeric(_column(df, "distance"), errors="coerce").astype("float64")
+    return out[ASSIGNMENT_COLUMNS]
@@ -0,0 +1,469 @@
+import heapq
+import random
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from assignment_engine import AVAILABILITY_POINTS, CAR_POINTS, NEARBY_KM, NEARBY_POINTS, ROLE_MATCH_POINTS
+from feasibility import _coordinates, _distances_km
+
+# ✅ Objective: fill as many positions as possible, then maximize total score, then prefer shorter trips
+COVERAGE_WEIGHT = 1000      # One filled position outweighs any score difference
+DISTANCE_TIEBREAK = 1e-3    # Per km; capped so it never outweighs a single point
+MAX_TIEBREAK_KM = 500
+SEARCH_DEPTH = 200          # Top-ranked candidates per slot the local search looks at
+PROGRESS_INTERVAL = 0.5     # Seconds between progress callbacks
+KICK_FRACTION = 0.05        # Share of slots shaken up per restart once the search has converged
+STALE_RESTARTS = 20         # Stop early after this many restarts without a better solution
+EPSILON = 1e-9
+
+
+def utility(candidate):
+    return candidate['score'] - DISTANCE_TIEBREAK * min(candidate['distance'], MAX_TIEBREAK_KM)
+
+
+def load_warm_start(db):
+    """(run_id, [(worker_id, site_id, role), ...]) of the current run; read it before the run is replaced."""
+    current = db.collection("assignment_runs").document("current").get()
+    run_id = current.get("run_id") if current.exists else None
+    if not run_id:
+        return None, []
+    docs = db.collection("assignments").where("run_id", "==", run_id).select(["employee_id", "job_site_id", "role"]).stream()
+    return run_id, [(doc.get("employee_id"), doc.get("job_site_id"), doc.get("role")) for doc in docs]
+
+
+class _Roster:
+    """
+    The employees as column arrays, built once per solve, so that ranking a
+    slot is a few vectorized operations over the workers with its role
+    (same points and ordering as assignment_engine.score_candidates; distances
+    are great-circle instead of geodesic).
+    """
+
+    def __init__(self, employees):
+        self.employees = employees
+        self.points = np.radians(_coordinates(employees))
+        self.car = np.array([e.get('have_car', 'No') == 'Yes' for e in employees], dtype=bool)
+        self.fairness = np.array([e.get('fairness_penalty', 0) for e in employees], dtype=float)
+        self.rating = np.array([e.get('rating', 0) or 0 for e in employees], dtype=float)
+        self.worker_ids = np.array([e['worker_id'] for e in employees], dtype=object)
+        self.row_of = {worker_id: row for row, worker_id in enumerate(self.worker_ids)}
+        role_rows, self.availability = defaultdict(list), defaultdict(lambda: np.zeros(len(employees), dtype=bool))
+        for row, employee in enumerate(employees):
+            for role in employee.get('role', []):
+                role_rows[role].append(row)
+            for shift in employee.get('availability', []):
+                self.availability[shift][row] = True
+        self.role_rows = {role: np.array(rows, dtype=np.int64) for role, rows in role_rows.items()}
+
+    def rank(self, site, role, role_data, depth):
+        """The slot's _Ranking over every worker with the role; only the best `depth` (and ties) are sorted up front."""
+        rows = self.role_rows.get(role, np.zeros(0, dtype=np.int64))
+        work_schedule = role_data.get('work_schedule', [])
+        available = np.array([self.availability[shift][rows] if shift in self.availability else np.zeros(len(rows), dtype=bool)
+                              for shift in work_schedule], dtype=bool).reshape(len(work_schedule), len(rows))
+        matched = available.any(axis=0)
+        shifts = np.where(matched, available.argmax(axis=0), 0) if work_schedule else None
+
+        if site.get('latitude') is None or site.get('longitude') is None:
+            distances = np.full(len(rows), np.inf)
+        else:
+            with np.errstate(invalid='ignore'):
+                distances = _distances_km(self.points[rows], site['latitude'], site['longitude'])
+            distances = np.where(np.isnan(distances), np.inf, distances)
+
+        # ✅ Points per criterion, in SCORE_COMPONENTS order (kept for explanations)
+        components = np.column_stack([
+            np.full(len(rows), ROLE_MATCH_POINTS, dtype=float),
+            np.where(matched, AVAILABILITY_POINTS, 0),
+            np.where(self.car[rows], CAR_POINTS, 0),
+            np.where(distances <= NEARBY_KM, NEARBY_POINTS, 0),
+            -self.fairness[rows]
+        ])
+        return _Ranking(self.employees, self.worker_ids, work_schedule, rows, components.sum(axis=1), components, distances,
+                        self.rating[rows], shifts, depth)
+
+
+class _Ranking:
+    """
+    A slot's candidates best first. Only the top `depth` by score (with every
+    tie at the cut) are sorted when the slot is ranked; the rest are sorted in
+    doubling blocks the first time a rank past them is read. Candidate dicts
+    are built per rank read.
+    """
+
+    def __init__(self, employees, worker_ids, work_schedule, rows, scores, components, distances, ratings, shifts, depth):
+        self.employees, self.worker_ids, self.work_schedule = employees, worker_ids, work_schedule
+        self.rows, self.scores, self.components, self.distances, self.shifts = rows, scores, components, distances, shifts
+        self.ratings = ratings
+        self.utilities = scores - DISTANCE_TIEBREAK * np.minimum(distances, MAX_TIEBREAK_KM)  # utility() per row
+        self.order, self._tail = np.zeros(0, dtype=np.int64), np.arange(len(rows))
+        self._sort_next(depth)
+        self._candidates = {}
+
+    def _sort_next(self, count):
+        """Moves the best `count` unsorted candidates (and every tie at the cut) to the end of `order`, sorted."""
+        tail = self._tail
+        if 0 < count < len(tail):
+            cut = self.scores[tail[np.argpartition(-self.scores[tail], count - 1)[count - 1]]]
+            head, self._tail = tail[self.scores[tail] >= cut], tail[self.scores[tail] < cut]
+        else:
+            head, self._tail = tail, tail[:0]
+        head = head[np.lexsort((-self.ratings[head], self.distances[head], -self.scores[head]))]  # candidate_priority
+        self.order = np.concatenate([self.order, head])
+
+    def _sorted_to(self, stop):
+        while stop > len(self.order) and len(self._tail):
+            self._sort_next(max(stop - len(self.order), len(self.order)))
+        return self.order
+
+    def rank_of(self, row):
+        """Rank of the roster row in this slot, or None when the worker lacks the role."""
+        i = np.searchsorted(self.rows, row)  # Role rows are in roster order
+        if i == len(self.rows) or self.rows[i] != row:
+            return None
+        ranks = np.flatnonzero(self.order == i)
+        if not len(ranks):
+            ranks = np.flatnonzero(self._sorted_to(len(self.rows)) == i)
+        return int(ranks[0])
+
+    def utility(self, rank):
+        return self.utilities[self._sorted_to(rank + 1)[rank]]
+
+    def roster_rows(self, start, stop):
+        """Roster rows of the candidates ranked start..stop-1, without building their dicts."""
+        return self.rows[self._sorted_to(stop)[start:stop]]
+
+    def worker_id(self, rank):
+        return self.worker_ids[self.rows[self._sorted_to(rank + 1)[rank]]]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return (self[rank] for rank in range(len(self)))
+
+    def __getitem__(self, rank):
+        if isinstance(rank, slice):
+            return [self[i] for i in range(*rank.indices(len(self)))]
+        if not 0 <= rank < len(self):
+            raise IndexError(rank)
+        candidate = self._candidates.get(rank)
+        if candidate is None:
+            i = self._sorted_to(rank + 1)[rank]
+            points = self.components[i]
+            candidate = self._candidates[rank] = {
+                'employee': self.employees[self.rows[i]],
+                'score': float(self.scores[i]),
+                'components': tuple(int(p) for p in points[:-1]) + (float(points[-1]),),
+                'distance': float(self.distances[i]),
+                'shift': self.work_schedule[self.shifts[i]] if self.shifts is not None else None
+            }
+        return candidate
+
+
+class _Slot:
+    """One (site, role): its full ranking, the indexed top of it, and the workers currently placed."""
+    __slots__ = ("site", "role", "capacity", "ranking", "workers", "index", "members")
+
+    def __init__(self, site, role, capacity, ranking):
+        self.site, self.role, self.capacity, self.ranking = site, role, capacity, ranking
+        self.workers, self.index, self.members = [], {}, set()
+        self.extend(SEARCH_DEPTH + capacity)
+
+    def extend(self, depth):
+        """Indexes the ranking down to `depth`, the window the local search looks at."""
+        start = len(self.workers)
+        added = self.ranking.worker_ids[self.ranking.roster_rows(start, depth)].tolist()
+        self.index.update(zip(added, range(start, start + len(added))))  # A worker has one rank per slot
+        self.workers.extend(added)
+
+    def reach(self, worker_id, rank):
+        """Indexes one worker the fill places below the search window."""
+        self.index.setdefault(worker_id, rank)
+
+    def candidate(self, worker_id):
+        return self.ranking[self.index[worker_id]]
+
+    def utility(self, worker_id):
+        return utility(self.candidate(worker_id))
+
+
+class _Search:
+    def __init__(self, slots, roster, seed):
+        self.slots = slots
+        self.slot_of = {}  # worker_id -> _Slot
+        self.row_of, self.taken = roster.row_of, np.zeros(len(roster.employees), dtype=bool)  # Roster rows of placed workers
+        self.filled, self.utility, self.score, self.moves, self.changes = 0, 0.0, 0, 0, 0
+        self.rng = random.Random(seed)
+        self._free_cache = {}  # id(slot) -> (changes, first free worker) while nothing has moved
+
+    def objective(self):
+        return self.filled * COVERAGE_WEIGHT + self.utility
+
+    def place(self, worker_id, slot):
+        slot.members.add(worker_id)
+        self.slot_of[worker_id] = slot
+        self.taken[self.row_of[worker_id]] = True
+        self.filled += 1
+        self.utility += slot.utility(worker_id)
+        self.score += slot.candidate(worker_id)['score']
+        self.changes += 1
+
+    def remove(self, worker_id):
+        slot = self.slot_of.pop(worker_id)
+        slot.members.discard(worker_id)
+        self.taken[self.row_of[worker_id]] = False
+        self.filled -= 1
+        self.utility -= slot.utility(worker_id)
+        self.score -= slot.candidate(worker_id)['score']
+        self.changes += 1
+
+    def snapshot(self):
+        return dict(self.slot_of)
+
+    def restore(self, snapshot):
+        for worker_id in list(self.slot_of):
+            self.remove(worker_id)
+        for worker_id, slot in snapshot.items():
+            self.place(worker_id, slot)
+
+    # ✅ Construction: warm start, then a global best-first fill
+
+    def warm_start(self, previous):
+        """Keeps previous placements that are still valid (slot exists, worker still has the role, capacity left)."""
+        slots = {(slot.site['site_id'], slot.role): slot for slot in self.slots}
+        kept = 0
+        for worker_id, site_id, role in previous:
+            slot = slots.get((site_id, role))
+            if slot is None or worker_id not in self.row_of or worker_id in self.slot_of or len(slot.members) >= slot.capacity:
+                continue
+            rank = slot.index[worker_id] if worker_id in slot.index else slot.ranking.rank_of(self.row_of[worker_id])
+            if rank is None:
+                continue
+            slot.reach(worker_id, rank)
+            self.place(worker_id, slot)
+            kept += 1
+        return kept
+
+    def _next_free(self, slot, start):
+        """Rank of the first unplaced candidate from `start` on, scanned in growing chunks of the ranking."""
+        chunk = slot.capacity + 8
+        while start < len(slot.ranking):
+            free = np.flatnonzero(~self.taken[slot.ranking.roster_rows(start, start + chunk)])
+            if len(free):
+                return start + int(free[0])
+            start, chunk = start + chunk, chunk * 2
+        return None
+
+    def fill(self):
+        """Fills open positions across all slots in order of utility, not in site order."""
+        heap = []
+        for i, slot in enumerate(self.slots):
+            rank = self._next_free(slot, 0) if len(slot.members) < slot.capacity else None
+            if rank is not None:
+                heap.append((-slot.ranking.utility(rank), i, rank))
+        heapq.heapify(heap)
+        while heap:
+            _, i, rank = heapq.heappop(heap)
+            slot = self.slots[i]
+            worker_id = slot.ranking.worker_id(rank)
+            if worker_id not in self.slot_of:
+                slot.reach(worker_id, rank)
+                self.place(worker_id, slot)
+                start = rank + 1
+            else:
+                start = rank  # Taken by a better slot since it was pushed
+            rank = self._next_free(slot, start) if len(slot.members) < slot.capacity else None
+            if rank is not None:
+                heapq.heappush(heap, (-slot.ranking.utility(rank), i, rank))
+
+    def fill_in_order(self):
+        """Fills each slot in site order with its best free workers, as solve_greedy does."""
+        for slot in self.slots:
+            rank = 0
+            while len(slot.members) < slot.capacity:
+                rank = self._next_free(slot, rank)
+                if rank is None:
+                    break
+                worker_id = slot.ranking.worker_id(rank)
+                slot.reach(worker_id, rank)
+                self.place(worker_id, slot)
+                rank += 1
+
+    def kept(self, previous):
+        """How many of the previous placements the current solution still has."""
+        return sum(
+            1 for worker_id, site_id, role in previous
+            if worker_id in self.slot_of and (self.slot_of[worker_id].site['site_id'], self.slot_of[worker_id].role) == (site_id, role)
+        )
+
+    # ✅ Local search: move a better-ranked worker into a slot and refill the slot they leave
+
+    def _first_free(self, slot):
+        cached = self._free_cache.get(id(slot))
+        if cached and cached[0] == self.changes:
+            return cached[1]
+        found = next((w for w in slot.workers[:SEARCH_DEPTH + slot.capacity] if w not in self.slot_of), None)
+        self._free_cache[id(slot)] = (self.changes, found)
+        return found
+
+    def _refill(self, slot, freed):
+        """Best worker for `slot` among its first free candidate and `freed` (who is about to become free)."""
+        best = self._first_free(slot)
+        if freed in slot.index and (best is None or slot.index[freed] < slot.index[best]):
+            return freed
+        return best
+
+    def improve(self, slot):
+        applied = 0
+        for worker_id in slot.workers[:SEARCH_DEPTH + slot.capacity]:
+            if worker_id in slot.members:
+                continue
+            gain = slot.utility(worker_id)
+            worst = min(slot.members, key=slot.utility) if len(slot.members) >= slot.capacity else None
+            if worst is not None:
+                if gain <= slot.utility(worst) + EPSILON:
+                    break  # The ranking is sorted: nobody further down beats the weakest member
+                gain -= slot.utility(worst)
+            else:
+                gain += COVERAGE_WEIGHT
+
+            source, refill = self.slot_of.get(worker_id), None
+            if source is not None:
+                refill = self._refill(source, worst)
+                gain -= source.utility(worker_id)
+                gain += source.utility(refill) if refill is not None else -COVERAGE_WEIGHT
+
+            if gain > EPSILON:
+                self._move(worker_id, slot, worst, source, refill)
+                self.moves += 1
+                applied += 1
+        return applied
+
+    def _move(self, worker_id, slot, worst, source, refill):
+        if worst is not None:
+            self.remove(worst)
+        if source is not None:
+            self.remove(worker_id)
+            if refill is not None:
+                self.place(refill, source)
+        self.place(worker_id, slot)
+
+    def kick(self):
+        """Forces a random (not necessarily improving) move into a few random slots, to leave a local optimum."""
+        for slot in self.rng.sample(self.slots, max(1, int(len(self.slots) * KICK_FRACTION))):
+            outsiders = [w for w in slot.workers[:SEARCH_DEPTH + slot.capacity] if w not in slot.members]
+            if not outsiders:
+                continue
+            worker_id = self.rng.choice(outsiders)
+            worst = self.rng.choice(sorted(slot.members)) if len(slot.members) >= slot.capacity else None
+            source = self.slot_of.get(worker_id)
+            self._move(worker_id, slot, worst, source, self._refill(source, worst) if source is not None else None)
+
+    def sweep(self, deadline, after_slot=None):
+        """One pass of improving moves over all slots in random order; returns (moves applied, completed)."""
+        order = list(self.slots)
+        self.rng.shuffle(order)
+        applied = 0
+        for slot in order:
+            if time.monotonic() >= deadline:
+                return applied, False
+            applied += self.improve(slot)
+            if after_slot:
+                after_slot()
+        return applied, True
+
+    def picks(self):
+        return [
+            {**slot.candidate(worker_id), 'site': slot.site, 'role': slot.role}
+            for slot in self.slots
+            for worker_id in sorted(slot.members, key=slot.index.get)
+        ]
+
+
+def solve_anytime(employees, job_sites, previous=(), time_budget=30.0, on_progress=None, seed=0):
+    """
+    Time-bounded assignment with the same inputs and outputs as solve_greedy.
+
+    Ranks every slot first, then starts from the better of two fills: the
+    previous run's placements that are still valid topped up globally
+    best-first, or solve_greedy's site-order fill (so coverage is never below
+    greedy's). It then applies improving moves (a worker moves to a slot where
+    they score higher, the slot they leave is refilled). At a local optimum it
+    restarts from a perturbed copy of the best solution, until STALE_RESTARTS
+    restarts bring nothing or `time_budget` seconds have passed since the call.
+    Ranking and the fills always complete; the budget only cuts the search.
+    `on_progress(progress)` receives a dict every PROGRESS_INTERVAL seconds
+    while the incumbent improves, and once at the end; its "picks" are the
+    incumbent's assignments, so a caller can use them before the budget runs out.
+    """
+    started = time.monotonic()
+    deadline = started + time_budget
+    roster = _Roster(employees)
+
+    slots, rankings = [], {}
+    for site in job_sites:
+        for role, role_data in site.get('required_roles', {}).items():
+            capacity = role_data.get('num_workers', 0)
+            if capacity == 0:
+                continue
+            ranking = roster.rank(site, role, role_data, SEARCH_DEPTH + capacity)
+            rankings[(site['site_id'], role)] = ranking
+            slots.append(_Slot(site, role, capacity, ranking))
+
+    search = _Search(slots, roster, seed)
+    search.warm_start(previous)
+    search.fill()
+    warm, warm_objective = search.snapshot(), search.objective()
+    search.restore({})
+    search.fill_in_order()
+    if warm_objective >= search.objective():
+        search.restore(warm)
+    demand = sum(slot.capacity for slot in slots)
+
+    def progress(done, converged=False):
+        return {
+            "elapsed": time.monotonic() - started,
+            "filled": search.filled,
+            "demand": demand,
+            "score": search.score,
+            "moves": search.moves,
+            "kept": search.kept(previous),
+            "done": done,
+            "converged": converged,
+            "picks": search.picks()
+        }
+
+    best, best_objective, stale, converged = search.snapshot(), search.objective(), 0, False
+    last_report = [time.monotonic(), best_objective]
+
+    def report():
+        # Only a new incumbent is reported, not a restart that is still below the best solution
+        if search.objective() > max(last_report[1], best_objective) + EPSILON and time.monotonic() - last_report[0] >= PROGRESS_INTERVAL:
+            on_progress(progress(False))
+            last_report[:] = [time.monotonic(), search.objective()]
+
+    if on_progress:
+        on_progress(progress(False))
+    while time.monotonic() < deadline:
+        applied, completed = search.sweep(deadline, report if on_progress else None)
+        if not completed or applied:
+            continue
+        # ✅ Local optimum: remember it if it is the best so far, then restart from a perturbed copy of the best
+        converged = True
+        if search.objective() > best_objective + EPSILON:
+            best, best_objective, stale = search.snapshot(), search.objective(), 0
+        else:
+            stale += 1
+            search.restore(best)
+        if stale >= STALE_RESTARTS or not slots:
+            break
+        search.kick()
+    if search.objective() < best_objective - EPSILON:
+        search.restore(best)  # Out of time mid-restart
+
+    if on_progress:
+        on_progress(progress(True, converged))
+    return search.picks(), rankings
@@ -1,7 +1,6 @@
 import streamlit as st
 import firebase_admin
 import pandas as pd
-import requests
 import random, string, os, json, time, subprocess, sys
 from firebase_admin import credentials, firestore, auth
 from twilio.rest import Client
@@ -9,11 +8,44 @@ from twilio.rest import Client
 
 import time
 import googlemaps
-import geopy.distance
 import re
 from datetime import datetime
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut
+from firestore_batch import commit_groups, commit_in_chunks, delete_other_runs
+from geocode_cache import GeocodeCache
+import bulk_import
+import roster_export
+from id_allocator import IdAllocator
+from google.api_core.exceptions import AlreadyExists
+import record_updates
+from record_updates import StaleEditError, update_changed_fields
+from change_log import ChangeLog
+from assignment_engine import solve_greedy
+from sharding import solve_sharded
+from anytime_solver import load_warm_start, solve_anytime
+import feasibility
+from assignment_engine import NEARBY_KM
+import admin_tables
+from admin_tables import EMPLOYEE_COLUMNS, JOB_SITE_COLUMNS, ASSIGNMENT_COLUMNS
+from shared_cache import SharedCache, LockBusy, backend_from_url
+import auth_session
+from auth_session import AuthError, AuthSession
+from explanations import ExplanationStore, TOP_K, describe, table_rows
+import replacements
+import worker_stats
+import assignment_inputs
+import migrations
+from concurrent_loader import load_all
+from document_schema import CERTIFICATES, ROLES, SHIFTS, SKILLS, no_dates, stamp, upgrade, with_status_key
+from replacements import ReplacementConflict
+from coverage import CoverageStore
+import tenants
+from tenants import TenantClient
+import map_tiles
+import pydeck as pdk
+import functools, uuid
+from firestore_metrics import Meter, MeteredClient
 
 
 # ✅ Load Firebase credentials correctly from Streamlit secrets
@@ -27,8 +59,56 @@ if firebase_credentials:
 else:
     raise ValueError("🔥 FIREBASE_CREDENTIALS not set. Configure it in Streamlit Secrets.")
 
-# ✅ Initialize Firestore client
-db = firestore.client()
+# ✅ Firestore metering: reads, writes, bytes and latency per page, function and session (Prometheus text)
+PAGE_BUDGETS = {
+    "*": {"rpcs": 10},                          # A page is a handful of queries, never one per row
+    "Login": {"rpcs": 3},
+    "Dashboard": {"rpcs": 5, "reads": 10},      # Worker dashboard: point reads only
+    "Do Assignments": None,                     # Runs and imports read and write whole collections
+    "Bulk Import Employees": None,
+    "Bulk Import Job Sites": None
+}
+
+
+@st.cache_resource
+def get_meter(textfile, port):
+    """One meter per process; `textfile` and/or `port` export its metrics."""
+    meter = Meter(PAGE_BUDGETS, textfile=textfile or None)
+    if port:
+        meter.serve(int(port))
+    return meter
+
+
+meter = get_meter(
+    os.environ.get("OPTISHIFT_METRICS_FILE") or st.secrets.get("METRICS_FILE", ""),
+    os.environ.get("OPTISHIFT_METRICS_PORT") or st.secrets.get("METRICS_PORT", "")
+)
+
+
+def metrics_session():
+    return st.session_state.setdefault("metrics_session", uuid.uuid4().hex[:8])
+
+
+def metered_page(page):
+    """Names the page the current run is metered and budgeted against (fragment reruns reuse it)."""
+    st.session_state["metrics_page"] = page
+    meter.set_page(page)
+
+
+def metered_fragment(fn):
+    """st.fragment whose fragment-only reruns are metered against the page that shows it."""
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        if meter.current():
+            return fn(*args, **kwargs)  # Part of a full script run
+        with meter.run(st.session_state.get("metrics_page", fn.__name__), metrics_session()):
+            return fn(*args, **kwargs)
+    return st.fragment(run)
+
+
+# ✅ Initialize Firestore client, scoped to the signed-in user's tenant (company); login and logout rerun the script
+tenant_id = st.session_state.get("tenant_id") or tenants.DEFAULT_TENANT
+db = TenantClient(MeteredClient(firestore.client(), meter), tenant_id)
 
 
 #----------------------------------------------------------------------------------------
@@ -38,6 +118,40 @@ employees_ref = db.collection('employees')
 job_sites_ref = db.collection('job_sites')
 assignments_ref = db.collection('assignments')
 users_ref = db.collection('users')  # 🔹 Collection for storing users
+my_assignments_ref = db.collection('my_assignments')  # 🔹 Per-worker denormalized assignment (keyed by employee doc ID)
+assignment_runs_ref = db.collection('assignment_runs')  # 🔹 Metadata of assignment runs ("current" points at the latest)
+
+# ✅ Collision-free ID allocation (transactional counters with block leasing)
+def worker_id_allocator(client):
+    return IdAllocator(client, "worker_id", prefix="W", width=8)  # W00000001 (legacy IDs are 8 random chars)
+
+
+@st.cache_resource
+def get_id_allocators(tenant_id):
+    """One pair per tenant and process: the script reruns on every interaction, a leased block of IDs must not be dropped with it."""
+    return worker_id_allocator(db), IdAllocator(db, "site_id", prefix="SITE", start=10000)  # SITE10000+ (legacy IDs are SITE1000-9999)
+
+
+worker_ids, site_ids = get_id_allocators(tenant_id)
+
+# ✅ Append-only change log: every write path records (entity, id, fields, time, actor)
+change_log = ChangeLog(db)
+record_updates.subscribe(change_log.record, key=f"change_log:{tenant_id}", tenant_id=tenant_id)
+
+# ✅ Per-run candidate rankings with score components, for "why (not) me" questions
+explanation_store = ExplanationStore(db)
+coverage_store = CoverageStore(db)
+
+# ✅ Shared cache + run lock: "memory://" for one server, "redis://host:6379/0" so replicas share warm caches
+@st.cache_resource
+def get_shared_cache(url):
+    """One cache per process: the script reruns on every interaction, its in-memory versions and values must not."""
+    return SharedCache(backend_from_url(url))
+
+
+# ✅ Per-tenant versions, values and run locks (tenants run assignments in parallel); cached loaders below
+# take `tenant_id` only as part of their cache key, `db` and `shared_cache` are already scoped to it
+shared_cache = get_shared_cache(os.environ.get("OPTISHIFT_CACHE_URL") or st.secrets.get("CACHE_URL", "memory://")).scoped(tenants.cache_namespace(tenant_id))
 
 #----------------------------------------------------------------------------------------
 
@@ -46,8 +160,6 @@ def add_employee_form():
     st.header("Add Employee")
 
     with st.form(key="add_employee_form"):
-        worker_id = generate_worker_id()
-        
         first_name = st.text_input("First Name")
         middle_name = st.text_input("Middle Name")
         sur_name = st.text_input("Surname")
@@ -63,8 +175,8 @@ def add_employee_form():
         submit_button = st.form_submit_button("Add Employee")
 
     if submit_button:
-        employee_data = {
-            "worker_id": worker_id,
+        employee_data = stamp("employees", {
+            "worker_id": generate_worker_id(),
             "first_name": first_name.strip(),
             "middle_name": middle_name.strip(),
             "sur_name": sur_name.strip(),
@@ -73,14 +185,16 @@ def add_employee_form():
             "have_car": have_car,
             "role": role,
             "availability": availability,
-            "certificates": certificates,
+            "certificates": {cert: no_dates() for cert in certificates},
             "skills": skills,
             "rating": rating
-        }
+        })
 
         try:
             # ✅ Firestore add() now returns a DocumentReference, from which we get .id
             doc_ref = employees_ref.add(employee_data)[1]  # Correctly extract the Firestore ID
+            change_log.append("employee", doc_ref.id, employee_data.keys(), st.session_state.get("user_email"), "create")
+            invalidate_tables("employees")
             st.success(f"✅ Employee added with ID: {doc_ref.id}")
         except Exception as e:
             st.error(f"❌ Error adding employee: {str(e)}")
@@ -90,63 +204,99 @@ def add_employee_form():
 
 #----------------------------------------------------------------------------------------
 
+# ✅ Streamlit UI for Bulk Importing Employees or Job Sites from CSV/Excel
+def bulk_import_form(kind):
+    label = "Employees" if kind == "employees" else "Job Sites"
+    st.header(f"📥 Bulk Import {label}")
+
+    if kind == "employees":
+        st.caption("Columns: worker_id (optional, matches existing workers; new ones get a new ID), first_name, middle_name, "
+                   "sur_name, phone_number, home_address, have_car, role, availability, certificates, skills, rating. "
+                   "List cells use ',' or ';'.")
+    else:
+        st.caption("Columns: site_id (optional, matches existing sites; new ones get a new ID), site_name, site_company, "
+                   "site_superintendent, site_contact_number, address, job_status, work_start_date, work_end_date, and <Role>_workers / <Role>_schedule per role.")
+
+    uploaded_file = st.file_uploader("Upload a CSV or Excel file", type=["csv", "xlsx"], key=f"bulk_import_{kind}")
+    geocode = st.checkbox("📍 Geocode addresses during import", value=True, key=f"bulk_geocode_{kind}")
+
+    if uploaded_file and st.button(f"📥 Import {label}"):
+        progress = st.empty()
+        allocate_ids = worker_ids.allocate if kind == "employees" else site_ids.allocate
+        try:
+            result = bulk_import.import_records(
+                db, kind, uploaded_file, uploaded_file.name, allocate_ids,
+                geocode_cache=geocode_cache if geocode else None,
+                change_log=change_log, actor=st.session_state.get("user_email"),
+                on_progress=lambda state: progress.info(f"⏳ {state['rows_done']} rows processed...")
+            )
+        except Exception as e:
+            st.error(f"❌ Import stopped: {e}. Upload the same file again to resume from the last checkpoint.")
+            return
+
+        progress.empty()
+        if kind == "job_sites":
+            commit_in_chunks(db, coverage_store.refresh_all(assignment_inputs.load_active_job_sites(db)))
+            shared_cache.bump("coverage")
+        invalidate_tables()
+        st.success(f"✅ Import complete: {result['created']} created, {result['updated']} updated, "
+                   f"{len(result['errors'])} rows rejected.")
+        if result["errors"]:
+            st.dataframe(pd.DataFrame(result["errors"]), use_container_width=True)
+            st.download_button(
+                "⬇️ Download Error Report",
+                bulk_import.error_report_csv(result["errors"]),
+                file_name=f"{kind}_import_errors.csv",
+                mime="text/csv"
+            )
+
+
+#----------------------------------------------------------------------------------------
+
+def stored_records(collection):
+    """All documents of `collection` as dicts, upgraded in memory to the canonical shape until its migration has finished."""
+    records = [doc.to_dict() for doc in db.collection(collection).stream()]
+    if not migrations.finished(db, collection):
+        records = [upgrade(collection, record) for record in records]
+    return records
+
+
 # ✅ Streamlit UI for Viewing Employees
+@st.cache_data(ttl=300, show_spinner=False)
+def load_employees_table(tenant_id, version=0):
+    """Loads all employees into a typed frame once per data version, shared with the other replicas."""
+    return shared_cache.get_or_load(
+        f"table:employees:{version}",
+        lambda: admin_tables.employees_frame(stored_records("employees")),
+        ttl=300
+    )
+
+
 def view_employees():
     st.header("View Employees")
+    employees_table()
 
-    # Fetch and structure employee data efficiently
-    employee_data = [
-        {
-            "worker_id": doc.get("worker_id", "N/A"),
-            "first_name": doc.get("first_name", "N/A"),
-            "middle_name": doc.get("middle_name", "N/A"),
-            "sur_name": doc.get("sur_name", "N/A"),
-            "phone_number": doc.get("phone_number", "N/A"),
-            "home_address": doc.get("home_address", "N/A"),
-            "have_car": doc.get("have_car", "No"),
-            "role": ", ".join(doc.get("role", [])) if isinstance(doc.get("role"), list) else doc.get("role", "N/A"),
-            "skills": ", ".join(doc.get("skills", [])) if isinstance(doc.get("skills"), list) else doc.get("skills", "N/A"),
-            "availability": ", ".join(doc.get("availability", [])) if isinstance(doc.get("availability"), list) else doc.get("availability", "N/A"),
-            "certificates": ", ".join(
-                [
-                    f"{cert} (Issued: {info.get('issue_date', 'N/A')}, Exp: {info.get('expiration_date', 'N/A')})"
-                    for cert, info in doc.get("certificates", {}).items()
-                ]
-            ) if isinstance(doc.get("certificates"), dict) else "None",
-            "rating": doc.get("rating", "N/A")
-        }
-        for doc in (d.to_dict() for d in employees_ref.stream())  # Efficient fetching
-    ]
-
-    # Convert data to DataFrame for better UI handling
-    if employee_data:
-        df = pd.DataFrame(employee_data)
 
-        # Define the column order
-        column_order = [
-            "worker_id", "first_name", "middle_name", "sur_name", "phone_number", "home_address", "have_car",
-            "role", "skills", "certificates", "availability", "rating"
-        ]
-        df = df[column_order]
-
-        # ✅ Sorting & Filtering UI
-        sort_col = st.selectbox("Sort by:", column_order, index=0)
-        sort_order = st.radio("Sort Order", ["Ascending", "Descending"], horizontal=True)
-        df = df.sort_values(by=sort_col, ascending=(sort_order == "Ascending"))
-
-        # ✅ Search Feature
-        search_query = st.text_input("Search Employees (by name or ID)")
-        if search_query:
-            df = df[
-                df["worker_id"].str.contains(search_query, case=False, na=False) |
-                df["first_name"].str.contains(search_query, case=False, na=False) |
-                df["sur_name"].str.contains(search_query, case=False, na=False)
-            ]
-
-        # ✅ Display the table with better formatting
-        st.dataframe(df, use_container_width=True)
-    else:
+@metered_fragment
+def employees_table():
+    # ✅ Widget changes rerun only this fragment and re-sort the cached frame (no Firestore I/O)
+    version = table_version("employees")
+    if load_employees_table(tenant_id, version).empty:
         st.info("No employees found.")
+        return
+
+    # ✅ Sorting & Filtering UI
+    sort_col = st.selectbox("Sort by:", EMPLOYEE_COLUMNS, index=0)
+    sort_order = st.radio("Sort Order", ["Ascending", "Descending"], horizontal=True)
+
+    # ✅ Search Feature
+    search_query = st.text_input("Search Employees (by name or ID)")
+
+    # ✅ Display the table with better formatting
+    st.dataframe(
+        table_view(tenant_id, "employees", version, sort_col, sort_order == "Ascending", search_query),
+        use_container_width=True, column_config=TABLE_COLUMN_CONFIG
+    )
 
 
 #----------------------------------------------------------------------------------------
@@ -174,6 +324,7 @@ def find_and_update_employee():
             employee = doc.to_dict()
             if any(search_term in str(employee.get(field, "")).lower() for field in ["worker_id", "phone_number", "first_name", "sur_name"]):
                 employee["doc_id"] = doc.id  # ✅ Store Firestore document ID
+                employee["update_time"] = doc.update_time  # ✅ Version the edit form was loaded from
                 search_results.append(employee)
 
     # Show search results
@@ -184,7 +335,10 @@ def find_and_update_employee():
             format_func=lambda x: f"{x.get('first_name', 'N/A')} {x.get('sur_name', 'N/A')} ({x.get('worker_id', 'N/A')})"
         )
 
-        if selected_employee:
+        # ✅ Pin the version first loaded into the form: the submit rerun re-reads the collection, and a
+        # fresher update_time would hide edits made in between and diff against the wrong document
+        pinned = st.session_state.get("selected_employee")
+        if selected_employee and (pinned is None or pinned["doc_id"] != selected_employee["doc_id"]):
             st.session_state["selected_employee"] = selected_employee
 
     # Show update form if an employee is selected
@@ -196,7 +350,11 @@ def find_and_update_employee():
          
             try:
                 doc_id = st.session_state["selected_employee"]["doc_id"]
-                employees_ref.document(doc_id).delete()
+                # ✅ The worker's dashboard copy goes with the employee (my_assignments is keyed by employee doc ID)
+                commit_in_chunks(db, [("delete", employees_ref.document(doc_id)), ("delete", my_assignments_ref.document(doc_id))])
+                change_log.append("employee", doc_id, (), st.session_state.get("user_email"), "delete")
+                shared_cache.bump("my_assignments")
+                invalidate_tables("employees", "assignments")
                 st.success("✅ Employee deleted successfully!")
                 st.session_state.pop("selected_employee", None)
                 st.session_state.pop("search_term", None)
@@ -211,18 +369,19 @@ def find_and_update_employee():
 # ✅ Streamlit UI for Updating Employee Details
 def update_employee_form(employee):
     st.subheader("Update Employee Details")
+    current = upgrade("employees", employee)  # Legacy shapes (string roles, certificate lists) shown as canonical until migrated
     
     first_name = st.text_input("First Name", employee["first_name"])
     middle_name = st.text_input("Middle Name", employee["middle_name"])
     sur_name = st.text_input("Surname", employee["sur_name"])
     phone_number = st.text_input("Phone Number", employee["phone_number"])
     home_address = st.text_input("Home Address", employee["home_address"])
-    have_car = st.selectbox("Do you have a car?", ["Yes", "No"], index=["Yes", "No"].index(employee["have_car"]))
-    role = st.multiselect("Role", ["Cleaner", "Labour", "Painter"], default=employee["role"])
-    availability = st.multiselect("Availability", ["7:00-15:30", "14:00-22:00", "22:00-06:00"], default=employee["availability"])
-    certificates = st.multiselect("Certifications", ["Working at Heights", "4 Steps", "WHMIS"], default=employee["certificates"])
-    skills = st.multiselect("Skills", ["Boomlift", "Scissors Lift", "Forklift"], default=employee["skills"])
-    rating = st.slider("Employee Rating", min_value=0.0, max_value=5.0, value=float(employee["rating"]), step=0.1)
+    have_car = st.selectbox("Do you have a car?", ["Yes", "No"], index=["Yes", "No"].index(current["have_car"]))
+    role = st.multiselect("Role", ROLES, default=[value for value in current["role"] if value in ROLES])
+    availability = st.multiselect("Availability", SHIFTS, default=[value for value in current["availability"] if value in SHIFTS])
+    certificates = st.multiselect("Certifications", CERTIFICATES, default=[value for value in current["certificates"] if value in CERTIFICATES])
+    skills = st.multiselect("Skills", SKILLS, default=[value for value in current["skills"] if value in SKILLS])
+    rating = st.slider("Employee Rating", min_value=0.0, max_value=5.0, value=float(current["rating"]), step=0.1)
     
     if st.button("Update Employee"):
         updated_data = {
@@ -234,13 +393,20 @@ def update_employee_form(employee):
             "have_car": have_car,
             "role": role,
             "availability": availability,
-            "certificates": certificates,
+            "certificates": {cert: current["certificates"].get(cert) or no_dates() for cert in certificates},  # Known dates are kept
             "skills": skills,
             "rating": rating
         }
         try:
-            employees_ref.document(employee["doc_id"]).update(updated_data)
-            st.success("Employee updated successfully!")
+            # ✅ Only changed fields are written, and only if nobody saved in between
+            changes = update_changed_fields(
+                db, employees_ref.document(employee["doc_id"]), "employee", employee, updated_data,
+                loaded_update_time=employee.get("update_time"), actor=st.session_state.get("user_email")
+            )
+            st.success("Employee updated successfully!" if changes else "No changes to save.")
+            st.session_state.pop("selected_employee", None)
+        except StaleEditError as e:
+            st.error(f"❌ {e}")
             st.session_state.pop("selected_employee", None)
         except Exception as e:
             st.error(f"Error updating employee: {str(e)}")
@@ -253,9 +419,6 @@ def add_job_site_form():
     st.header("🏗️ Add Job Site")
 
     with st.form(key="add_job_site_form"):
-        site_id = f"SITE{random.randint(1000, 9999)}"  # Auto-generated Site ID
-        st.write(f"📌 Generated Site ID: `{site_id}`")  # Debugging output
-
         site_name = st.text_input("🏢 Site Name")
         site_company = st.text_input("🏗️ Site Company")
         site_superintendent = st.text_input("👷 Superintendent")
@@ -296,7 +459,8 @@ def add_job_site_form():
             return
         
         try:
-            job_site_data = {
+            site_id = site_ids.next_id()  # ✅ Allocated only on submit, never reused
+            job_site_data = stamp("job_sites", with_status_key({
                 "site_id": site_id,
                 "site_name": site_name.strip(),
                 "site_company": site_company.strip(),
@@ -307,81 +471,63 @@ def add_job_site_form():
                 "work_start_date": work_start_date.strftime('%Y-%m-%d'),
                 "work_end_date": work_end_date.strftime('%Y-%m-%d'),
                 "required_roles": required_roles
-            }
+            }))
             
-            doc_ref = job_sites_ref.document(site_id)
-            doc_ref.set(job_site_data)
-
-            # ✅ Verify if Firestore has stored the document correctly
-            if doc_ref.get().exists:
-                st.success(f"✅ Job Site **{site_name}** added successfully with ID: `{site_id}`")
-            else:
-                st.error("❌ Firestore write operation completed, but document not found.")
+            # ✅ create() fails instead of silently overwriting an existing site
+            job_sites_ref.document(site_id).create(job_site_data)
+            change_log.append("job_site", site_id, job_site_data.keys(), st.session_state.get("user_email"), "create")
+            refresh_coverage(job_site_data)
+            st.success(f"✅ Job Site **{site_name}** added successfully with ID: `{site_id}`")
+        except AlreadyExists:
+            st.error(f"❌ A job site with ID `{site_id}` already exists. Please submit again.")
         except Exception as e:
             st.error(f"❌ Error adding job site: {str(e)}")
 
 
 #----------------------------------------------------------------------------------------
 
+@st.cache_data(ttl=300, show_spinner=False)
+def load_job_sites_table(tenant_id, version=0):
+    """Loads all job sites into a typed frame once per data version, shared with the other replicas."""
+    return shared_cache.get_or_load(
+        f"table:job_sites:{version}",
+        lambda: admin_tables.job_sites_frame(**load_all(  # ✅ Filled/open come from the coverage counters, not from assignments
+            records=lambda: stored_records("job_sites"),
+            coverage=coverage_store.sites
+        )),
+        ttl=300
+    )
+
+
 def view_job_sites():
     st.header("🏗️ View Job Sites")
+    job_sites_table()
 
-    # Fetch job sites from Firestore efficiently
-    job_sites_data = [
-        {
-            "Site ID": doc.get("site_id", "N/A"),
-            "Job Status": doc.get("job_status", "N/A"),
-            "Work Start Date": doc.get("work_start_date", "N/A"),
-            "Work End Date": doc.get("work_end_date", "N/A"),
-            "Site Name": doc.get("site_name", "N/A"),
-            "Company": doc.get("site_company", "N/A"),
-            "Superintendent": doc.get("site_superintendent", "N/A"),
-            "Contact Number": doc.get("site_contact_number", "N/A"),
-            "Address": doc.get("address", "N/A"),
-            "# Required Workers": sum(
-                details.get("num_workers", 0) for details in doc.get("required_roles", {}).values()
-            ),
-            "Required Roles": ", ".join([
-                f"{role} ({details.get('num_workers', 0)} workers, {', '.join(details.get('work_schedule', []))})"
-                for role, details in doc.get("required_roles", {}).items()
-            ]) if doc.get("required_roles") else "N/A"
-        }
-        for doc in (d.to_dict() for d in job_sites_ref.stream())  # Optimized fetching
-    ]
-
-    if job_sites_data:
-        df = pd.DataFrame(job_sites_data)
 
-        # Define column order
-        column_order = [
-            "Site ID", "Job Status", "Work Start Date", "Work End Date", "Site Name", "Company",
-            "Superintendent", "Contact Number", "Address", "# Required Workers", "Required Roles"
-        ]
-        df = df[column_order]
-
-        # ✅ Status Filter
-        status_filter = st.selectbox("🔍 Filter by Job Site Status:", ["All", "Active", "Inactive", "Completed"], index=0)
-        if status_filter != "All":
-            df = df[df["Job Status"] == status_filter]
-
-        # ✅ Sorting UI
-        sort_col = st.selectbox("🔀 Sort by:", column_order, index=0)
-        sort_order = st.radio("⬆️⬇️ Sort Order", ["Ascending", "Descending"], horizontal=True)
-        df = df.sort_values(by=sort_col, ascending=(sort_order == "Ascending"))
-
-        # ✅ Search Feature
-        search_query = st.text_input("🔍 Search Job Sites (by Site Name, ID, or Company)")
-        if search_query:
-            df = df[
-                df["Site ID"].str.contains(search_query, case=False, na=False) |
-                df["Site Name"].str.contains(search_query, case=False, na=False) |
-                df["Company"].str.contains(search_query, case=False, na=False)
-            ]
-
-        # ✅ Display DataFrame with enhanced UI
-        st.dataframe(df, use_container_width=True)
-    else:
+@metered_fragment
+def job_sites_table():
+    # ✅ Widget changes rerun only this fragment and re-sort the cached frame (no Firestore I/O)
+    version = table_version("job_sites")
+    if load_job_sites_table(tenant_id, version).empty:
         st.info("❌ No job sites found.")
+        return
+
+    # ✅ Status Filter
+    status_filter = st.selectbox("🔍 Filter by Job Site Status:", ["All", "Active", "Inactive", "Completed"], index=0)
+
+    # ✅ Sorting UI
+    sort_col = st.selectbox("🔀 Sort by:", JOB_SITE_COLUMNS, index=0)
+    sort_order = st.radio("⬆️⬇️ Sort Order", ["Ascending", "Descending"], horizontal=True)
+
+    # ✅ Search Feature
+    search_query = st.text_input("🔍 Search Job Sites (by Site Name, ID, or Company)")
+    understaffed_only = st.toggle("🚧 Only understaffed sites")
+
+    # ✅ Display DataFrame with enhanced UI
+    st.dataframe(
+        table_view(tenant_id, "job_sites", version, sort_col, sort_order == "Ascending", search_query, status_filter, understaffed_only),
+        use_container_width=True, column_config=TABLE_COLUMN_CONFIG
+    )
 
 
 #-----------------------------------------------------------------
@@ -406,9 +552,10 @@ def find_and_update_job_site():
         st.session_state["search_term_job"] = search_term
         
         search_results = [
-            {**doc.to_dict(), "doc_id": doc.id}
+            {**site, "doc_id": doc.id, "update_time": doc.update_time}
             for doc in job_sites_ref.stream()
-            if any(search_term in str(doc.to_dict().get(field, "")).lower() for field in ["site_id", "site_name", "site_company", "address"])
+            for site in [doc.to_dict()]
+            if any(search_term in str(site.get(field, "")).lower() for field in ["site_id", "site_name", "site_company", "address"])
         ]
     
     if search_results:
@@ -418,7 +565,10 @@ def find_and_update_job_site():
             format_func=lambda x: f"{x.get('site_name', 'N/A')} ({x.get('site_id', 'N/A')})"
         )
         
-        if selected_job_site:
+        # ✅ Pin the version first loaded into the form: the submit rerun re-reads the collection, and a
+        # fresher update_time would hide edits made in between and diff against the wrong document
+        pinned = st.session_state.get("selected_job_site")
+        if selected_job_site and (pinned is None or pinned["doc_id"] != selected_job_site["doc_id"]):
             st.session_state["selected_job_site"] = selected_job_site
     
     if "selected_job_site" in st.session_state:
@@ -426,6 +576,19 @@ def find_and_update_job_site():
 
 #----------------------------------------------------------------------------------------
 
+# ✅ Site fields copied into each worker's my_assignments document
+MY_ASSIGNMENT_SITE_FIELDS = ("site_name", "address")
+
+
+def my_assignment_site_updates(site_id, changes):
+    """Batch operations that refresh the copied site fields in the my_assignments of the site's workers."""
+    copied = {field: changes[field] for field in MY_ASSIGNMENT_SITE_FIELDS if field in changes}
+    if not copied or not site_id:
+        return []
+    docs = my_assignments_ref.where("job_site_id", "==", site_id).select([]).stream()
+    return [("update", doc.reference, copied) for doc in docs]
+
+
 # ✅ Streamlit UI for Updating Job Site Details
 def update_job_site_form(job_site):
     st.subheader("Update Job Site Details")
@@ -440,7 +603,7 @@ def update_job_site_form(job_site):
     work_end_date = st.date_input("Work End Date", pd.to_datetime(job_site["work_end_date"]))
     
     if st.button("Update Job Site"):
-        updated_data = {
+        updated_data = with_status_key({
             "site_name": site_name,
             "site_company": site_company,
             "site_superintendent": site_superintendent,
@@ -449,10 +612,22 @@ def update_job_site_form(job_site):
             "job_status": job_status,
             "work_start_date": work_start_date.strftime('%Y-%m-%d'),
             "work_end_date": work_end_date.strftime('%Y-%m-%d')
-        }
+        })
         try:
-            job_sites_ref.document(job_site["doc_id"]).update(updated_data)
-            st.success("Job Site updated successfully!")
+            # ✅ Only changed fields are written, and only if nobody saved in between
+            changes = update_changed_fields(
+                db, job_sites_ref.document(job_site["doc_id"]), "job_site", job_site, updated_data,
+                loaded_update_time=job_site.get("update_time"), actor=st.session_state.get("user_email"),
+                related=lambda changes: my_assignment_site_updates(job_site.get("site_id"), changes)
+            )
+            if changes.keys() & {"job_status", "site_name", "required_roles"}:
+                refresh_coverage({**job_site, **changes})
+            if changes.keys() & set(MY_ASSIGNMENT_SITE_FIELDS):
+                shared_cache.bump("my_assignments")
+            st.success("Job Site updated successfully!" if changes else "No changes to save.")
+            st.session_state.pop("selected_job_site", None)
+        except StaleEditError as e:
+            st.error(f"❌ {e}")
             st.session_state.pop("selected_job_site", None)
         except Exception as e:
             st.error(f"Error updating job site: {str(e)}")
@@ -460,82 +635,374 @@ def update_job_site_form(job_site):
 #----------------------------------------------------------------------------------------
 
 
+@st.cache_data(ttl=300, show_spinner=False)
+def load_assignments_table(tenant_id, version=0):
+    """Joins assignments with employee and site data once per data version (two merges, no per-row lookups)."""
+    return shared_cache.get_or_load(
+        f"table:assignments:{version}",
+        lambda: admin_tables.assignments_frame(**load_all(  # ✅ The three collections stream concurrently
+            assignments=lambda: [doc.to_dict() for doc in assignments_ref.stream()],
+            employees=lambda: stored_records("employees"),
+            job_sites=lambda: stored_records("job_sites")
+        )),
+        ttl=300
+    )
+
+
 def view_assignments():
     st.header("📋 View Assignments")
+    assignments_table()
 
-    # Fetch assignments from Firestore
-    assignments_data = [doc.to_dict() for doc in assignments_ref.stream()]
 
-    # Fetch all employees as a dictionary {worker_id: employee_data}
-    employees_dict = {doc.to_dict().get("worker_id"): doc.to_dict() for doc in employees_ref.stream()}
+@metered_fragment
+def assignments_table():
+    # ✅ Widget changes rerun only this fragment and re-sort the cached frame (no Firestore I/O)
+    version = table_version("assignments")
+    if load_assignments_table(tenant_id, version).empty:
+        st.info("❌ No assignments found.")
+        return
 
-    # Prepare data for the table
-    formatted_assignments = []
-    
-    for assignment in assignments_data:
-        site_id = assignment.get("job_site_id", "N/A")
-        site_doc = job_sites_ref.document(site_id).get()
-        site_data = site_doc.to_dict() if site_doc.exists else {}
-
-        employee_id = assignment.get("employee_id", "N/A")
-        employee_data = employees_dict.get(employee_id, {})
-
-        distance = assignment.get("distance", "N/A")  # ✅ Fetch Distance from Assignments Collection
-
-        # Construct assignment record with safe default values
-        formatted_assignments.append({
-            "Site Name": site_data.get("site_name", "N/A"),
-            "Company": site_data.get("site_company", "N/A"),
-            "Address": site_data.get("address", "N/A"),
-            "Num Workers": sum(
-                details.get("num_workers", 0) for details in site_data.get("required_roles", {}).values()
-            ) if site_data.get("required_roles") else 0,
-            "Full Name": f"{employee_data.get('first_name', 'N/A')} {employee_data.get('middle_name', '')} {employee_data.get('sur_name', 'N/A')}",
-            "Phone Number": employee_data.get("phone_number", "N/A"),
-            "Home Address": employee_data.get("home_address", "N/A"),
-            "Has Car": employee_data.get("have_car", "N/A"),
-            "Employee Role": ", ".join(employee_data.get("role", [])) if isinstance(employee_data.get("role"), list) else employee_data.get("role", "N/A"),
-            "Required Role": assignment.get("role", "N/A"),
-            "Skills": ", ".join(employee_data.get("skills", [])) if isinstance(employee_data.get("skills"), list) else "N/A",
-            "Certificates": ", ".join(employee_data.get("certificates", [])) if isinstance(employee_data.get("certificates"), list) else "N/A",
-            "Availability": ", ".join(employee_data.get("availability", [])) if isinstance(employee_data.get("availability"), list) else "N/A",
-            "Rating": employee_data.get("rating", "N/A"),
-            "Distance (km)": f"{distance:.2f} km" if isinstance(distance, (int, float)) else "N/A",
-        })
+    # ✅ Sorting Feature
+    sort_col = st.selectbox("🔀 Sort by:", ASSIGNMENT_COLUMNS, index=0)
+    sort_order = st.radio("⬆️⬇️ Sort Order", ["Ascending", "Descending"], horizontal=True)
 
-    # Convert data to DataFrame
-    df = pd.DataFrame(formatted_assignments)
+    # ✅ Search Feature
+    search_query = st.text_input("🔍 Search Assignments (by Site Name, Employee, or Role)")
 
-    # Define expected column order with "Employee Role" after "Has Car"
-    column_order = [
-        "Site Name", "Company", "Address", "Num Workers", "Required Role", "Full Name", "Phone Number",
-        "Home Address", "Has Car", "Employee Role", "Skills", "Certificates", "Availability", "Rating", "Distance (km)"
-    ]
-    
-    if not df.empty:
-        df = df[column_order]
-        
-        # ✅ Sorting Feature
-        sort_col = st.selectbox("🔀 Sort by:", column_order, index=0)
-        sort_order = st.radio("⬆️⬇️ Sort Order", ["Ascending", "Descending"], horizontal=True)
-        df = df.sort_values(by=sort_col, ascending=(sort_order == "Ascending"))
-
-        # ✅ Search Feature
-        search_query = st.text_input("🔍 Search Assignments (by Site Name, Employee, or Role)")
-        if search_query:
-            df = df[
-                df["Site Name"].str.contains(search_query, case=False, na=False) |
-                df["Full Name"].str.contains(search_query, case=False, na=False) |
-                df["Required Role"].str.contains(search_query, case=False, na=False) |
-                df["Employee Role"].str.contains(search_query, case=False, na=False)
-            ]
-
-        # ✅ Display DataFrame with enhanced UI
-        st.dataframe(df, use_container_width=True)
+    # ✅ Display DataFrame with enhanced UI
+    st.dataframe(
+        table_view(tenant_id, "assignments", version, sort_col, sort_order == "Ascending", search_query),
+        use_container_width=True, column_config=TABLE_COLUMN_CONFIG
+    )
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Render-time formatting: the frames stay numeric/typed, so sorting is numeric too
+TABLE_COLUMN_CONFIG = {
+    "rating": st.column_config.NumberColumn("rating", format="%.1f"),
+    "Rating": st.column_config.NumberColumn(format="%.1f"),
+    "Distance (km)": st.column_config.NumberColumn(format="%.2f km"),
+    "Work Start Date": st.column_config.DateColumn(format="YYYY-MM-DD"),
+    "Work End Date": st.column_config.DateColumn(format="YYYY-MM-DD")
+}
+
+# ✅ Memoized table views: each (table, sort, search, filter) combination is computed once per data version
+TABLE_LOADERS = {
+    "employees": load_employees_table,
+    "job_sites": load_job_sites_table,
+    "assignments": load_assignments_table
+}
+TABLE_SEARCH_COLUMNS = {
+    "employees": ["worker_id", "first_name", "sur_name"],
+    "job_sites": ["Site ID", "Site Name", "Company"],
+    "assignments": ["Site Name", "Full Name", "Required Role", "Employee Role"]
+}
+
+def table_version(table):
+    """Shared data version of a table; bumped by invalidate_tables() on any replica."""
+    return shared_cache.version(f"table:{table}")
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def table_view(tenant_id, table, version, sort_col, ascending, search_query="", status_filter="All", understaffed_only=False):
+    """Returns the cached table filtered by status, open positions and search text, sorted by `sort_col`."""
+    df = TABLE_LOADERS[table](tenant_id, version)
+    if status_filter != "All":
+        df = df[df["Job Status"] == status_filter]
+    if understaffed_only:
+        df = df[df["# Open"].fillna(0) > 0]
+    if search_query:
+        mask = pd.Series(False, index=df.index)
+        for col in TABLE_SEARCH_COLUMNS[table]:
+            mask |= df[col].astype(str).str.contains(search_query, case=False, na=False, regex=False)
+        df = df[mask]
+    return df.sort_values(by=sort_col, ascending=ascending)
+
+
+def invalidate_tables(*tables):
+    """
+    Drops cached frames (all tables by default) after a write so the next view reloads them.
+    Bumping the shared version invalidates the frames cached by the other replicas as well.
+    """
+    for table in tables or TABLE_LOADERS:
+        shared_cache.bump(f"table:{table}")
+        TABLE_LOADERS[table].clear()
+    table_view.clear()
+
+
+# ✅ Edits made through record_updates invalidate the table they touched
+record_updates.subscribe(lambda event: invalidate_tables(
+    {"employee": "employees", "job_site": "job_sites"}.get(event["entity"], "assignments")
+), key=f"invalidate_tables:{tenant_id}", tenant_id=tenant_id)
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Coverage: materialized required/filled/open counters per site, role and shift
+def refresh_coverage(site):
+    """Keeps a site's coverage counters in step with an edit; a failure only leaves them stale until the next run."""
+    try:
+        coverage_store.refresh_site(site)
+    except Exception as e:
+        print(f"⚠️ Coverage refresh failed for {site.get('site_id')}: {e}")
+    shared_cache.bump("coverage")
+    invalidate_tables("job_sites")
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_coverage(tenant_id, version=0, understaffed_only=False):
+    """Coverage documents (one small document per site), shared with the other replicas until the next change."""
+    return shared_cache.get_or_load(
+        f"coverage:{version}:{understaffed_only}",
+        lambda: sorted(coverage_store.sites(understaffed_only), key=lambda doc: (-doc["open"], doc["site_id"])),
+        ttl=300
+    )
+
+
+def coverage_dashboard():
+    st.header("📊 Coverage")
+    understaffed_only = st.toggle("🚧 Only understaffed sites")
+    documents = load_coverage(tenant_id, shared_cache.version("coverage"), understaffed_only)
+    if not documents:
+        st.info("✅ No understaffed sites." if understaffed_only else "❌ No coverage recorded yet. Run assignments first.")
+        return
+
+    totals = CoverageStore.totals(documents)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Required", totals["required"])
+    col2.metric("Filled", totals["filled"])
+    col3.metric("Open", totals["open"])
+    col4.metric("Coverage", f"{totals['filled'] / totals['required']:.0%}" if totals["required"] else "N/A")
+
+    sites = pd.DataFrame.from_records(documents, columns=["site_id", "site_name", "required", "filled", "open"])
+    sites["coverage"] = (sites["filled"].clip(upper=sites["required"]) / sites["required"].where(sites["required"] > 0)).astype("float64")
+    st.dataframe(sites, use_container_width=True, hide_index=True,
+                 column_config={"coverage": st.column_config.ProgressColumn("coverage", format="percent", min_value=0, max_value=1)})
+
+    with st.expander("By role and shift"):
+        st.dataframe(pd.DataFrame([
+            {
+                "site_id": doc["site_id"], "role": role, "required": entry["required"], "filled": entry["filled"], "open": entry["open"],
+                "filled by shift": ", ".join(f"{shift}: {count}" for shift, count in entry.get("shifts", {}).items())
+            }
+            for doc in documents for role, entry in doc.get("roles", {}).items()
+        ]), use_container_width=True, hide_index=True)
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Map: workers, sites and assignment lines clustered server-side per zoom level
+MAP_WIDTH, MAP_HEIGHT = 1000, 600  # Pixels the viewport query assumes (the browser may show a bit more or less)
+
+
+def map_data_version(run_id):
+    return f"{table_version('employees')}-{table_version('job_sites')}-{shared_cache.version('coverage')}-{run_revision(run_id)}"
+
+
+@st.cache_resource(ttl=3600, max_entries=4, show_spinner=False)
+def load_map_points(tenant_id, run_id, version):
+    """Point arrays of a run, read-only and shared by all sessions (cache_resource: no copy per rerun)."""
+    return shared_cache.get_or_load(f"map:points:{run_id}:{version}", lambda: map_tiles.load_points(db, run_id), ttl=3600)
+
+
+@st.cache_resource(ttl=3600, max_entries=64, show_spinner=False)
+def load_map_level(tenant_id, run_id, version, zoom):
+    """One zoom level of the cluster pyramid, built on first view and kept per run and data version."""
+    return shared_cache.get_or_load(
+        f"map:level:{run_id}:{version}:{zoom}",
+        lambda: map_tiles.build_level(load_map_points(tenant_id, run_id, version), zoom),
+        ttl=3600
+    )
+
+
+def move_map(dx=0, dy=0, zoom=0):
+    """Pans by a fraction of the view and/or zooms by whole levels."""
+    view = st.session_state["map_view"]
+    south, west, north, east = map_tiles.bounds(view, MAP_WIDTH, MAP_HEIGHT, margin=0)
+    view["latitude"] = min(max(view["latitude"] + dy * (north - south), -80), 80)
+    view["longitude"] = view["longitude"] + dx * (east - west)
+    view["zoom"] = map_tiles.clamp_zoom(view["zoom"] + zoom)
+
+
+def zoom_to_cluster():
+    """Clicking a cluster centres the map on it and zooms in two levels."""
+    objects = st.session_state["coverage_map"].selection.get("objects", {})
+    picked = next((items[0] for items in objects.values() if items), None)
+    if picked and "latitude" in picked:
+        st.session_state["map_view"].update(latitude=picked["latitude"], longitude=picked["longitude"])
+        move_map(zoom=2)
+
+
+def map_page():
+    st.header("🗺️ Map")
+    run_id = current_run_id()
+    if not run_id:
+        st.info("ℹ️ No assignment run yet: showing workers and sites only.")
+    coverage_map(run_id)
+
+
+@metered_fragment
+def coverage_map(run_id):
+    # ✅ Only the clusters around the view are sent to the browser; panning and zooming rerun this fragment only
+    version = map_data_version(run_id)
+    points = load_map_points(tenant_id, run_id, version)
+    if "map_view" not in st.session_state:
+        st.session_state["map_view"] = map_tiles.fit(points, MAP_WIDTH, MAP_HEIGHT)
+    view = st.session_state["map_view"]
+
+    col1, col2, col3 = st.columns(3)
+    show_workers = col1.toggle("👷 Workers", value=True)
+    show_sites = col2.toggle("🏗️ Sites", value=True)
+    show_lines = col3.toggle("🔗 Assignments", value=bool(run_id))
+
+    controls = st.columns(7)
+    controls[0].button("➕", help="Zoom in", on_click=move_map, kwargs={"zoom": 1}, use_container_width=True)
+    controls[1].button("➖", help="Zoom out", on_click=move_map, kwargs={"zoom": -1}, use_container_width=True)
+    controls[2].button("⬅️", help="Pan west", on_click=move_map, kwargs={"dx": -0.5}, use_container_width=True)
+    controls[3].button("➡️", help="Pan east", on_click=move_map, kwargs={"dx": 0.5}, use_container_width=True)
+    controls[4].button("⬆️", help="Pan north", on_click=move_map, kwargs={"dy": 0.5}, use_container_width=True)
+    controls[5].button("⬇️", help="Pan south", on_click=move_map, kwargs={"dy": -0.5}, use_container_width=True)
+    if controls[6].button("🎯", help="Fit all", use_container_width=True):
+        st.session_state["map_view"] = view = map_tiles.fit(points, MAP_WIDTH, MAP_HEIGHT)
+
+    # ✅ The view is padded by one screen per side, so small drags in the browser still show clusters
+    level = load_map_level(tenant_id, run_id, version, view["zoom"])
+    features = map_tiles.visible(points, level, map_tiles.bounds(view, MAP_WIDTH, MAP_HEIGHT))
+
+    for worker in features["workers"]:
+        worker["radius"] = min(4 + 2 * worker["count"] ** 0.5, 30)
+        worker["tooltip"] = worker["label"] or f"{worker['count']} workers ({worker['assigned']} assigned)"
+    for site in features["sites"]:
+        site["radius"] = min(6 + 2 * site["count"] ** 0.5, 30)
+        site["color"] = [220, 60, 40, 220] if site["open"] else [40, 160, 80, 220]
+        site["tooltip"] = f"{site['label'] or str(site['count']) + ' sites'}: {site['filled']}/{site['required']} filled, {site['open']} open"
+    for line in features["lines"]:
+        line["width"] = min(1 + line["count"] ** 0.5, 12)
+        line["tooltip"] = f"{line['count']} assigned"
+
+    layers = []
+    if show_lines:
+        layers.append(pdk.Layer("LineLayer", id="lines", data=features["lines"], get_source_position="from", get_target_position="to",
+                                get_width="width", width_units="pixels", get_color=[90, 90, 90, 90], pickable=True))
+    if show_workers:
+        layers.append(pdk.Layer("ScatterplotLayer", id="workers", data=features["workers"], get_position=["longitude", "latitude"],
+                                get_radius="radius", radius_units="pixels", get_fill_color=[30, 110, 220, 160], pickable=True))
+    if show_sites:
+        layers.append(pdk.Layer("ScatterplotLayer", id="sites", data=features["sites"], get_position=["longitude", "latitude"],
+                                get_radius="radius", radius_units="pixels", get_fill_color="color", pickable=True))
+
+    st.pydeck_chart(
+        pdk.Deck(layers=layers, map_style=None, tooltip={"text": "{tooltip}"},
+                 initial_view_state=pdk.ViewState(latitude=view["latitude"], longitude=view["longitude"], zoom=view["zoom"])),
+        height=MAP_HEIGHT, on_select=zoom_to_cluster, selection_mode="single-object", key="coverage_map"
+    )
+    st.caption(
+        f"Zoom {view['zoom']}: {len(features['workers'])} worker clusters, {len(features['sites'])} site clusters, "
+        f"{len(features['lines'])} of {features['lines_total']} assignment lines in view. Click a cluster to zoom in."
+    )
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Streamlit UI for Exporting Rosters (CSV / Excel / PDF)
+def current_run_id():
+    current_run = assignment_runs_ref.document("current").get()
+    return current_run.to_dict().get("run_id") if current_run.exists else None
+
+
+def run_revision(run_id):
+    """Bumped when a replacement changes a stored run's assignments; roster and map caches of the run key on it."""
+    return shared_cache.version(f"run:{run_id}")
+
+
+def export_rosters():
+    st.header("📤 Export Rosters")
+
+    run_id = current_run_id()
+    if run_id:
+        st.caption(f"Assignment run: `{run_id}`")
     else:
-        st.info("❌ No assignments found.")
+        st.caption("⚠️ No assignment run recorded yet; exports are regenerated on every request.")
+
+    group_labels = {"Per Site": "site", "Per Superintendent": "superintendent"}
+    format_labels = {"CSV": "csv", "Excel (XLSX)": "xlsx", "PDF": "pdf"}
+    group_by = group_labels[st.radio("Group rosters", list(group_labels.keys()), horizontal=True)]
+    fmt = format_labels[st.radio("Format", list(format_labels.keys()), horizontal=True)]
+
+    revision = run_revision(run_id)
+    if st.button("📄 Generate Roster"):
+        with st.spinner("📄 Building roster..."):
+            try:
+                st.session_state["roster_export_path"] = roster_export.export_roster(
+                    db, run_id, group_by, fmt, shared_cache=shared_cache, revision=revision
+                )
+            except Exception as e:
+                st.error(f"❌ Error exporting roster: {e}")
+                return
+
+    path = st.session_state.get("roster_export_path")
+    if path and os.path.exists(path) and path.endswith(os.path.join(f"r{revision}", f"roster_by_{group_by}.{fmt}")):  # Not a stale revision
+        with open(path, "rb") as f:
+            st.download_button(
+                "⬇️ Download Roster", f,
+                file_name=f"roster_{run_id or 'current'}_by_{group_by}.{fmt}",
+                mime=roster_export.MIME_TYPES[fmt]
+            )
+
+
+# ✅ Explanations change only when a replacement bumps the run revision, so they are cached without a TTL
+@st.cache_data(max_entries=512, show_spinner=False)
+def load_worker_explanations(tenant_id, run_id, revision, worker_id):
+    return explanation_store.slots_for_worker(run_id, worker_id)
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def load_slot_explanation(tenant_id, run_id, revision, site_id, role):
+    return explanation_store.slot(run_id, site_id, role)
 
 
+def show_worker_explanation(run_id, worker_id):
+    tables = load_worker_explanations(tenant_id, run_id, run_revision(run_id), worker_id)
+    if not tables:
+        st.info(f"ℹ️ {worker_id} is not among the top {TOP_K} candidates of any open position in this run "
+                "(no open position needs their role, or higher-scoring workers ranked ahead).")
+        return
+    tables = sorted(tables, key=lambda table: table["status"][table["worker_ids"].index(worker_id)])  # Assigned slot first
+    for table in tables:
+        st.write(f"- {describe(table, worker_id)}")
+
+
+def explain_assignments():
+    st.header("🔎 Explain Assignments")
+
+    run_id = current_run_id()
+    if not run_id:
+        st.info("❌ No assignment run recorded yet.")
+        return
+    st.caption(f"Assignment run: `{run_id}`")
+
+    mode = st.radio("Explain", ["A worker", "A position"], horizontal=True)
+    if mode == "A worker":
+        worker_id = st.text_input("Worker ID").strip()
+        if worker_id:
+            show_worker_explanation(run_id, worker_id)
+        return
+
+    col1, col2 = st.columns(2)
+    site_id = col1.text_input("Site ID").strip()
+    role = col2.selectbox("Role", bulk_import.ROLES)
+    if not site_id:
+        return
+    table = load_slot_explanation(tenant_id, run_id, run_revision(run_id), site_id, role)
+    if not table:
+        st.info(f"❌ No {role} position at {site_id} in this run.")
+        return
+
+    st.write(f"**{table['num_assigned']}** assigned from **{table['num_candidates']}** matching candidates (top {len(table['worker_ids'])} shown).")
+    st.dataframe(pd.DataFrame(table_rows(table)), use_container_width=True, hide_index=True,
+                 column_config={"distance": st.column_config.NumberColumn(format="%.2f km")})
+
 
 #----------------------------------------------------------------------------------------
 
@@ -560,6 +1027,7 @@ db = initialize_firebase()
 if db is None:
     print("⚠️ Firestore initialization failed. Exiting.")
     exit()
+db = TenantClient(MeteredClient(db, meter), tenant_id)
 
 assignments_ref = db.collection("assignments")
 
@@ -610,127 +1078,199 @@ def geocode_address(address):
         lat, lon = osm_geocode(address)
     return lat, lon
 
-# ✅ Step 4: Distance Calculation
-def calculate_distance(employee_location, site_location):
-    if None in employee_location or None in site_location:
-        print(f"⚠️ Cannot calculate distance. Missing coordinates: {employee_location}, {site_location}")
-        return float('inf')
-    return geopy.distance.distance(employee_location, site_location).km
+# ✅ Shared geocode cache (memory + shared cache + Firestore) so each address hits the APIs once
+geocode_cache = GeocodeCache(db, geocode_address, shared_cache=shared_cache)
 
-# ✅ Step 5: Assignment Function
+# ✅ Step 4: Assignment Function (scoring and distance live in assignment_engine.py)
 def do_assignments():
     st.header("🔄 Run Assignments")
     st.write("Click below to run the assignment process and match employees to job sites.")
 
+    # ✅ Anytime solver: best solution within a time budget, warm-started from the current run
+    solver = st.radio("🧮 Solver", ["Anytime (time budget)", "Greedy (fast)"], horizontal=True)
+    anytime = solver.startswith("Anytime")
+    time_budget = st.slider("⏱️ Time budget (seconds)", min_value=5, max_value=300, value=30, step=5, disabled=not anytime)
+
+    # ✅ Geographic sharding: each region is solved on its own, border workers can join neighbouring regions
+    col1, col2 = st.columns(2)
+    num_shards = col1.number_input("🗺️ Regions (1 = single global run)", min_value=1, max_value=50, value=1, step=1, disabled=anytime)
+    overlap_km = col2.slider("↔️ Border overlap (km)", min_value=0.0, max_value=50.0, value=10.0, step=1.0, disabled=anytime or num_shards == 1)
+
+    # ✅ Pre-check: staffing bounds from the roster alone, before the expensive run
+    if st.button("🔍 Check feasibility"):
+        with st.spinner("Checking staffing bounds..."):
+            employees, job_sites = assignment_inputs.load_inputs(db)
+            st.session_state["feasibility"] = feasibility.check(employees, job_sites)
+    if "feasibility" in st.session_state:
+        st.caption("Pre-check on stored coordinates; workers or sites without coordinates count as not nearby.")
+        show_feasibility(st.session_state["feasibility"])
+
     if st.button("Run Assignments"):
-        with st.spinner("🗑️ Deleting old assignments..."):
-            try:
-                old_assignments = assignments_ref.stream()
-                batch = db.batch()
-                for doc in old_assignments:
-                    batch.delete(doc.reference)
-                batch.commit()
-                time.sleep(2)  # Firestore sync
-                st.success("✅ Old assignments deleted successfully!")
-            except Exception as e:
-                st.error(f"❌ Error deleting assignments: {e}")
-                return
+        # ✅ Distributed run lock: only one replica runs assignments at a time
+        try:
+            with shared_cache.lock("assignment_run", ttl=1800):
+                completed = run_assignments(num_shards, overlap_km, time_budget if anytime else None)
+        except LockBusy:
+            st.warning("⏳ An assignment run is already in progress. Try again when it finishes.")
+            return
 
-        with st.spinner("⚡ Running assignment process..."):
-            try:
-                employees = [doc.to_dict() for doc in db.collection("employees").stream()]
-                
-                # ✅ Filter only active job sites
-                job_sites = [doc.to_dict() for doc in db.collection("job_sites").stream() if doc.to_dict().get("job_status", "").lower() == "active"]
-                
-                assigned_employees = set()
+        # ✅ Refresh UI
+        if completed:
+            view_assignments()
 
-                if not job_sites:
-                    st.warning("⚠️ No active job sites found.")
-                    return
 
-                # Ensure employees and job sites have coordinates
-                for entity in employees + job_sites:
-                    key = "home_address" if "home_address" in entity else "address"
-                    if "latitude" not in entity or "longitude" not in entity or entity["latitude"] is None or entity["longitude"] is None:
-                        lat, lon = geocode_address(entity.get(key, ""))
-                        if lat is None or lon is None:
-                            print(f"⚠️ Skipping {entity.get('worker_id', entity.get('site_id', 'UNKNOWN'))} due to missing geolocation data.")
-                            continue
-                        entity["latitude"] = lat
-                        entity["longitude"] = lon
-
-                # ✅ Assignment Logic: Strict Role Matching
-                for site in job_sites:
-                    required_roles = site.get('required_roles', {})
-                    assigned_counts = {role: 0 for role in required_roles}
-
-                    for role, role_data in required_roles.items():
-                        required_count = role_data.get('num_workers', 0)
-                        if required_count == 0:
-                            continue
-
-                        employee_scores = []
-                        for employee in employees:
-                            # ✅ Ensure the employee's role matches the site's required role
-                            employee_roles = employee.get('role', [])
-                            if isinstance(employee_roles, str):  # If stored as a single string
-                                employee_roles = [employee_roles]
-
-                            if role not in employee_roles:
-                                continue  # ❌ Skip this employee if their role doesn't match
-
-                            # ✅ Scoring System (Prioritizing Role Match First)
-                            score = 5  # Base score since role already matches
-                            if any(shift in employee.get('availability', []) for shift in role_data.get('work_schedule', [])):
-                                score += 4
-                            if employee.get('have_car', 'No') == 'Yes':
-                                score += 3
-
-                            distance = calculate_distance(
-                                (employee['latitude'], employee['longitude']), 
-                                (site['latitude'], site['longitude'])
-                            )
-                            if distance <= 40:
-                                score += 2
-
-                            employee_scores.append({'employee': employee, 'score': score, 'distance': distance})
-
-                        # ✅ Sort employees by score (higher is better), then by distance (lower is better)
-                        sorted_employees = sorted(
-                            employee_scores, 
-                            key=lambda x: (-x['score'], x['distance'], -x['employee'].get('rating', 0))
-                        )
-
-                        assigned = 0
-                        for emp_data in sorted_employees:
-                            if assigned >= required_count:
-                                break
-                            employee = emp_data['employee']
-                            if employee['worker_id'] in assigned_employees:
-                                continue
-
-                            try:
-                                db.collection('assignments').add({
-                                    'employee_id': employee['worker_id'],
-                                    'job_site_id': site['site_id'],
-                                    'role': role,
-                                    'distance': emp_data['distance'],
-                                    'assigned_date': datetime.now()
-                                })
-                                assigned_employees.add(employee['worker_id'])
-                                assigned += 1
-                            except Exception as e:
-                                print(f"❌ Firestore Write Failed: {e}")
-
-                st.success("✅ Assignments have been updated!")
+def show_feasibility(result):
+    """Shortfall summary and table from feasibility.check()."""
+    demand, fillable = result["demand"], result["fillable"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Positions needed", demand)
+    col2.metric("Max fillable", fillable, delta=fillable - demand if fillable < demand else None)
+    col3.metric("Check time", f"{result['elapsed']:.2f}s")
+    if result["short_roles"]:
+        st.error(
+            f"❌ {', '.join(result['short_roles'])}: {result['short_roles_needed']} positions need these roles, "
+            f"but only {result['short_roles_workers']} workers hold any of them. At most {fillable} of {demand} positions can be filled."
+        )
 
-            except Exception as e:
-                st.error(f"❌ Error running assignments: {e}")
+    rows = feasibility.shortfalls(result)
+    if rows:
+        st.warning(f"⚠️ {len(rows)} site/role slots cannot be fully staffed, or not with available workers within {NEARBY_KM} km.")
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    else:
+        st.success(f"✅ Every position can be staffed with available workers within {NEARBY_KM} km.")
+    with st.expander("Per role"):
+        st.dataframe(pd.DataFrame(result["roles"]), use_container_width=True, hide_index=True)
+
+
+def run_assignments(num_shards, overlap_km, time_budget=None):
+    """Replaces the current assignments with a new run; returns True on success."""
+    with st.spinner("📥 Loading assignment inputs..."):
+        try:
+            # ✅ Filters run in Firestore (active sites, needed roles) and only scoring fields are fetched;
+            # the inputs, the fairness aggregates and the current run (warm start) load concurrently
+            loaded = load_all(
+                inputs=lambda: assignment_inputs.load_inputs(db),
+                stats=lambda: worker_stats.load(db),
+                warm_start=lambda: load_warm_start(db)
+            )
+            (employees, job_sites), stats, (previous_run_id, previous) = loaded["inputs"], loaded["stats"], loaded["warm_start"]
+        except Exception as e:
+            st.error(f"❌ Error loading assignment inputs: {e}")
+            return
+
+    with st.spinner("⚡ Running assignment process..."):
+        try:
+            assigned_employees = set()
+            assignment_writes = []
+            run_id = datetime.now().strftime("%Y%m%d-%H%M%S-") + ''.join(random.choices(string.ascii_lowercase + string.digits, k=4))
+
+            if not job_sites:
+                st.warning("⚠️ No active job sites found.")
                 return
 
-        # ✅ Refresh UI
-        view_assignments()
+            # Ensure employees and job sites have coordinates
+            for entity in employees + job_sites:
+                key = "home_address" if "home_address" in entity else "address"
+                if "latitude" not in entity or "longitude" not in entity or entity["latitude"] is None or entity["longitude"] is None:
+                    lat, lon = geocode_cache.get(entity.get(key, ""))
+                    if lat is None or lon is None:
+                        print(f"⚠️ Skipping {entity.get('worker_id', entity.get('site_id', 'UNKNOWN'))} due to missing geolocation data.")
+                        continue
+                    entity["latitude"] = lat
+                    entity["longitude"] = lon
+
+            # ✅ Impossible demands are flagged before solving (the run still fills what it can)
+            check = feasibility.check(employees, job_sites)
+            if feasibility.shortfalls(check):
+                with st.expander(f"⚠️ Staffing shortfalls: at most {check['fillable']} of {check['demand']} positions can be filled", expanded=check["fillable"] < check["demand"]):
+                    show_feasibility(check)
+
+            # ✅ Fairness: rolling per-worker aggregates become score penalties (no assignment history is read)
+            worker_stats.apply_fairness(employees, stats)
+
+            # ✅ Assignment Logic: Strict Role Matching, solved globally or per region
+            if time_budget:
+                progress = st.empty()
+                picks, rankings = solve_anytime(
+                    employees, job_sites, previous=previous, time_budget=time_budget,
+                    on_progress=lambda p: progress.info(
+                        f"{'✅' if p['done'] else '🔎'} {p['elapsed']:.0f}s: {p['filled']}/{p['demand']} positions filled, "
+                        f"total score {p['score']:g}, {p['moves']} improving moves, {p['kept']} kept from the last run"
+                        + (" (no better solution found)" if p['converged'] else "")
+                    )
+                )
+            elif num_shards > 1:
+                picks, rankings = solve_sharded(employees, job_sites, num_shards=num_shards, overlap_km=overlap_km)
+            else:
+                picks, rankings = solve_greedy(employees, job_sites)
+
+            # ✅ Each pick's assignment, my_assignments view and rolling aggregates form one group, never split across batches
+            stats_writes = worker_stats.update_operations(db, stats, picks)  # One per pick, in pick order, then dropped same-day workers
+            for pick, stats_write in zip(picks, stats_writes):
+                employee, site, role = pick['employee'], pick['site'], pick['role']
+                assigned_date = datetime.now()
+                assignment_writes.append([("set", assignments_ref.document(), {
+                    'run_id': run_id,
+                    'employee_id': employee['worker_id'],
+                    'job_site_id': site['site_id'],
+                    'role': role,
+                    'shift': pick['shift'],
+                    'distance': pick['distance'],
+                    'assigned_date': assigned_date
+                }), ("set", my_assignments_ref.document(employee['doc_id']), {  # Denormalized read model for the worker dashboard
+                    'run_id': run_id,
+                    'worker_id': employee['worker_id'],
+                    'job_site_id': site['site_id'],
+                    'site_name': site.get('site_name', 'Unknown'),
+                    'address': site.get('address', 'Unknown'),
+                    'role': role,
+                    'shift': pick['shift'],
+                    'distance': pick['distance'],
+                    'assigned_date': assigned_date
+                }), stats_write])
+                assigned_employees.add(employee['worker_id'])
+            assignment_writes.extend([op] for op in stats_writes[len(picks):])
+
+            # ✅ Top-K rankings per (site, role) and coverage counters per site commit with the run
+            assignment_writes.extend([op] for op in explanation_store.operations(run_id, picks, rankings))
+            assignment_writes.extend([op] for op in coverage_store.operations(run_id, job_sites, picks))
+
+            # ✅ If a batch fails, the groups before it stay committed, but the run is not made current and no
+            # change-log entry is written: readers keep the previous run (except workers whose my_assignments and
+            # stats groups were already written), and the next successful run deletes the partial run's assignments.
+            # The current pointer and the one compact change-log entry per run are written together, last.
+            try:
+                commit_groups(db, assignment_writes)
+                commit_in_chunks(db, [
+                    ("set", assignment_runs_ref.document("current"), {
+                        "run_id": run_id,
+                        "completed_at": datetime.now(),
+                        "num_assignments": len(assigned_employees)
+                    }),
+                    change_log.operation(
+                        "assignment_run", run_id, ["assignments", "my_assignments"], st.session_state.get("user_email"), "replace",
+                        num_assignments=len(assigned_employees)
+                    )
+                ])
+            except Exception as e:
+                print(f"❌ Firestore Write Failed: {e}")
+                raise
+            # ✅ The old run stays readable until the new one is committed and current; only then is it deleted
+            # (workers assigned again were already overwritten in place)
+            delete_other_runs(db, assignments_ref, run_id)
+            delete_other_runs(db, my_assignments_ref, run_id)
+            if previous_run_id and previous_run_id != run_id:
+                commit_in_chunks(db, explanation_store.delete_run(previous_run_id))  # Only the current run is explained
+            shared_cache.bump("my_assignments")  # ✅ Workers on every replica see the new roster on their next rerun
+            shared_cache.bump("coverage")
+            invalidate_tables("assignments", "job_sites")
+
+            st.success("✅ Assignments have been updated!")
+
+        except Exception as e:
+            st.error(f"❌ Error running assignments: {e}")
+            return
+    return True
 
 
 
@@ -759,6 +1299,64 @@ def send_sms(to, message):
     except Exception as e:
         st.error(f"❌ Error sending message: {e}")
 
+# ✅ Targeted replacement for no-shows and cancellations (no full rerun, other assignments untouched)
+def replace_worker():
+    st.header("🔁 Replace a Worker")
+
+    run_id = current_run_id()
+    if not run_id:
+        st.info("❌ No assignment run recorded yet.")
+        return
+
+    worker_id = st.text_input("Worker ID of the worker who dropped the shift").strip()
+    if not worker_id:
+        return
+
+    # ✅ Looked up once per (run, worker); picking a candidate reruns without re-querying
+    lookup = st.session_state.get("replacement_lookup")
+    if not lookup or lookup["key"] != (run_id, worker_id):
+        started = time.perf_counter()
+        snapshot, vacated_doc_id = replacements.find_vacated(db, run_id, worker_id)
+        candidates = replacements.find_replacements(db, explanation_store, run_id, snapshot.to_dict()) if snapshot else []
+        lookup = st.session_state["replacement_lookup"] = {
+            "key": (run_id, worker_id), "snapshot": snapshot, "vacated_doc_id": vacated_doc_id,
+            "candidates": candidates, "elapsed_ms": (time.perf_counter() - started) * 1000
+        }
+    snapshot, vacated_doc_id, candidates = lookup["snapshot"], lookup["vacated_doc_id"], lookup["candidates"]
+
+    if snapshot is None:
+        st.warning(f"⚠️ {worker_id} has no assignment in the current run.")
+        return
+    assignment = snapshot.to_dict()
+    st.write(f"📍 **{assignment['role']}** at **{assignment['job_site_id']}**" + (f", {assignment['shift']} shift" if assignment.get('shift') else ""))
+    st.caption(f"Found {len(candidates)} candidates in {lookup['elapsed_ms']:.0f} ms")
+    if not candidates:
+        st.warning("⚠️ No free eligible workers for this position.")
+        return
+
+    st.dataframe(pd.DataFrame(candidates).drop(columns=["doc_id"]), use_container_width=True, hide_index=True,
+                 column_config={"distance": st.column_config.NumberColumn(format="%.2f km")})
+    choice = st.selectbox("Replacement", candidates, format_func=lambda c: f"{c['name']} ({c['worker_id']}) - score {c['score']}, {c['distance']} km")
+    notify = st.checkbox("📲 Notify the replacement by SMS", value=True)
+
+    if st.button("✅ Assign Replacement"):
+        try:
+            replacements.assign_replacement(
+                db, run_id, snapshot, vacated_doc_id, choice, change_log=change_log,
+                actor=st.session_state.get("user_email"), notify=send_sms if notify else None,
+                explanation_store=explanation_store
+            )
+        except ReplacementConflict as e:
+            st.session_state.pop("replacement_lookup", None)
+            st.error(f"❌ {e}")
+            return
+        st.session_state.pop("replacement_lookup", None)
+        shared_cache.bump("my_assignments")
+        shared_cache.bump(f"run:{run_id}")  # Rosters, map lines and explanations of this run are reloaded
+        invalidate_tables("assignments")
+        st.success(f"✅ {choice['name']} ({choice['worker_id']}) replaces {worker_id}.")
+
+
 # ✅ Streamlit UI for Sending SMS Notifications
 def notify_employees():
     st.header("📲 Notify Employees via SMS")
@@ -785,34 +1383,43 @@ if not firebase_admin._apps:
     cred = credentials.Certificate("serviceAccountKey.json")  # Make sure you have this key file
     firebase_admin.initialize_app(cred)
 
-db = firestore.client()
+db = TenantClient(MeteredClient(firestore.client(), meter), tenant_id)
 users_ref = db.collection("users")  # Stores user authentication & role info
 employees_ref = db.collection("employees")  # Stores employee profile data
 
 def generate_worker_id():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    """Allocates a unique worker ID from the shared Firestore counter."""
+    return worker_ids.next_id()
 
 # ✅ Function to Register a User and Add to Employees Database
-def register_user(email, password):
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:signUp?key={FIREBASE_WEB_API_KEY}"
-    data = {"email": email, "password": password, "returnSecureToken": True}
-    response = requests.post(url, json=data)
-    result = response.json()
+def register_user(email, password, company_code=""):
+    # ✅ Workers join their employer's tenant; without a company code they join the default one
+    tenant = company_code.strip() or tenants.DEFAULT_TENANT
+    if not tenants.exists(db, tenant):
+        st.error("❌ Unknown company code. Ask your employer for it.")
+        return
+    tenant_db = db.for_tenant(tenant)
+
+    try:
+        user_id, tokens = auth_session.sign_up(FIREBASE_WEB_API_KEY, email, password)
+    except AuthError as e:
+        st.error(f"❌ Registration failed: {e}")
+        return
 
-    if "idToken" in result:
-        user_id = result["localId"]
-        worker_id = generate_worker_id()  # Generate a unique worker ID
+    if user_id:
+        worker_id = worker_id_allocator(tenant_db).allocate(1)[0]  # Generate a unique worker ID in the tenant
 
         st.success(f"✅ Account created successfully: {email}")
 
         # ✅ Store user data in Firestore (Default role: Employee)
-        users_ref.document(user_id).set({
+        user_data = {
             "email": email,
-            "role": "employee"
-        })
+            "role": "employee",
+            "tenant_id": tenant
+        }
 
         # ✅ Store employee profile with default values in Firestore
-        employees_ref.document(user_id).set({
+        employee_data = stamp("employees", {
             "worker_id": worker_id,  # Store the generated worker ID
             "email": email,
             "first_name": "",
@@ -823,20 +1430,26 @@ def register_user(email, password):
             "have_car": "No",
             "role": [],
             "availability": [],
-            "certificates": [],
+            "certificates": {},
             "skills": [],
             "rating": 3.0  # Default rating
         })
 
-        # ✅ Update session and redirect
-        st.session_state["authenticated"] = True
-        st.session_state["user_id"] = user_id
-        st.session_state["user_email"] = email
-        st.session_state["user_role"] = "employee"
+        # ✅ Both documents and their change-log entries commit in one batch
+        tenant_log = ChangeLog(tenant_db)
+        commit_in_chunks(db, [
+            ("set", users_ref.document(user_id), user_data),
+            ("set", tenant_db.collection("employees").document(user_id), employee_data),
+            tenant_log.operation("user", user_id, user_data.keys(), email, "create"),
+            tenant_log.operation("employee", user_id, employee_data.keys(), email, "create")
+        ])
+
+        # ✅ Update session and redirect (claims are known, so no lookups)
+        session = AuthSession(st.session_state, db, FIREBASE_WEB_API_KEY).start(
+            user_id, email, tokens, claims={"role": "employee", "tenant_id": tenant, "worker_id": worker_id}
+        )
+        apply_auth_session(session)
         st.rerun()
-    else:
-        error_message = result.get('error', {}).get('message', 'Unknown error')
-        st.error(f"❌ Registration failed: {error_message}")
 
 
 #----------------------------------------------------------------------------------------
@@ -844,28 +1457,42 @@ def register_user(email, password):
 
 # ✅ Function to Log In a User
 def login_user(email, password):
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={FIREBASE_WEB_API_KEY}"
-    data = {"email": email, "password": password, "returnSecureToken": True}
-    response = requests.post(url, json=data)
-    result = response.json()
-
-    if "idToken" in result:
-        user_id = result["localId"]
-        user_doc = users_ref.document(user_id).get()
-
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            st.session_state["authenticated"] = True
-            st.session_state["user_id"] = user_id
-            st.session_state["user_email"] = email
-            st.session_state["user_role"] = user_data.get("role", "employee")
-            st.session_state["login_error"] = None  # ✅ Clear previous errors
-            st.rerun()
-        else:
-            st.session_state["login_error"] = "❌ User not found in Firestore. Contact admin."
+    try:
+        session = AuthSession(st.session_state, db, FIREBASE_WEB_API_KEY).login(email, password)
+    except AuthError as e:
+        st.session_state["login_error"] = f"❌ Login failed: {e}"  # ✅ Store error message persistently
+        return
+
+    apply_auth_session(session)
+    st.session_state["login_error"] = None  # ✅ Clear previous errors
+    st.rerun()
+
+
+def apply_auth_session(session):
+    """Mirrors the verified session (tokens + cached role/tenant/worker_id claims) into the keys the UI reads."""
+    st.session_state["authenticated"] = True
+    st.session_state["user_id"] = session["uid"]
+    st.session_state["user_email"] = session["email"]
+    st.session_state["user_role"] = session["claims"].get("role", "employee")
+    st.session_state["worker_id"] = session["claims"].get("worker_id")
+    st.session_state["tenant_id"] = session["claims"].get("tenant_id", tenants.DEFAULT_TENANT)
+
+
+def restore_auth_session():
+    """Called on every rerun: free while the ID token is fresh, one refresh round-trip when it is about to expire."""
+    if not st.session_state.get("authenticated"):
+        return
+    try:
+        session = AuthSession(st.session_state, db, FIREBASE_WEB_API_KEY).current()
+    except AuthError as e:
+        session = None
+        st.session_state["login_error"] = f"❌ {e} Please log in again."
+    if session:
+        apply_auth_session(session)
     else:
-        error_message = result.get('error', {}).get('message', 'Invalid credentials')
-        st.session_state["login_error"] = f"❌ Login failed: {error_message}"  # ✅ Store error message persistently
+        for key in ["authenticated", "user_id", "user_email", "user_role", "worker_id", "tenant_id"]:
+            st.session_state.pop(key, None)
+        st.session_state["authenticated"] = False
 
 
 #----------------------------------------------------------------------------------------
@@ -891,9 +1518,17 @@ def update_profile():
         if "worker_id" not in employee or not employee["worker_id"]:
             worker_id = generate_worker_id()
             employees_ref.document(user_id).update({"worker_id": worker_id})
+            change_log.append("employee", user_id, ["worker_id"], st.session_state.get("user_email"))
+            employee["worker_id"] = worker_id
+            AuthSession(st.session_state, db, FIREBASE_WEB_API_KEY).update_claims(worker_id=worker_id)
+            st.session_state.pop("profile_update_time", None)  # The write above bumped update_time
         else:
             worker_id = employee["worker_id"]
 
+        # ✅ Remember the version the form was first shown with (the submit rerun re-reads the document)
+        loaded_update_time = st.session_state.setdefault("profile_update_time", employee_doc.update_time)
+        current = upgrade("employees", employee)  # Legacy shapes (string roles, certificate lists) shown as canonical until migrated
+
         with st.form("update_profile_form"):
             first_name = st.text_input("First Name", employee.get("first_name", "").strip())
             middle_name = st.text_input("Middle Name", employee.get("middle_name", "").strip())
@@ -905,32 +1540,30 @@ def update_profile():
             value=employee.get("home_address", "").strip() or "1110 Atwater Ave, Mississauga, ON L5E 1M9"
             )
 
-            have_car = st.selectbox("Do you have a car?", ["Yes", "No"], index=["Yes", "No"].index(employee.get("have_car", "No")))
-            role = st.multiselect("Role", ["Cleaner", "Labour", "Painter"], default=employee.get("role", []))
-            availability = st.multiselect("Availability", ["7:00-15:30", "14:00-22:00", "22:00-06:00"], default=employee.get("availability", []))
-            skills = st.multiselect("Skills", ["Boomlift", "Scissors Lift", "Forklift"], default=employee.get("skills", []))
+            have_car = st.selectbox("Do you have a car?", ["Yes", "No"], index=["Yes", "No"].index(current["have_car"]))
+            role = st.multiselect("Role", ROLES, default=[value for value in current["role"] if value in ROLES])
+            availability = st.multiselect("Availability", SHIFTS, default=[value for value in current["availability"] if value in SHIFTS])
+            skills = st.multiselect("Skills", SKILLS, default=[value for value in current["skills"] if value in SKILLS])
             
             st.subheader("📜 Certifications")
             updated_certificates = {}
 
-            certificates = employee.get("certificates", {})
-            if isinstance(certificates, list):
-                certificates = {cert: {"issue_date": "2024-01-01", "expiration_date": "2026-01-01"} for cert in certificates}
+            certificates = current["certificates"]
 
-            for cert in ["Working at Heights", "4 Steps", "WHMIS"]:
+            for cert in CERTIFICATES:
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     cert_selected = st.checkbox(cert, value=(cert in certificates))
                 with col2:
                     issue_date = st.date_input(
                         f"Issue Date for {cert}",
-                        value=pd.to_datetime(certificates.get(cert, {}).get("issue_date", "2024-01-01")),
+                        value=pd.to_datetime(certificates.get(cert, {}).get("issue_date") or "2024-01-01"),
                         disabled=not cert_selected
                     )
                 with col3:
                     expiration_date = st.date_input(
                         f"Expiration Date for {cert}",
-                        value=pd.to_datetime(certificates.get(cert, {}).get("expiration_date", "2026-01-01")),
+                        value=pd.to_datetime(certificates.get(cert, {}).get("expiration_date") or "2026-01-01"),
                         disabled=not cert_selected
                     )
                 
@@ -942,7 +1575,7 @@ def update_profile():
             
             rating_locked = employee.get("rating_locked", False)
             if not rating_locked:
-                rating = st.slider("Employee Rating (One-Time Auto-Evaluation)", min_value=0.0, max_value=5.0, value=float(employee.get("rating", 3.0)), step=0.1)
+                rating = st.slider("Employee Rating (One-Time Auto-Evaluation)", min_value=0.0, max_value=5.0, value=current["rating"], step=0.1)
                 st.warning("⚠️ You can only set your rating once.")
             else:
                 rating = employee.get("rating", "N/A")
@@ -970,10 +1603,20 @@ def update_profile():
                 updated_data["rating_locked"] = True
 
             try:
-                employees_ref.document(user_id).update(updated_data)
+                changes = update_changed_fields(
+                    db, employees_ref.document(user_id), "employee", employee, updated_data,
+                    loaded_update_time=loaded_update_time, actor=st.session_state.get("user_email")
+                )
+                if not changes:
+                    st.info("ℹ️ No changes to save.")
+                    return
+                st.session_state.pop("profile_update_time", None)
                 st.success("✅ Profile updated successfully!")
                 st.session_state["profile_updated"] = True
                 st.rerun()
+            except StaleEditError as e:
+                st.session_state.pop("profile_update_time", None)
+                st.error(f"❌ {e}")
             except Exception as e:
                 st.error(f"❌ Error updating profile: {str(e)}")
 
@@ -1008,6 +1651,18 @@ def update_profile():
 
 #----------------------------------------------------------------------------------------               
 
+# ✅ Worker Assignment Lookup (one cached point read per worker)
+@st.cache_data(ttl=300, show_spinner=False)
+def get_my_assignment(user_id, version=0):
+    """Returns the denormalized assignment written by do_assignments(), or None (shared across replicas per run)."""
+    def load():
+        doc = my_assignments_ref.document(user_id).get()
+        return doc.to_dict() if doc.exists else None
+    return shared_cache.get_or_load(f"my_assignment:{version}:{user_id}", load, ttl=300)
+
+
+#----------------------------------------------------------------------------------------
+
 # ✅ Main View (For Admins)
 def main_view():
     if not st.session_state.get("authenticated"):
@@ -1020,23 +1675,9 @@ def main_view():
     user_id = st.session_state.get("user_id")  # This is the document ID in "users" collection
     user_role = st.session_state.get("user_role", "employee")  # Default role is "employee"
 
-    # Step 1: Fetch the Employee's Worker ID using the User's Document ID
-    worker_id = None
-    if user_role == "employee":
-        employee_doc = employees_ref.document(user_id).get()  # Fetch employee document
-        if employee_doc.exists:
-            worker_id = employee_doc.to_dict().get("worker_id")  # Extract worker_id
-
-    # Step 2: Fetch the Assignment using Worker ID
-    assigned_job = None
-    if worker_id:
-        def get_assigned_job(worker_id):
-            assigned_job = assignments_ref.where("employee_id", "==", worker_id).stream()
-            for job in assigned_job:
-                return job.to_dict()  # Return the first found assignment
-            return None  # No job assigned
-
-        assigned_job = get_assigned_job(worker_id)  # Retrieve assigned job
+    # ✅ Fetch the Employee's Assignment with one cached point read on the denormalized view
+    if user_role == "employee" and user_id:
+        assigned_job = get_my_assignment(user_id, shared_cache.version("my_assignments"))
 
         if st.button("📝 Update your Information"):
             st.session_state["selected_section"] = "profile"
@@ -1045,18 +1686,23 @@ def main_view():
 
         # 🔹 **Display Job Assignment Details ONLY for Employees**
         if assigned_job:
-            job_site = job_sites_ref.document(assigned_job['job_site_id']).get()
-            job_site_data = job_site.to_dict() if job_site.exists else {}
-
             st.success("✅ You have been assigned to a job site!")
-            st.write(f"🏗 **Site Name:** {job_site_data.get('site_name', 'Unknown')}")
-            st.write(f"📍 **Address:** {job_site_data.get('address', 'Unknown')}")
+            st.write(f"🏗 **Site Name:** {assigned_job.get('site_name', 'Unknown')}")
+            st.write(f"📍 **Address:** {assigned_job.get('address', 'Unknown')}")
             st.write(f"👷 **Role:** {assigned_job['role']}")
+            if assigned_job.get('shift'):
+                st.write(f"🕒 **Shift:** {assigned_job['shift']}")
             st.write(f"📏 **Distance:** {round(assigned_job.get('distance', 0), 2)} km")
             st.write(f"📅 **Assigned On:** {assigned_job['assigned_date'].strftime('%Y-%m-%d %H:%M')}")
         else:
             st.warning("⚠️ No job site assigned yet.")
 
+        worker_id = st.session_state.get("worker_id")
+        if worker_id and st.toggle("🤔 Why this result?"):
+            run_id = assigned_job["run_id"] if assigned_job else current_run_id()
+            if run_id:
+                show_worker_explanation(run_id, worker_id)
+
         st.write("---")  # Second horizontal line
 
     # 🔹 **For Admins, Don't Show Blank Row**
@@ -1077,10 +1723,14 @@ def main_view():
     # Load relevant section
     if st.session_state.get("selected_section") == "employees":
         st.subheader("👥 Employee Actions")
-        menu = ["Add Employee", "View Employees", "Find and Update Employee"]
+        menu = ["Add Employee", "Bulk Import Employees", "View Employees", "Find and Update Employee"]
         choice = st.selectbox("Select an option", menu, index=None, placeholder="Select an action", label_visibility="collapsed")
+        if choice:
+            metered_page(choice)
         if choice == "Add Employee":
             add_employee_form()
+        elif choice == "Bulk Import Employees":
+            bulk_import_form("employees")
         elif choice == "View Employees":
             view_employees()
         elif choice == "Find and Update Employee":
@@ -1088,10 +1738,14 @@ def main_view():
 
     elif st.session_state.get("selected_section") == "job_sites":
         st.subheader("🏗️ Job Site Actions")
-        menu = ["Add Job Site", "View Job Sites", "Find and Update Job Site"]
+        menu = ["Add Job Site", "Bulk Import Job Sites", "View Job Sites", "Find and Update Job Site"]
         choice = st.selectbox("Select an option", menu, index=None, placeholder="Select an action", label_visibility="collapsed")
+        if choice:
+            metered_page(choice)
         if choice == "Add Job Site":
             add_job_site_form()
+        elif choice == "Bulk Import Job Sites":
+            bulk_import_form("job_sites")
         elif choice == "View Job Sites":
             view_job_sites()
         elif choice == "Find and Update Job Site":
@@ -1099,16 +1753,29 @@ def main_view():
 
     elif st.session_state.get("selected_section") == "assignments":
         st.subheader("📋 Assignments Actions")
-        menu = ["View Assignments", "Do Assignments", "Notify Employees"]
+        menu = ["View Assignments", "Coverage", "Map", "Export Rosters", "Explain Assignments", "Replace Worker", "Do Assignments", "Notify Employees"]
         choice = st.selectbox("Select an option", menu, index=None, placeholder="Select an action", label_visibility="collapsed")
+        if choice:
+            metered_page(choice)
         if choice == "View Assignments":
             view_assignments()
+        elif choice == "Coverage":
+            coverage_dashboard()
+        elif choice == "Map":
+            map_page()
+        elif choice == "Export Rosters":
+            export_rosters()
+        elif choice == "Explain Assignments":
+            explain_assignments()
+        elif choice == "Replace Worker":
+            replace_worker()
         elif choice == "Do Assignments":
             do_assignments()
         elif choice == "Notify Employees":
             notify_employees()
 
     elif st.session_state.get("selected_section") == "profile":
+        metered_page("Profile")
         update_profile()
 
     st.write("---")
@@ -1177,13 +1844,11 @@ def authentication_ui():
         email = st.text_input("Enter Email Address")
         password = st.text_input("Enter Password", type="password")
         confirm_password = st.text_input("Confirm Password", type="password")
+        company_code = st.text_input("🏢 Company Code (optional)")
 
         if st.button("Register"):
             if password == confirm_password:
-                register_user(email, password)
-                st.session_state["show_logo_after_auth"] = True
-                st.session_state["login_error"] = None
-                st.rerun()
+                register_user(email, password, company_code)  # Reruns on success; errors stay on the page
             else:
                 st.warning("⚠️ Passwords do not match. Please try again.")
 
@@ -1213,11 +1878,13 @@ def main():
         st.write("- ⏳ **Availability Match:** +4 pts if schedules align.")
         st.write("- 🚗 **Owns a Car:** +3 pts for easier commute.")
         st.write("- 📍 **Close to Job Site:** +2 pts if within 40 km.")
+        st.write("- ⚖️ **Fair Workload:** up to -3 pts for recent hours worked, -2 pts after 5 days in a row.")
 
         st.write("⚡ Employees with the **highest score** are assigned first, ensuring fairness & efficiency.")
         st.write("📊 **Automated, dynamic assignments** keep your workforce optimized in real-time!")
 
 
+    restore_auth_session()
     authentication_ui()
     
     if not st.session_state.get("authenticated"):
@@ -1228,4 +1895,5 @@ def main():
 
 # ✅ Run App
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    with meter.run("Dashboard" if st.session_state.get("authenticated") else "Login", metrics_session()):
+        main()
\ No newline at end of file
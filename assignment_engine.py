@@ -0,0 +1,83 @@
+import geopy.distance
+
+# ✅ Scoring weights (shown to users in the sidebar of app.py)
+ROLE_MATCH_POINTS = 5
+AVAILABILITY_POINTS = 4
+CAR_POINTS = 3
+NEARBY_POINTS = 2
+NEARBY_KM = 40
+SCORE_COMPONENTS = ("role", "availability", "car", "nearby", "fairness")
+
+
+def calculate_distance(employee_location, site_location):
+    if None in employee_location or None in site_location:
+        print(f"⚠️ Cannot calculate distance. Missing coordinates: {employee_location}, {site_location}")
+        return float('inf')
+    return geopy.distance.distance(employee_location, site_location).km
+
+
+def candidate_priority(candidate):
+    """Sort key: higher score first, then shorter distance, then higher rating."""
+    return (-candidate['score'], candidate['distance'], -candidate['employee'].get('rating', 0))
+
+
+def score_candidates(site, role, role_data, employees):
+    """Scores every employee whose role matches and returns them best first."""
+    work_schedule = role_data.get('work_schedule', [])
+    site_location = (site.get('latitude'), site.get('longitude'))
+    candidates = []
+    for employee in employees:
+        # ✅ Strict role matching
+        if role not in employee.get('role', []):
+            continue
+
+        matching_shifts = [shift for shift in work_schedule if shift in employee.get('availability', [])]
+        shift = matching_shifts[0] if matching_shifts else next(iter(work_schedule), None)
+        distance = calculate_distance((employee.get('latitude'), employee.get('longitude')), site_location)
+
+        # ✅ Points per criterion, in SCORE_COMPONENTS order (kept for explanations)
+        components = (
+            ROLE_MATCH_POINTS,
+            AVAILABILITY_POINTS if matching_shifts else 0,
+            CAR_POINTS if employee.get('have_car', 'No') == 'Yes' else 0,
+            NEARBY_POINTS if distance <= NEARBY_KM else 0,
+            -employee.get('fairness_penalty', 0)  # Precomputed per run by worker_stats.apply_fairness()
+        )
+        candidates.append({'employee': employee, 'score': sum(components), 'components': components, 'distance': distance, 'shift': shift})
+
+    candidates.sort(key=candidate_priority)
+    return candidates
+
+
+def solve_greedy(employees, job_sites, taken=None):
+    """
+    Fills each site's roles in order with the best-ranked free employees.
+
+    Returns (picks, rankings): picks are dicts with employee, site, role, shift,
+    distance and score; rankings maps (site_id, role) to the full sorted
+    candidate list, so callers can find replacements without rescoring.
+    """
+    taken = set() if taken is None else taken
+    picks, rankings = [], {}
+
+    for site in job_sites:
+        for role, role_data in site.get('required_roles', {}).items():
+            required_count = role_data.get('num_workers', 0)
+            if required_count == 0:
+                continue
+
+            ranking = score_candidates(site, role, role_data, employees)
+            rankings[(site['site_id'], role)] = ranking
+
+            assigned = 0
+            for candidate in ranking:
+                if assigned >= required_count:
+                    break
+                worker_id = candidate['employee']['worker_id']
+                if worker_id in taken:
+                    continue
+                picks.append({**candidate, 'site': site, 'role': role})
+                taken.add(worker_id)
+                assigned += 1
+
+    return picks, rankings
@@ -0,0 +1,83 @@
+import migrations
+from concurrent_loader import stream_queries
+from document_schema import role_spellings, upgrade
+
+IN_QUERY_LIMIT = 30  # Firestore limit for "in" / "array_contains_any" filters
+
+# ✅ Only what scoring, geocoding and the run's denormalized writes read
+EMPLOYEE_FIELDS = [
+    "worker_id", "role", "availability", "have_car", "latitude", "longitude", "home_address", "rating",
+    "first_name", "sur_name"
+]
+JOB_SITE_FIELDS = ["site_id", "site_name", "address", "latitude", "longitude", "required_roles"]
+LEGACY_JOB_SITE_FIELDS = ["job_status", "job_status_key", "active", "location", "work_schedule", "schema_version"]
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Pushed-down loaders for a run
+
+def load_active_job_sites(db, fields=JOB_SITE_FIELDS):
+    """
+    Active job sites with an equality filter on `job_status_key` and a field projection.
+
+    Until the job_sites migration has finished (see migrations.finished), active
+    sites that still lack the key are added as well: the collection is scanned
+    and those documents are upgraded in memory, so no site drops out of a run
+    while the migration is pending or stopped halfway.
+    """
+    job_sites_ref = db.collection("job_sites")
+    sites = [doc.to_dict() for doc in job_sites_ref.where("job_status_key", "==", "active").select(fields).stream()]
+    if migrations.finished(db, "job_sites"):
+        return sites
+
+    legacy = []
+    for doc in job_sites_ref.select(list(dict.fromkeys(JOB_SITE_FIELDS + list(fields) + LEGACY_JOB_SITE_FIELDS))).stream():
+        data = doc.to_dict()
+        if "job_status_key" in data:
+            continue
+        site = upgrade("job_sites", data)
+        if site["job_status_key"] == "active":
+            legacy.append({field: site[field] for field in fields if field in site})
+    if legacy:
+        print(f"⚠️ {len(legacy)} active job sites without job_status_key read by a full scan; run `python migrations.py` to finish the migration.")
+    return sites + legacy
+
+
+def required_roles(job_sites):
+    return sorted({role for site in job_sites for role, data in site.get("required_roles", {}).items() if data.get("num_workers", 0)})
+
+
+def load_candidate_employees(db, roles):
+    """
+    Employees who hold at least one of `roles`, projected to EMPLOYEE_FIELDS.
+
+    Migrated documents store roles as a list of canonical names (see
+    document_schema). Until the employees migration has finished, legacy
+    spellings and single-string roles are queried as well and every document is
+    upgraded in memory, so unmigrated workers stay candidates.
+    """
+    employees_ref, employees = db.collection("employees"), {}
+    migrated = migrations.finished(db, "employees")
+    values = roles if migrated else role_spellings(roles)
+    chunks = [values[start:start + IN_QUERY_LIMIT] for start in range(0, len(values), IN_QUERY_LIMIT)]
+    queries = [employees_ref.where("role", "array_contains_any", chunk).select(EMPLOYEE_FIELDS) for chunk in chunks]
+    if not migrated:
+        queries += [employees_ref.where("role", "in", chunk).select(EMPLOYEE_FIELDS) for chunk in chunks]
+    for docs in stream_queries(queries):  # All role queries run concurrently
+        for doc in docs:
+            data = doc.to_dict()
+            if not migrated:
+                data = {field: value for field, value in upgrade("employees", data).items() if field in EMPLOYEE_FIELDS}
+                if not set(data["role"]) & set(roles):
+                    continue
+            employees[doc.id] = {**data, "doc_id": doc.id}
+    return list(employees.values())
+
+
+def load_inputs(db):
+    """(employees, job_sites) for an assignment run: active sites first, then only workers with a needed role."""
+    job_sites = load_active_job_sites(db)
+    roles = required_roles(job_sites)
+    return (load_candidate_employees(db, roles) if roles else []), job_sites
+
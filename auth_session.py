@@ -0,0 +1,157 @@
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from firebase_admin import auth
+
+from tenants import DEFAULT_TENANT, for_tenant
+
+IDENTITY_URL = "https://identitytoolkit.googleapis.com/v1/accounts"
+SECURE_TOKEN_URL = "https://securetoken.googleapis.com/v1/token"
+REFRESH_MARGIN_SECONDS = 300  # Refresh ID tokens this long before they expire
+SESSION_KEY = "auth_session"
+
+# ✅ One pooled HTTP session per process: keep-alive connections instead of a new TLS handshake per call
+http = requests.Session()
+http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+
+class AuthError(Exception):
+    """Sign-in, sign-up or token refresh failed; the message is user-facing."""
+
+
+def _call(url, api_key, **body):
+    """POSTs to an identity endpoint; network failures and non-JSON replies become AuthError like API errors do."""
+    try:
+        return http.post(url, params={"key": api_key}, timeout=15, **body).json()
+    except requests.RequestException as e:
+        raise AuthError(f"Could not reach the sign-in service: {e}")
+    except ValueError:
+        raise AuthError("Unexpected reply from the sign-in service.")
+
+
+def _post(url, api_key, payload):
+    result = _call(url, api_key, json=payload)
+    if "error" in result:
+        error = result["error"]
+        raise AuthError(error.get("message", "Unknown error") if isinstance(error, dict) else str(error))
+    return result
+
+
+def _tokens(id_token, refresh_token, expires_in):
+    return {
+        "id_token": id_token,
+        "refresh_token": refresh_token,
+        "expires_at": time.time() + int(expires_in)
+    }
+
+
+def sign_in(api_key, email, password):
+    """Email/password sign-in; returns (uid, tokens)."""
+    result = _post(f"{IDENTITY_URL}:signInWithPassword", api_key, {"email": email, "password": password, "returnSecureToken": True})
+    return result["localId"], _tokens(result["idToken"], result["refreshToken"], result["expiresIn"])
+
+
+def sign_up(api_key, email, password):
+    """Creates an email/password account; returns (uid, tokens)."""
+    result = _post(f"{IDENTITY_URL}:signUp", api_key, {"email": email, "password": password, "returnSecureToken": True})
+    return result["localId"], _tokens(result["idToken"], result["refreshToken"], result["expiresIn"])
+
+
+def refresh(api_key, refresh_token):
+    """Exchanges a refresh token for a new ID token; returns tokens."""
+    result = _call(SECURE_TOKEN_URL, api_key, data={"grant_type": "refresh_token", "refresh_token": refresh_token})
+    if "error" in result:
+        error = result["error"]
+        raise AuthError(error.get("message", "Session expired") if isinstance(error, dict) else str(error))
+    return _tokens(result["id_token"], result["refresh_token"], result["expires_in"])
+
+
+def verify(id_token):
+    """
+    Verifies an ID token locally: firebase_admin checks the signature against Google's
+    public keys, which it caches for as long as their Cache-Control header allows.
+    """
+    try:
+        return auth.verify_id_token(id_token, clock_skew_seconds=10)
+    except (ValueError, auth.InvalidIdTokenError, auth.ExpiredIdTokenError, auth.CertificateFetchError) as e:
+        raise AuthError(f"Invalid session: {e}")
+
+
+#----------------------------------------------------------------------------------------
+
+class AuthSession:
+    """
+    Signed-in user kept in a per-user mapping (st.session_state in app.py).
+
+    Stores the ID and refresh tokens with their expiry plus the user's role,
+    tenant_id and worker_id claims. `current()` answers from that state with
+    no network calls until the ID token is about to expire, then refreshes it
+    once.
+    """
+
+    def __init__(self, state, db, api_key):
+        self.state = state
+        self.db = db
+        self.api_key = api_key
+
+    @property
+    def data(self):
+        return self.state.get(SESSION_KEY)
+
+    def _load_claims(self, uid, decoded):
+        """role, tenant_id and worker_id from custom token claims when set, else one read of users/{uid} and employees/{uid}."""
+        role, tenant_id, worker_id = decoded.get("role"), decoded.get("tenant_id"), decoded.get("worker_id")
+        if role is None or tenant_id is None:
+            user_doc = self.db.collection("users").document(uid).get()
+            if not user_doc.exists:
+                raise AuthError("User not found in Firestore. Contact admin.")
+            user = user_doc.to_dict()
+            role, tenant_id = role or user.get("role", "employee"), tenant_id or user.get("tenant_id", DEFAULT_TENANT)
+        if worker_id is None:
+            employee_doc = for_tenant(self.db, tenant_id).collection("employees").document(uid).get(["worker_id"])
+            worker_id = employee_doc.to_dict().get("worker_id") if employee_doc.exists else None
+        return {"role": role, "tenant_id": tenant_id, "worker_id": worker_id}
+
+    def start(self, uid, email, tokens, claims=None):
+        """Stores a freshly signed-in user; `claims` skips the lookup when the caller already knows them."""
+        decoded = verify(tokens["id_token"])
+        if decoded["uid"] != uid:
+            raise AuthError("Token does not belong to this user.")
+        self.state[SESSION_KEY] = {
+            **tokens,
+            "uid": uid,
+            "email": email,
+            "claims": claims or self._load_claims(uid, decoded)
+        }
+        return self.state[SESSION_KEY]
+
+    def login(self, email, password):
+        uid, tokens = sign_in(self.api_key, email, password)
+        return self.start(uid, email, tokens)
+
+    def current(self):
+        """The signed-in session, refreshing the ID token only when it is close to expiry; None when signed out."""
+        data = self.data
+        if not data:
+            return None
+        if time.time() < data["expires_at"] - REFRESH_MARGIN_SECONDS:
+            return data  # ✅ Authenticated rerun: no network
+
+        try:
+            tokens = refresh(self.api_key, data["refresh_token"])
+        except AuthError:
+            if time.time() < data["expires_at"]:
+                return data  # Still valid: a failed early refresh is retried on the next rerun
+            raise
+        decoded = verify(tokens["id_token"])
+        data = {**data, **tokens, "claims": self._load_claims(data["uid"], decoded)}  # Pick up role changes hourly
+        self.state[SESSION_KEY] = data
+        return data
+
+    def update_claims(self, **claims):
+        if self.data:
+            self.data["claims"].update(claims)
+
+    def logout(self):
+        self.state.pop(SESSION_KEY, None)
@@ -0,0 +1,438 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from document_schema import (
+    CERTIFICATES, JOB_STATUSES, ROLE_ALIASES, ROLES, SHIFT_ALIASES, SHIFTS, SKILLS, canonical_certificates, no_dates, stamp,
+    status_key
+)
+from firestore_batch import commit_in_chunks
+from tenants import DEFAULT_TENANT
+
+CHECKPOINT_DIR = ".import_checkpoints"
+
+# ✅ Optional columns: a blank cell gets a default on create, but leaves the stored value alone on update
+DEFAULTED_COLUMNS = {
+    "employees": {"middle_name": ["middle_name"], "have_car": ["have_car"], "availability": ["availability"], "skills": ["skills"], "rating": ["rating"]},
+    "job_sites": {"job_status": ["job_status", "job_status_key"]}
+}
+
+
+class RowError(ValueError):
+    """Raised when a row cannot be imported; the message goes into the error report."""
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Streaming readers: neither format is loaded into memory at once
+
+def iter_row_chunks(file, filename, chunk_size=1000):
+    """Yields lists of row dicts (all values as strings) from a CSV or XLSX file."""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        yield from _iter_xlsx_chunks(file, chunk_size)
+    else:
+        for frame in pd.read_csv(file, chunksize=chunk_size, dtype=str, keep_default_na=False):
+            yield frame.to_dict("records")
+
+
+def _iter_xlsx_chunks(file, chunk_size):
+    from openpyxl import load_workbook  # Optional dependency, only needed for Excel files
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(col).strip() if col is not None else "" for col in next(rows, [])]
+        chunk = []
+        for values in rows:
+            chunk.append({col: "" if value is None else str(value) for col, value in zip(header, values)})
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Field normalizers
+
+def _clean(value):
+    return re.sub(r"\s+", " ", str(value or "")).strip()
+
+
+def normalize_choices(value, allowed, aliases=None, field="value"):
+    """Splits a ',', ';' or '|' separated cell and maps each entry onto the allowed spelling."""
+    lookup = {choice.lower(): choice for choice in allowed}
+    lookup.update(aliases or {})
+    result = []
+    for part in re.split(r"[,;|]", str(value or "")):
+        part = _clean(part).lower()
+        if not part:
+            continue
+        if part not in lookup:
+            raise RowError(f"Unknown {field}: '{part}'")
+        if lookup[part] not in result:
+            result.append(lookup[part])
+    return result
+
+
+def normalize_phone(value):
+    """Returns a North American number in E.164 form (+1XXXXXXXXXX)."""
+    digits = re.sub(r"\D", "", str(value or ""))
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    if len(digits) != 10:
+        raise RowError(f"Invalid phone number: '{value}'")
+    return f"+1{digits}"
+
+
+def phone_key(value):
+    """Comparable form of a phone number regardless of how it was stored."""
+    digits = re.sub(r"\D", "", str(value or ""))
+    return digits[-10:] if len(digits) >= 10 else None
+
+
+def normalize_yes_no(value, default="No"):
+    value = _clean(value).lower()
+    if not value:
+        return default
+    if value in ("yes", "y", "true", "1"):
+        return "Yes"
+    if value in ("no", "n", "false", "0"):
+        return "No"
+    raise RowError(f"Expected Yes/No, got '{value}'")
+
+
+def normalize_date(value, field):
+    value = _clean(value)
+    try:
+        return pd.to_datetime(value).strftime("%Y-%m-%d")
+    except (ValueError, TypeError):
+        raise RowError(f"Invalid {field}: '{value}'")
+
+
+def without_blank_columns(kind, row, record):
+    """The record minus the defaulted fields of the row's blank optional columns, for merging into an existing record."""
+    blank = {field for column, fields in DEFAULTED_COLUMNS[kind].items() if not _clean(row.get(column)) for field in fields}
+    return {field: value for field, value in record.items() if field not in blank}
+
+
+def normalize_employee_row(row):
+    """Validates one employee row and returns the Firestore document shape."""
+    first_name, sur_name = _clean(row.get("first_name")), _clean(row.get("sur_name"))
+    if not first_name or not sur_name:
+        raise RowError("first_name and sur_name are required")
+
+    home_address = _clean(row.get("home_address"))
+    if len(home_address.split()) < 2:
+        raise RowError(f"Invalid home_address: '{home_address}'")
+
+    roles = normalize_choices(row.get("role"), ROLES, ROLE_ALIASES, "role")
+    if not roles:
+        raise RowError("At least one role is required")
+
+    rating = _clean(row.get("rating")) or "3.0"
+    try:
+        rating = float(rating)
+    except ValueError:
+        raise RowError(f"Invalid rating: '{rating}'")
+    if not 0.0 <= rating <= 5.0:
+        raise RowError(f"Rating out of range: {rating}")
+
+    return stamp("employees", {
+        "worker_id": _clean(row.get("worker_id")),
+        "first_name": first_name,
+        "middle_name": _clean(row.get("middle_name")),
+        "sur_name": sur_name,
+        "phone_number": normalize_phone(row.get("phone_number")),
+        "home_address": home_address,
+        "have_car": normalize_yes_no(row.get("have_car")),
+        "role": roles,
+        "availability": normalize_choices(row.get("availability"), SHIFTS, SHIFT_ALIASES, "shift"),
+        "certificates": {name: no_dates() for name in normalize_choices(row.get("certificates"), CERTIFICATES, field="certificate")},
+        "skills": normalize_choices(row.get("skills"), SKILLS, field="skill"),
+        "rating": round(rating, 1)
+    })
+
+
+def normalize_job_site_row(row):
+    """
+    Validates one job site row. Required roles come from `<Role>_workers` and
+    `<Role>_schedule` columns, e.g. Cleaner_workers=3, Cleaner_schedule="day;night".
+    """
+    site = {
+        "site_id": _clean(row.get("site_id")),
+        "site_name": _clean(row.get("site_name")),
+        "site_company": _clean(row.get("site_company")),
+        "site_superintendent": _clean(row.get("site_superintendent")),
+        "site_contact_number": normalize_phone(row.get("site_contact_number")),
+        "address": _clean(row.get("address")),
+        "job_status": (normalize_choices(row.get("job_status") or "Active", JOB_STATUSES, field="job_status") or ["Active"])[0],
+        "work_start_date": normalize_date(row.get("work_start_date"), "work_start_date"),
+        "work_end_date": normalize_date(row.get("work_end_date"), "work_end_date"),
+        "required_roles": {}
+    }
+    site["job_status_key"] = status_key(site["job_status"])
+    missing = [field for field in ("site_name", "site_company", "site_superintendent", "address") if not site[field]]
+    if missing:
+        raise RowError(f"Missing required fields: {', '.join(missing)}")
+
+    for role in ROLES:
+        raw_count = _clean(row.get(f"{role}_workers")) or "0"
+        try:
+            num_workers = int(float(raw_count))
+        except ValueError:
+            raise RowError(f"Invalid {role}_workers: '{raw_count}'")
+        if num_workers > 0:
+            site["required_roles"][role] = {
+                "work_schedule": normalize_choices(row.get(f"{role}_schedule"), SHIFTS, SHIFT_ALIASES, "shift"),
+                "num_workers": num_workers
+            }
+    return stamp("job_sites", site)
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Dedupe indexes (built once from projected fields, then kept up to date while importing)
+
+class EmployeeIndex:
+    """worker_id / phone -> document reference for existing employees, plus each one's worker_id and certificate names."""
+
+    def __init__(self, collection_ref):
+        self.collection_ref = collection_ref
+        self.by_worker_id, self.by_phone, self.worker_id_of, self.certificates_of = {}, {}, {}, {}
+        self.legacy_certificates = set()  # Documents whose certificates are still a list of names
+        for doc in collection_ref.select(["worker_id", "phone_number", "certificates"]).stream():
+            data = doc.to_dict()
+            self.add(doc.reference, data.get("worker_id"), data.get("phone_number"), data.get("certificates"))
+            if data.get("certificates") and not isinstance(data["certificates"], dict):
+                self.legacy_certificates.add(doc.id)
+
+    def add(self, ref, worker_id, phone_number, certificates=None):
+        if worker_id:
+            self.by_worker_id[worker_id] = ref
+            self.worker_id_of[ref.id] = worker_id
+        key = phone_key(phone_number)
+        if key:
+            self.by_phone[key] = ref
+        self.certificates_of.setdefault(ref.id, set()).update(canonical_certificates(certificates or {}))
+        if certificates and isinstance(certificates, dict):
+            self.legacy_certificates.discard(ref.id)  # Merged as a map from now on
+
+    def match(self, record):
+        """Returns the existing document for this worker, or None for a new one."""
+        by_id = self.by_worker_id.get(record["worker_id"]) if record["worker_id"] else None
+        by_phone = self.by_phone.get(phone_key(record["phone_number"]))
+        if by_id and by_phone and by_id.id != by_phone.id:
+            raise RowError(f"worker_id {record['worker_id']} and phone {record['phone_number']} belong to different employees")
+        if by_phone and not by_id and record["worker_id"]:
+            # Merging the file's ID over the stored one would orphan the worker's assignments and stats
+            raise RowError(f"phone {record['phone_number']} belongs to worker_id {self.worker_id_of.get(by_phone.id) or '(none)'}, "
+                           f"not {record['worker_id']}")
+        return by_id or by_phone
+
+    def new_certificates(self, ref, certificates):
+        """The imported certificates the employee does not have yet (a merge would replace stored dates with none)."""
+        stored = self.certificates_of.get(ref.id, set())
+        new = {name: dates for name, dates in certificates.items() if name not in stored}
+        if new and ref.id in self.legacy_certificates:
+            new = {**{name: no_dates() for name in stored}, **new}  # The map replaces the dateless list, keep its names
+        return new
+
+
+class JobSiteIndex:
+    """site_id -> document reference for existing job sites."""
+
+    def __init__(self, collection_ref):
+        self.collection_ref = collection_ref
+        self.by_site_id = {
+            doc.to_dict().get("site_id") or doc.id: doc.reference
+            for doc in collection_ref.select(["site_id"]).stream()
+        }
+
+    def add(self, ref, site_id):
+        self.by_site_id[site_id] = ref
+
+    def match(self, record):
+        return self.by_site_id.get(record["site_id"]) if record["site_id"] else None
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Resumable checkpoints, keyed by the file's content hash
+
+def file_fingerprint(file):
+    digest = hashlib.sha256()
+    for block in iter(lambda: file.read(1 << 20), b""):
+        digest.update(block if isinstance(block, bytes) else block.encode("utf-8"))
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _checkpoint_path(tenant_id, kind, fingerprint):
+    """One checkpoint per tenant, kind and file: the same file imported by two tenants resumes separately."""
+    return os.path.join(CHECKPOINT_DIR, tenant_id, f"{kind}_{fingerprint[:16]}.json")
+
+
+def load_checkpoint(tenant_id, kind, fingerprint):
+    path = _checkpoint_path(tenant_id, kind, fingerprint)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"rows_done": 0, "created": 0, "updated": 0, "errors": []}
+
+
+def save_checkpoint(tenant_id, kind, fingerprint, state):
+    path = _checkpoint_path(tenant_id, kind, fingerprint)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)  # Atomic, a crash never leaves half a checkpoint
+
+
+def clear_checkpoint(tenant_id, kind, fingerprint):
+    path = _checkpoint_path(tenant_id, kind, fingerprint)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Import pipeline
+
+def import_records(db, kind, file, filename, allocate_ids, geocode_cache=None, chunk_size=1000, on_progress=None,
+                   change_log=None, actor=None):
+    """
+    Streams `file` (CSV or XLSX) into the `employees` or `job_sites` collection.
+
+    Rows are validated and normalized, deduplicated against existing records,
+    geocoded through `geocode_cache`, and upserted in chunked batches. IDs in
+    the file only select existing records: new records always get IDs from
+    `allocate_ids(count)`, called once per chunk, so they never collide with
+    the allocator's range. Updates keep the stored dates of certificates the
+    employee already has, and blank optional cells (DEFAULTED_COLUMNS) leave
+    the stored values alone instead of resetting them. After each committed chunk a checkpoint is saved, so
+    re-running with the same file resumes where the last run stopped. With
+    `change_log`, each upsert also appends a change entry in the same batch.
+    Returns a summary dict with a per-row `errors` list ({"row", "error"});
+    row numbers are 1-based data rows.
+    """
+    entity = "employee" if kind == "employees" else "job_site"
+    if kind == "employees":
+        collection_ref = db.collection("employees")
+        index, normalize, id_field, address_field = EmployeeIndex(collection_ref), normalize_employee_row, "worker_id", "home_address"
+    elif kind == "job_sites":
+        collection_ref = db.collection("job_sites")
+        index, normalize, id_field, address_field = JobSiteIndex(collection_ref), normalize_job_site_row, "site_id", "address"
+    else:
+        raise ValueError(f"Unknown import kind: {kind}")
+
+    tenant_id, fingerprint = getattr(db, "tenant_id", DEFAULT_TENANT), file_fingerprint(file)
+    state = load_checkpoint(tenant_id, kind, fingerprint)
+    row_number = 0
+
+    for chunk in iter_row_chunks(file, filename, chunk_size):
+        if row_number + len(chunk) <= state["rows_done"]:
+            row_number += len(chunk)  # Already committed by a previous run
+            continue
+
+        upserts, pending = [], {}  # pending: file ID / phone key -> new record of this chunk, not created yet
+        for row in chunk:
+            row_number += 1
+            if row_number <= state["rows_done"]:
+                continue
+            try:
+                record = normalize(row)
+                existing_ref = index.match(record)
+
+                if geocode_cache is not None:
+                    lat, lon = geocode_cache.get(record[address_field])
+                    if lat is None or lon is None:
+                        raise RowError(f"Address could not be geocoded: '{record[address_field]}'")
+                    record["latitude"], record["longitude"] = lat, lon
+
+                file_id = record.pop(id_field)  # Matched on it, or the stored ID is kept; new records get an allocated one
+                if existing_ref is not None:
+                    record = without_blank_columns(kind, row, record)
+                    if kind == "employees":
+                        record["certificates"] = index.new_certificates(existing_ref, record["certificates"])
+                        if not record["certificates"]:
+                            record.pop("certificates")
+                        index.add(existing_ref, None, record["phone_number"], record.get("certificates"))  # Later rows dedupe against it
+                    upserts.append((record, existing_ref, None))
+                    continue
+
+                keys = [("id", file_id)] if file_id else []
+                if kind == "employees":
+                    keys.append(("phone", phone_key(record["phone_number"])))
+                first = next((pending[key] for key in keys if key in pending), None)
+                if first is not None:
+                    # ✅ A repeated new record in the same chunk updates the first one before it is created
+                    certificates = {**record.get("certificates", {}), **first.get("certificates", {})}
+                    first.update(without_blank_columns(kind, row, record))
+                    if kind == "employees":
+                        first["certificates"] = certificates
+                    state["updated"] += 1
+                    record = first
+                else:
+                    upserts.append((record, None, file_id))
+                pending.update((key, record) for key in keys)
+            except RowError as e:
+                state["errors"].append({"row": row_number, "error": str(e)})
+
+        # ✅ One reservation for the chunk's new records instead of one per record
+        new_records = [record for record, existing_ref, _ in upserts if existing_ref is None]
+        for record, new_id in zip(new_records, allocate_ids(len(new_records))):
+            record[id_field] = new_id
+
+        operations = []
+        for record, existing_ref, file_id in upserts:
+            if existing_ref is not None:
+                operations.append(("merge", existing_ref, record))
+                state["updated"] += 1
+                operation = "update"
+            else:
+                existing_ref = collection_ref.document(record[id_field]) if kind == "job_sites" else collection_ref.document()
+                operations.append(("create", existing_ref, record))
+                state["created"] += 1
+                operation = "create"
+                # ✅ Later chunks dedupe against new records too, also by the ID the file gave them
+                if kind == "employees":
+                    index.add(existing_ref, record["worker_id"], record["phone_number"], record["certificates"])
+                    if file_id:
+                        index.by_worker_id.setdefault(file_id, existing_ref)
+                else:
+                    index.add(existing_ref, record["site_id"])
+                    if file_id:
+                        index.by_site_id.setdefault(file_id, existing_ref)
+
+            if change_log is not None:
+                operations.append(change_log.operation(entity, existing_ref.id, record.keys(), actor, operation, source="bulk_import"))
+
+        commit_in_chunks(db, operations)
+        state["rows_done"] = row_number
+        save_checkpoint(tenant_id, kind, fingerprint, state)
+        if on_progress:
+            on_progress(state)
+
+    state["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    clear_checkpoint(tenant_id, kind, fingerprint)
+    return state
+
+
+def error_report_csv(errors):
+    """Renders the per-row error list as CSV text for download."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["row", "error"])
+    writer.writeheader()
+    writer.writerows(errors)
+    return buffer.getvalue()
@@ -0,0 +1,92 @@
+import random
+import string
+import time
+from datetime import timezone
+
+from firestore_batch import commit_in_chunks
+from record_updates import change_event
+
+
+class ChangeLog:
+    """
+    Append-only change log stored in a Firestore collection.
+
+    Every entry gets a sortable sequence id (`<epoch ns>-<random>`) that is
+    also its document id. Consumers keep the last sequence id they processed
+    as a cursor and ask for the entries after it, instead of rescanning whole
+    collections.
+    """
+
+    def __init__(self, db, collection="change_log"):
+        self.db = db
+        self.collection_ref = db.collection(collection)
+
+    @staticmethod
+    def _sequence_id():
+        suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+        return f"{time.time_ns():020d}-{suffix}"
+
+    def operation(self, entity, entity_id, changed_fields=(), actor=None, operation="update", **extra):
+        """Returns a ("create", ref, data) batch operation, so the entry commits atomically with the write it describes."""
+        event = {**change_event(entity, entity_id, changed_fields, actor, operation), **extra}
+        seq = self._sequence_id()
+        return ("create", self.collection_ref.document(seq), {**event, "seq": seq})
+
+    def append(self, entity, entity_id, changed_fields=(), actor=None, operation="update", **extra):
+        """Appends one entry immediately and returns its sequence id."""
+        _, ref, data = self.operation(entity, entity_id, changed_fields, actor, operation, **extra)
+        ref.create(data)
+        return data["seq"]
+
+    def record(self, event):
+        """Change listener for record_updates.subscribe()."""
+        return self.append(event["entity"], event["entity_id"], event["changed_fields"], event.get("actor"), event.get("operation", "update"))
+
+    #----------------------------------------------------------------------------------------
+
+    # ✅ Cursor-based reader API
+
+    def read(self, cursor=None, limit=500, entities=None, settle_seconds=2.0):
+        """
+        Returns (entries, next_cursor) for up to `limit` entries after `cursor`.
+
+        Entries younger than `settle_seconds` are held back so a writer with a
+        slightly slower clock cannot slip an entry in behind a cursor that has
+        already moved past it.
+        """
+        horizon = f"{time.time_ns() - int(settle_seconds * 1e9):020d}"
+        query = self.collection_ref.where("seq", "<", horizon).order_by("seq")
+        if cursor:
+            query = query.start_after({"seq": cursor})
+
+        entries = [doc.to_dict() for doc in query.limit(limit).stream()]
+        next_cursor = entries[-1]["seq"] if entries else cursor
+        if entities:
+            entries = [entry for entry in entries if entry["entity"] in entities]
+        return entries, next_cursor
+
+    def tail(self, cursor=None, batch_size=500, entities=None, poll_seconds=None):
+        """
+        Yields (entry, cursor) pairs from `cursor` onwards.
+        Stops when caught up unless `poll_seconds` is given, in which case it keeps polling.
+        """
+        while True:
+            entries, next_cursor = self.read(cursor, batch_size, entities)
+            for entry in entries:
+                yield entry, entry["seq"]
+            if next_cursor == cursor:  # Caught up
+                if poll_seconds is None:
+                    return
+                time.sleep(poll_seconds)
+            cursor = next_cursor
+
+    def latest_cursor(self):
+        """Cursor pointing at the current end of the log, for consumers that start fresh after a full load."""
+        return f"{time.time_ns():020d}"
+
+    def prune(self, older_than):
+        """Deletes entries older than the `older_than` datetime; returns how many were removed."""
+        horizon = f"{int(older_than.replace(tzinfo=older_than.tzinfo or timezone.utc).timestamp() * 1e9):020d}"
+        docs = self.collection_ref.where("seq", "<", horizon).select([]).stream()
+        return commit_in_chunks(self.db, (("delete", doc.reference) for doc in docs))
+
@@ -0,0 +1,54 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_CONCURRENT_FETCHES = 16
+
+# ✅ One shared pool for blocking Firestore calls (the sync client is thread-safe)
+_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES, thread_name_prefix="firestore-load")
+
+
+def _executor():
+    """The shared pool, or the loop's own executor when already on a pool thread (nested loads never wait on their own pool)."""
+    return None if threading.current_thread().name.startswith("firestore-load") else _pool
+
+
+async def fetch(fn, *args):
+    """Runs one blocking call (a query stream, a point read...) on the shared pool, in the caller's context (metering labels)."""
+    return await asyncio.get_running_loop().run_in_executor(_executor(), contextvars.copy_context().run, fn, *args)
+
+
+async def fetch_all(**loaders):
+    """Runs named zero-argument loaders concurrently; returns {name: result}."""
+    results = await asyncio.gather(*(fetch(loader) for loader in loaders.values()))
+    return dict(zip(loaders, results))
+
+
+async def stream_all(queries):
+    """Streams several queries concurrently; returns one list of snapshots per query, in order."""
+    return await asyncio.gather(*(fetch(lambda query=query: list(query.stream())) for query in queries))
+
+
+def run_sync(coro):
+    """
+    Sync entry point for Streamlit code. Streamlit scripts run without an event
+    loop, so this is a plain asyncio.run(); inside a running loop (notebooks,
+    tests) the coroutine runs on a helper thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as helper:
+        return helper.submit(asyncio.run, coro).result()
+
+
+def load_all(**loaders):
+    """Sync wrapper around fetch_all(): latency is the slowest loader, not the sum."""
+    return run_sync(fetch_all(**loaders))
+
+
+def stream_queries(queries):
+    """Sync wrapper around stream_all()."""
+    return run_sync(stream_all(list(queries)))
@@ -0,0 +1,120 @@
+from collections import Counter
+from datetime import datetime
+
+from firebase_admin import firestore
+
+
+UNSCHEDULED = "-"  # Shift key for roles without a work schedule
+
+
+def _counts(required, filled):
+    return {"required": required, "filled": filled, "open": max(required - filled, 0)}
+
+
+def site_document(site, filled, run_id=None):
+    """
+    Coverage counters of one site from its `required_roles` and a Counter of
+    filled positions keyed by (role, shift).
+
+    Headcounts are required per role (the solver fills `num_workers` across the
+    role's shifts), so roles carry required/filled/open and shifts carry the
+    filled count of each scheduled shift.
+    """
+    roles = {}
+    for role, role_data in site.get("required_roles", {}).items():
+        shifts = {shift: 0 for shift in role_data.get("work_schedule", [])}
+        roles[role] = {**_counts(role_data.get("num_workers", 0), 0), "shifts": shifts}
+    for (role, shift), count in filled.items():
+        entry = roles.setdefault(role, {**_counts(0, 0), "shifts": {}})  # Still holds workers after the role was removed
+        entry["shifts"][shift or UNSCHEDULED] = entry["shifts"].get(shift or UNSCHEDULED, 0) + count
+    for entry in roles.values():
+        entry.update(_counts(entry["required"], sum(entry["shifts"].values())))
+
+    required, filled_total = sum(entry["required"] for entry in roles.values()), sum(entry["filled"] for entry in roles.values())
+    return {
+        "site_id": site["site_id"],
+        "site_name": site.get("site_name", ""),
+        "run_id": run_id,
+        **_counts(required, filled_total),
+        "open": sum(entry["open"] for entry in roles.values()),  # Extra workers in one role never cover another
+        "roles": roles,
+        "updated_at": datetime.now()
+    }
+
+
+def filled_counts(document):
+    """Counter of (role, shift) -> filled positions stored in a coverage document."""
+    return Counter({
+        (role, shift): count
+        for role, entry in (document or {}).get("roles", {}).items()
+        for shift, count in entry.get("shifts", {}).items()
+        if count
+    })
+
+
+@firestore.transactional
+def _refresh(transaction, ref, site):
+    snapshot = ref.get(transaction=transaction)
+    if site.get("job_status_key") != "active":
+        if snapshot.exists:
+            transaction.delete(ref)  # Only active sites have demand, as in a run
+        return
+    current = snapshot.to_dict() if snapshot.exists else None
+    transaction.set(ref, site_document(site, filled_counts(current), (current or {}).get("run_id")))
+
+
+class CoverageStore:
+    """
+    Materialized staffing counters, one small document per job site
+    (`{collection}/{site_id}`), so coverage is read without joining assignments.
+
+    A run overwrites the counters in the same batches as its assignments; an
+    edit of a site's required roles recomputes that site's required/open counts
+    in a transaction and keeps its filled counts.
+    """
+
+    def __init__(self, db, collection="site_coverage"):
+        self.db = db
+        self.collection_ref = db.collection(collection)
+
+    def operations(self, run_id, job_sites, picks):
+        """Batch operations that replace all coverage documents with the counters of a run."""
+        filled = {}
+        for pick in picks:
+            filled.setdefault(pick['site']['site_id'], Counter())[(pick['role'], pick['shift'])] += 1
+        ops = [
+            ("set", self.collection_ref.document(site["site_id"]), site_document(site, filled.get(site["site_id"], Counter()), run_id))
+            for site in job_sites
+        ]
+        current = {site["site_id"] for site in job_sites}
+        ops.extend(("delete", doc.reference) for doc in self.collection_ref.select([]).stream() if doc.id not in current)
+        return ops
+
+    def refresh_site(self, site):
+        """Recomputes one site's counters after its required roles changed (filled counts are kept)."""
+        _refresh(self.db.transaction(), self.collection_ref.document(site["site_id"]), site)
+
+    def refresh_all(self, job_sites):
+        """Batch operations recomputing required/open from all active sites (e.g. after a bulk import); filled counts are kept."""
+        existing = {doc.id: doc.to_dict() for doc in self.collection_ref.select(["run_id", "roles"]).stream()}
+        ops = [
+            ("set", self.collection_ref.document(site["site_id"]),
+             site_document(site, filled_counts(existing.get(site["site_id"])), (existing.get(site["site_id"]) or {}).get("run_id")))
+            for site in job_sites
+        ]
+        current = {site["site_id"] for site in job_sites}
+        ops.extend(("delete", self.collection_ref.document(site_id)) for site_id in existing if site_id not in current)
+        return ops
+
+    def sites(self, understaffed_only=False):
+        """Coverage documents, optionally only sites with open positions (filtered in Firestore)."""
+        query = self.collection_ref.where("open", ">", 0) if understaffed_only else self.collection_ref
+        return [doc.to_dict() for doc in query.stream()]
+
+    @staticmethod
+    def totals(documents):
+        return {
+            "required": sum(doc["required"] for doc in documents),
+            "filled": sum(doc["filled"] for doc in documents),
+            "open": sum(doc["open"] for doc in documents)
+        }
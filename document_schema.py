@@ -0,0 +1,166 @@
+import re
+
+# ✅ Canonical values accepted by the app forms
+ROLES = ["Cleaner", "Labour", "Painter"]
+SHIFTS = ["7:00-15:30", "14:00-22:00", "22:00-06:00"]
+CERTIFICATES = ["Working at Heights", "4 Steps", "WHMIS"]
+SKILLS = ["Boomlift", "Scissors Lift", "Forklift"]
+JOB_STATUSES = ["Active", "Inactive", "Completed"]
+
+ROLE_ALIASES = {"laborer": "Labour", "labourer": "Labour", "labor": "Labour"}
+SHIFT_ALIASES = {
+    "day": "7:00-15:30", "morning": "7:00-15:30", "07:00-15:30": "7:00-15:30",
+    "evening": "14:00-22:00", "afternoon": "14:00-22:00",
+    "night": "22:00-06:00", "overnight": "22:00-06:00"
+}
+
+# ✅ Field names written by the first job site seeding script -> current names
+LEGACY_SITE_FIELDS = {"location": "address", "site_manager": "site_superintendent", "contact_number": "site_contact_number"}
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Canonical shapes
+#
+# employees:  role, availability, skills -> lists of canonical values; certificates -> {name: {"issue_date", "expiration_date"}}
+#             (dates "YYYY-MM-DD" or None when unknown); have_car -> "Yes" / "No"; rating -> float
+# job_sites:  job_status -> one of JOB_STATUSES, with job_status_key; required_roles -> {role: {"work_schedule": [...], "num_workers": int}}
+
+def status_key(status):
+    """Normalized job status stored next to `job_status` so filters can run as equality queries."""
+    return str(status or "").strip().lower()
+
+
+def with_status_key(site):
+    """Adds `job_status_key` to a job site dict that carries `job_status`."""
+    if "job_status" in site:
+        site["job_status_key"] = status_key(site["job_status"])
+    return site
+
+
+def as_list(value):
+    """A list of stripped strings from a list, a single value, a ',', ';' or '|' separated string, or nothing."""
+    if value is None:
+        return []
+    items = value if isinstance(value, (list, tuple, set)) else re.split(r"[,;|]", str(value))
+    return [str(item).strip() for item in items if str(item).strip()]
+
+
+def canonical_choices(value, allowed, aliases=None):
+    """Deduplicated list in the canonical spelling; unknown entries are kept as they are rather than dropped."""
+    lookup = {choice.lower(): choice for choice in allowed}
+    lookup.update(aliases or {})
+    result = []
+    for item in as_list(value):
+        item = lookup.get(item.lower(), item)
+        if item not in result:
+            result.append(item)
+    return result
+
+
+def role_spellings(roles):
+    """Stored spellings that canonical_choices maps onto `roles` (as written, lower and capitalized, aliases), for queries on unmigrated documents."""
+    spellings = []
+    for role in roles:
+        for spelling in [role] + [alias for alias, target in ROLE_ALIASES.items() if target == role]:
+            for variant in (spelling, spelling.lower(), spelling.capitalize()):
+                if variant not in spellings:
+                    spellings.append(variant)
+    return spellings
+
+
+def no_dates():
+    return {"issue_date": None, "expiration_date": None}
+
+
+def canonical_certificates(value):
+    """Certificates as {name: {"issue_date", "expiration_date"}}; names from a legacy list get unknown dates."""
+    if isinstance(value, dict):
+        return {
+            canonical_choices(name, CERTIFICATES)[0]: {field: (dates or {}).get(field) for field in ("issue_date", "expiration_date")}
+            for name, dates in value.items() if as_list(name)
+        }
+    return {name: no_dates() for name in canonical_choices(value, CERTIFICATES)}
+
+
+def _yes_no(value):
+    return "Yes" if str(value).strip().lower() in ("yes", "y", "true", "1") else "No"
+
+
+def _number(value, kind, default):
+    try:
+        return kind(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Upgrade steps: UPGRADES[collection][n] turns a version-n document into a version n+1 one
+
+def _employee_v1(data):
+    """Single-string roles, certificate lists, free-form shifts, string ratings and boolean have_car."""
+    return {
+        **data,
+        "role": canonical_choices(data.get("role"), ROLES, ROLE_ALIASES),
+        "availability": canonical_choices(data.get("availability"), SHIFTS, SHIFT_ALIASES),
+        "certificates": canonical_certificates(data.get("certificates")),
+        "skills": canonical_choices(data.get("skills"), SKILLS),
+        "have_car": _yes_no(data.get("have_car")),
+        "rating": round(_number(data.get("rating"), float, 3.0), 1)
+    }
+
+
+def _job_site_v1(data):
+    """
+    Old field names, an `active` flag instead of job_status, free-form statuses,
+    and required roles stored as a list of names with one site-wide
+    `work_schedule` (each such role becomes one required worker).
+    """
+    site = dict(data)
+    for old, new in LEGACY_SITE_FIELDS.items():
+        value = site.pop(old, None)
+        if value is not None and not site.get(new):
+            site[new] = value
+    schedule, active = site.pop("work_schedule", None), site.pop("active", None)
+
+    status = str(site.get("job_status") or "").strip() or ("Inactive" if active is False else "Active")
+    site["job_status"] = canonical_choices(status, JOB_STATUSES)[0]
+    site["job_status_key"] = status_key(site["job_status"])
+
+    roles = site.get("required_roles") or {}
+    if not isinstance(roles, dict):
+        roles = {role: {"work_schedule": schedule, "num_workers": 1} for role in as_list(roles)}
+    site["required_roles"] = {
+        canonical_choices(role, ROLES, ROLE_ALIASES)[0]: {
+            "work_schedule": canonical_choices((details or {}).get("work_schedule"), SHIFTS, SHIFT_ALIASES),
+            "num_workers": _number((details or {}).get("num_workers"), int, 0)
+        }
+        for role, details in roles.items() if as_list(role)
+    }
+    return site
+
+
+UPGRADES = {
+    "employees": [_employee_v1],
+    "job_sites": [_job_site_v1]
+}
+SCHEMA_VERSIONS = {collection: len(steps) for collection, steps in UPGRADES.items()}
+
+
+def schema_version(data):
+    """Version of a stored document; documents written before versioning are version 0."""
+    return _number(data.get("schema_version"), int, 0)
+
+
+def upgrade(collection, data):
+    """`data` passed through every upgrade step from its own version to SCHEMA_VERSIONS[collection]."""
+    for step in UPGRADES[collection][schema_version(data):]:
+        data = step(data)
+    return {**data, "schema_version": SCHEMA_VERSIONS[collection]}
+
+
+def stamp(collection, data):
+    """Marks a new document, already written in the canonical shape, with the current schema version."""
+    data["schema_version"] = SCHEMA_VERSIONS[collection]
+    return data
@@ -0,0 +1,183 @@
+import math
+
+from assignment_engine import SCORE_COMPONENTS
+
+TOP_K = 25
+
+# ✅ Candidate status codes (stored as small ints, one per ranked candidate)
+STATUS_ASSIGNED = 0     # Placed in this slot
+STATUS_TAKEN = 1        # Placed in another slot
+STATUS_NOT_REACHED = 2  # Free, but the slot was filled by higher-ranked candidates
+STATUS_REPLACED = 3     # Assigned here by the run, then replaced by hand
+STATUS_LABELS = {
+    STATUS_ASSIGNED: "Assigned here",
+    STATUS_TAKEN: "Assigned elsewhere",
+    STATUS_NOT_REACHED: "Not needed (slot already filled)",
+    STATUS_REPLACED: "Replaced"
+}
+
+
+def slot_key(site_id, role):
+    return f"{site_id}__{role}"
+
+
+def build_slot_tables(picks, rankings, top_k=TOP_K):
+    """
+    One columnar table per (site, role): parallel lists over the top-K ranked
+    candidates (rank = list position) plus the slot's headcount, so a slot
+    costs one small document instead of one document per candidate.
+    """
+    placed = {pick['employee']['worker_id']: (pick['site']['site_id'], pick['role']) for pick in picks}
+    filled = {}
+    for pick in picks:
+        key = (pick['site']['site_id'], pick['role'])
+        filled[key] = filled.get(key, 0) + 1
+
+    for (site_id, role), ranking in rankings.items():
+        table = {
+            "site_id": site_id,
+            "role": role,
+            "num_assigned": filled.get((site_id, role), 0),
+            "num_candidates": len(ranking),
+            "worker_ids": [], "names": [], "scores": [], "distances": [], "shifts": [],
+            "component_names": list(SCORE_COMPONENTS),
+            "components": [],  # Flattened: len(component_names) points per candidate
+            "status": [], "placed_at": []
+        }
+        for candidate in ranking[:top_k]:
+            employee = candidate['employee']
+            worker_id = employee['worker_id']
+            placement = placed.get(worker_id)
+            if placement == (site_id, role):
+                status, placed_at = STATUS_ASSIGNED, ""
+            elif placement:
+                status, placed_at = STATUS_TAKEN, slot_key(*placement)
+            else:
+                status, placed_at = STATUS_NOT_REACHED, ""
+
+            table["worker_ids"].append(worker_id)
+            table["names"].append(" ".join(filter(None, [employee.get('first_name'), employee.get('sur_name')])) or worker_id)
+            table["scores"].append(candidate['score'])
+            table["distances"].append(None if math.isinf(candidate['distance']) else round(candidate['distance'], 2))
+            table["shifts"].append(candidate.get('shift'))
+            table["components"].extend(candidate.get('components', (0,) * len(SCORE_COMPONENTS)))
+            table["status"].append(status)
+            table["placed_at"].append(placed_at)
+        yield table
+
+
+def replaced_columns(table, vacated_worker_id, worker_id):
+    """
+    The status and placed_at columns of a slot table after `worker_id` replaced
+    `vacated_worker_id` in it. A replacement from outside the stored top K only
+    changes the vacated worker's entry.
+    """
+    status, placed_at = list(table["status"]), list(table["placed_at"])
+    for candidate, new_status in ((vacated_worker_id, STATUS_REPLACED), (worker_id, STATUS_ASSIGNED)):
+        if candidate in table["worker_ids"]:
+            rank = table["worker_ids"].index(candidate)
+            status[rank], placed_at[rank] = new_status, ""
+    return {"status": status, "placed_at": placed_at}
+
+
+def component_names(table):
+    """
+    Score components stored in a table, in column order. Tables written before
+    the names were stored hold a prefix of today's SCORE_COMPONENTS, so the
+    width is derived from the flattened list.
+    """
+    if "component_names" in table:
+        return list(table["component_names"])
+    width = len(table["components"]) // len(table["worker_ids"]) if table["worker_ids"] else 0
+    return list(SCORE_COMPONENTS[:width])
+
+
+def table_rows(table):
+    """Expands a stored columnar table back into one dict per ranked candidate."""
+    names = component_names(table)
+    width = len(names)
+    return [
+        {
+            "rank": rank + 1,
+            "worker_id": worker_id,
+            "name": table["names"][rank],
+            "score": table["scores"][rank],
+            **dict(zip(names, table["components"][rank * width:(rank + 1) * width])),
+            "distance": table["distances"][rank],
+            "shift": table["shifts"][rank],
+            "status": STATUS_LABELS[table["status"][rank]],
+            "placed_at": table["placed_at"][rank]
+        }
+        for rank, worker_id in enumerate(table["worker_ids"])
+    ]
+
+
+def describe(table, worker_id):
+    """One-sentence explanation of a worker's outcome in a slot, or None if they are not in its top K."""
+    if worker_id not in table["worker_ids"]:
+        return None
+    row = table_rows(table)[table["worker_ids"].index(worker_id)]
+    points = ", ".join(f"{name} {row[name]}" for name in component_names(table))
+    distance = "unknown distance" if row["distance"] is None else f"{row['distance']} km"
+    text = (
+        f"Ranked #{row['rank']} of {table['num_candidates']} for {table['role']} at {table['site_id']} "
+        f"(score {row['score']}: {points}; {distance}). "
+    )
+    if row["status"] == STATUS_LABELS[STATUS_ASSIGNED]:
+        return text + "Assigned here."
+    if row["status"] == STATUS_LABELS[STATUS_TAKEN]:
+        site_id, role = row["placed_at"].split("__", 1)
+        return text + f"Already assigned to {role} at {site_id}."
+    if row["status"] == STATUS_LABELS[STATUS_REPLACED]:
+        return text + "Assigned here, then replaced by another worker."
+    return text + f"All {table['num_assigned']} positions were filled by higher-ranked candidates."
+
+
+#----------------------------------------------------------------------------------------
+
+class ExplanationStore:
+    """
+    Per-run candidate rankings in Firestore: `{collection}/{run_id}/slots/{site_id}__{role}`.
+    Written in the same batches as the run, so every run id has matching explanations.
+    """
+
+    def __init__(self, db, collection="assignment_explanations", top_k=TOP_K):
+        self.collection_ref = db.collection(collection)
+        self.top_k = top_k
+
+    def _slots(self, run_id):
+        return self.collection_ref.document(run_id).collection("slots")
+
+    def operations(self, run_id, picks, rankings):
+        """Batch operations storing every slot table of a run."""
+        slots = self._slots(run_id)
+        return [
+            ("set", slots.document(slot_key(table["site_id"], table["role"])), table)
+            for table in build_slot_tables(picks, rankings, self.top_k)
+        ]
+
+    def slot_ref(self, run_id, site_id, role):
+        return self._slots(run_id).document(slot_key(site_id, role))
+
+    def slot(self, run_id, site_id, role):
+        """The stored table of one slot, or None."""
+        doc = self.slot_ref(run_id, site_id, role).get()
+        return doc.to_dict() if doc.exists else None
+
+    def slots_for_worker(self, run_id, worker_id):
+        """Every slot table whose top K includes the worker (one array-contains query)."""
+        return [doc.to_dict() for doc in self._slots(run_id).where("worker_ids", "array_contains", worker_id).stream()]
+
+    def next_best(self, run_id, site_id, role, exclude=()):
+        """Highest-ranked candidates of a slot who are not placed anywhere, best first."""
+        table = self.slot(run_id, site_id, role)
+        if not table:
+            return []
+        return [
+            row for row, status in zip(table_rows(table), table["status"])
+            if status == STATUS_NOT_REACHED and row["worker_id"] not in exclude
+        ]
+
+    def delete_run(self, run_id):
+        """Delete operations for a run's explanations (used when a newer run replaces it)."""
+        return [("delete", doc.reference) for doc in self._slots(run_id).select([]).stream()] + [("delete", self.collection_ref.document(run_id))]
@@ -0,0 +1,194 @@
+import time
+from collections import Counter, defaultdict, deque
+
+import numpy as np
+
+from assignment_engine import NEARBY_KM
+from sharding import EARTH_RADIUS_KM
+
+STATUS_OK = "✅ OK"
+STATUS_IMPOSSIBLE = "❌ Not enough workers with this role"
+STATUS_ROLE_SHORT = "⚠️ Role short overall"
+STATUS_FEW_NEARBY = "⚠️ Few available workers nearby"
+
+
+def _max_flow(capacity, source, sink):
+    """Edmonds-Karp on a small dict-of-dicts graph; returns (value, nodes that can still reach the sink in the residual graph)."""
+    flow = defaultdict(lambda: defaultdict(int))
+    residual = lambda u, v: capacity.get(u, {}).get(v, 0) - flow[u][v]
+    neighbours = defaultdict(set)
+    for u, edges in capacity.items():
+        for v in edges:
+            neighbours[u].add(v)
+            neighbours[v].add(u)
+
+    value = 0
+    while True:
+        parent, queue = {source: None}, deque([source])
+        while queue and sink not in parent:
+            u = queue.popleft()
+            for v in neighbours[u]:
+                if v not in parent and residual(u, v) > 0:
+                    parent[v] = u
+                    queue.append(v)
+        if sink not in parent:
+            break
+        path, v = [], sink
+        while parent[v] is not None:
+            path.append((parent[v], v))
+            v = parent[v]
+        pushed = min(residual(u, v) for u, v in path)
+        for u, v in path:
+            flow[u][v] += pushed
+            flow[v][u] -= pushed
+        value += pushed
+
+    reaches_sink, queue = {sink}, deque([sink])
+    while queue:
+        v = queue.popleft()
+        for u in neighbours[v]:
+            if u not in reaches_sink and residual(u, v) > 0:
+                reaches_sink.add(u)
+                queue.append(u)
+    return value, reaches_sink
+
+
+def _coordinates(entities):
+    return np.array(
+        [(e.get('latitude'), e.get('longitude')) if e.get('latitude') is not None and e.get('longitude') is not None else (np.nan, np.nan)
+         for e in entities],
+        dtype=float
+    ).reshape(-1, 2)
+
+
+def _distances_km(points, lat, lon):
+    """Haversine distances from every row of `points` (radians) to one site; NaN where coordinates are missing."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    h = np.sin((points[:, 0] - lat) / 2) ** 2 + np.cos(points[:, 0]) * np.cos(lat) * np.sin((points[:, 1] - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
+
+
+def check(employees, job_sites, nearby_km=NEARBY_KM):
+    """
+    Staffing bounds before a run, from the roster alone (no scoring).
+
+    Hard bound: the solver only requires a role match, so workers with the same
+    set of roles are interchangeable. An exact max-flow over those groups gives
+    the most positions any run can fill. When that falls short of the demand,
+    the roles left unmet, plus the roles whose workers could be moved to them,
+    together need more people than hold any of them.
+
+    Nearby bound: per site and role, the workers with the role who are available
+    for one of the slot's shifts and live within `nearby_km`. A slot (or a whole
+    site, by Hall's condition) that needs more than that cannot be staffed with
+    available nearby workers.
+    """
+    started = time.monotonic()
+    slots = [
+        (site, role, role_data.get('num_workers', 0), role_data.get('work_schedule', []))
+        for site in job_sites
+        for role, role_data in site.get('required_roles', {}).items()
+        if role_data.get('num_workers', 0)
+    ]
+    demand = Counter()
+    for site, role, needed, _ in slots:
+        demand[role] += needed
+
+    # ✅ Hard bound: source -> role-set group (headcount) -> role -> sink (demand)
+    groups = Counter(frozenset(role for role in e.get('role', []) if role in demand) for e in employees)
+    groups.pop(frozenset(), None)
+    capacity = {"source": {}}
+    for group, count in groups.items():
+        capacity["source"][group] = count
+        capacity[group] = {("role", role): float('inf') for role in group}
+    for role, needed in demand.items():
+        capacity[("role", role)] = {"sink": needed}
+    fillable, reaches_sink = _max_flow(capacity, "source", "sink")
+    supply = Counter()
+    for group, count in groups.items():
+        for role in group:
+            supply[role] += count
+
+    # ✅ Unmet roles and the roles competing with them for the same workers (the Hall violator behind the shortfall);
+    # a role whose workers are merely used up exactly is not short
+    short_roles = sorted(role for role in demand if ("role", role) in reaches_sink) if fillable < sum(demand.values()) else []
+    short_workers = sum(count for group, count in groups.items() if group & set(short_roles))
+    roles = [
+        {
+            "role": role,
+            "needed": needed,
+            "workers_with_role": supply[role],
+            "max_fillable": min(needed, supply[role]),
+            "short": role in short_roles
+        }
+        for role, needed in sorted(demand.items())
+    ]
+
+    # ✅ Nearby bound: boolean masks over the roster, one distance vector per site
+    points = np.radians(_coordinates(employees))
+    role_index = {role: i for i, role in enumerate(demand)}
+    has_role = np.zeros((len(employees), len(role_index)), dtype=bool)
+    availability = defaultdict(lambda: np.zeros(len(employees), dtype=bool))
+    for row, employee in enumerate(employees):
+        for role in employee.get('role', []):
+            if role in role_index:
+                has_role[row, role_index[role]] = True
+        for shift in employee.get('availability', []):
+            availability[shift][row] = True
+
+    rows, by_site = [], defaultdict(list)
+    for site, role, needed, work_schedule in slots:
+        by_site[site['site_id']].append((site, role, needed, work_schedule))
+    for site_id, site_slots in by_site.items():
+        site = site_slots[0][0]
+        if site.get('latitude') is None or site.get('longitude') is None:
+            near = np.zeros(len(employees), dtype=bool)
+        else:
+            with np.errstate(invalid='ignore'):
+                near = _distances_km(points, site['latitude'], site['longitude']) <= nearby_km
+        site_union = np.zeros(len(employees), dtype=bool)
+        site_rows = []
+        for _, role, needed, work_schedule in site_slots:
+            available = np.zeros(len(employees), dtype=bool)
+            for shift in work_schedule:
+                if shift in availability:
+                    available |= availability[shift]
+            qualified = has_role[:, role_index[role]] & available & near
+            site_union |= qualified
+            site_rows.append({
+                "site_id": site_id,
+                "site_name": site.get('site_name', ''),
+                "role": role,
+                "shifts": ", ".join(work_schedule),
+                "needed": needed,
+                "max_fillable": min(needed, int(supply[role])),
+                "available_nearby": int(np.count_nonzero(qualified))
+            })
+        site_needed, site_nearby = sum(row["needed"] for row in site_rows), int(np.count_nonzero(site_union))
+        for row in site_rows:
+            row["site_needed"], row["site_available_nearby"] = site_needed, site_nearby
+            if row["max_fillable"] < row["needed"]:
+                row["status"] = STATUS_IMPOSSIBLE
+            elif row["role"] in short_roles:
+                row["status"] = STATUS_ROLE_SHORT
+            elif row["available_nearby"] < row["needed"] or site_nearby < site_needed:
+                row["status"] = STATUS_FEW_NEARBY
+            else:
+                row["status"] = STATUS_OK
+        rows.extend(site_rows)
+
+    return {
+        "demand": sum(demand.values()),
+        "fillable": fillable,
+        "short_roles": short_roles,
+        "short_roles_needed": sum(demand[role] for role in short_roles),
+        "short_roles_workers": short_workers,
+        "roles": roles,
+        "slots": rows,
+        "elapsed": time.monotonic() - started
+    }
+
+
+def shortfalls(result):
+    """Slot rows that cannot be fully staffed (hard) or not with available nearby workers."""
+    return [row for row in result["slots"] if row["status"] != STATUS_OK]
@@ -0,0 +1,93 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Firestore rejects a single batch with more than 500 writes
+MAX_BATCH_SIZE = 500
+
+
+def _chunks(operations, chunk_size):
+    """Yields lists of at most `chunk_size` operations from any iterable."""
+    chunk = []
+    for op in operations:
+        chunk.append(op)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _group_chunks(groups, chunk_size):
+    """Like _chunks, but over lists of operations that are never split across two chunks."""
+    chunk = []
+    for group in groups:
+        group = list(group)
+        if len(group) > chunk_size:
+            raise ValueError(f"A group of {len(group)} writes does not fit in one batch of {chunk_size}")
+        if len(chunk) + len(group) > chunk_size:
+            yield chunk
+            chunk = []
+        chunk.extend(group)
+    if chunk:
+        yield chunk
+
+
+def _commit_chunk(db, chunk):
+    """Applies one chunk of write operations as a single batch."""
+    batch = db.batch()
+    for op in chunk:
+        kind, ref = op[0], op[1]
+        if kind == "set":
+            batch.set(ref, op[2])
+        elif kind == "create":
+            batch.create(ref, op[2])  # Fails the batch instead of overwriting an existing document
+        elif kind == "merge":
+            batch.set(ref, op[2], merge=True)
+        elif kind == "update":
+            batch.update(ref, op[2], option=op[3] if len(op) > 3 else None)
+        elif kind == "delete":
+            batch.delete(ref)
+        else:
+            raise ValueError(f"Unknown batch operation: {kind}")
+    batch.commit()
+    return len(chunk)
+
+
+def commit_in_chunks(db, operations, chunk_size=MAX_BATCH_SIZE, max_workers=1):
+    """
+    Commits an iterable of write operations in batches of at most `chunk_size`.
+
+    Each operation is a tuple: ("set", ref, data), ("create", ref, data),
+    ("merge", ref, data), ("update", ref, data[, write option]) or ("delete", ref).
+    With `max_workers` > 1 the batches are committed concurrently. Returns the number of writes committed.
+    """
+    chunk_size = min(chunk_size, MAX_BATCH_SIZE)
+    if max_workers <= 1:
+        return sum(_commit_chunk(db, chunk) for chunk in _chunks(operations, chunk_size))
+
+    context = contextvars.copy_context()  # Batches commit in the caller's context (metering labels)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return sum(pool.map(lambda chunk: context.copy().run(_commit_chunk, db, chunk), _chunks(operations, chunk_size)))
+
+
+def commit_groups(db, groups, chunk_size=MAX_BATCH_SIZE):
+    """
+    Commits an iterable of operation lists (same tuples as commit_in_chunks),
+    packing whole lists into batches of at most `chunk_size`: the writes of a
+    group always commit together. Batches commit in order, so when one fails the
+    groups before it are committed and the rest are not. Returns the number of writes committed.
+    """
+    return sum(_commit_chunk(db, chunk) for chunk in _group_chunks(groups, min(chunk_size, MAX_BATCH_SIZE)))
+
+
+def delete_collection(db, collection_ref, chunk_size=MAX_BATCH_SIZE, max_workers=1):
+    """Deletes every document in a collection with chunked batched deletes."""
+    docs = collection_ref.select([]).stream()  # Only document references are needed
+    return commit_in_chunks(db, (("delete", doc.reference) for doc in docs), chunk_size, max_workers)
+
+
+def delete_other_runs(db, collection_ref, run_id, chunk_size=MAX_BATCH_SIZE, max_workers=1):
+    """Deletes every document in a collection whose run_id is not `run_id`, once that run has replaced them."""
+    docs = collection_ref.select(["run_id"]).stream()
+    stale = (doc.reference for doc in docs if (doc.to_dict() or {}).get("run_id") != run_id)
+    return commit_in_chunks(db, (("delete", ref) for ref in stale), chunk_size, max_workers)
@@ -1,9 +1,10 @@
 import random
-import string
 from datetime import datetime, timedelta
 import firebase_admin
 from firebase_admin import credentials, firestore
 import googlemaps
+from document_schema import stamp
+from id_allocator import IdAllocator
 
 
 cred = credentials.Certificate('serviceAccountKey.json')
@@ -15,6 +16,7 @@ firebase_admin.initialize_app(cred)
 # Use Firebase Admin's Firestore client
 db = firestore.client()
 job_sites_ref = db.collection("job_sites")
+site_ids = IdAllocator(db, "site_id", prefix="SITE", start=10000)  # Same counter as the app's Add Job Site form
 
 # Predefined data for randomization
 site_names = [
@@ -47,22 +49,25 @@ roles = ["Cleaner", "Labour", "Painter"]
 schedules = ["7:00-15:30", "14:00-22:00", "22:00-06:00"]
 
 # Generate and insert 20 random job sites
-for _ in range(20):
+for site_id in site_ids.allocate(20):
     # Choose location based on the new Ontario addresses
     location = random.choice(ontario_locations)
     
-    job_site_data = {
+    work_schedule = random.sample(schedules, k=random.randint(1, 2))  # 1 to 2 shifts
+    job_site_data = stamp("job_sites", {
         "site_name": random.choice(site_names),
-        "location": location,
-        "site_manager": random.choice(site_managers),
-        "contact_number": f"+1 647-{random.randint(100, 999)}-{random.randint(1000, 9999)}",
-        "required_roles": random.sample(roles, k=random.randint(1, 3)),  # 1 to 3 roles
-        "work_schedule": random.sample(schedules, k=random.randint(1, 2)),  # 1 to 3 shifts
-        "active": True,
-        "site_id": f"SITE{random.randint(1000, 9999)}"
-    }
+        "address": location,
+        "site_superintendent": random.choice(site_managers),
+        "site_contact_number": f"+1 647-{random.randint(100, 999)}-{random.randint(1000, 9999)}",
+        "required_roles": {  # 1 to 3 roles
+            role: {"work_schedule": work_schedule, "num_workers": 1} for role in random.sample(roles, k=random.randint(1, 3))
+        },
+        "job_status": "Active",
+        "job_status_key": "active",
+        "site_id": site_id
+    })
 
-    # Add to Firestore
-    job_sites_ref.add(job_site_data)
+    # Add to Firestore under its site ID, as the app does; create() never overwrites an existing site
+    job_sites_ref.document(site_id).create(job_site_data)
 
 print("✅ A few random job sites added successfully with Ontario locations!")
@@ -0,0 +1,347 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UNLABELED = "-"
+MAX_SESSIONS = 200      # Sessions kept for per-session metrics (the least recently active are dropped)
+FIELDS = ("rpcs", "reads", "writes", "deletes", "read_bytes", "write_bytes", "seconds")
+
+# ✅ Labels of the script run doing the I/O; copied onto loader and batch threads with the context
+_current_run = contextvars.ContextVar("firestore_metrics_run", default=None)
+_SKIPPED_MODULES = {__name__, "tenants", "firestore_batch", "concurrent_loader", "asyncio.events", "concurrent.futures.thread", "threading"}
+
+
+def document_size(value):
+    """Approximate stored size in bytes, following Firestore's storage size rules (strings +1, numbers 8, maps: field names +1)."""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime, date)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + 1 + document_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(document_size(item) for item in value)
+    return 16  # References, geo points, sentinels
+
+
+def _snapshot_size(snapshot):
+    data = getattr(snapshot, "_data", None)  # Avoids to_dict()'s deep copy
+    return 32 + document_size(data) if data is not None else 0
+
+
+def _caller():
+    """Top-level function that issued the call ("module.function"): nested lambdas and comprehensions fold into it."""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__") in _SKIPPED_MODULES:
+        frame = frame.f_back
+    if frame is None:
+        return UNLABELED
+    module = frame.f_globals.get("__name__", "?")
+    if module == "__main__":
+        module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]  # Streamlit runs app.py as __main__
+    name = getattr(frame.f_code, "co_qualname", frame.f_code.co_name).split(".<locals>", 1)[0]
+    return f"{module}.{name}"
+
+
+class _Run:
+    """Usage of one script run or fragment rerun; loader threads started by it add to the same counters."""
+
+    def __init__(self, page, session):
+        self.page, self.session = page, session
+        self.usage = Counter()
+
+
+#----------------------------------------------------------------------------------------
+
+class Meter:
+    """
+    Process-wide Firestore usage counters by (page, function, operation) and
+    by session, with per-page budgets checked at the end of every run.
+
+    `budgets` maps a page (or "*" for any page) to limits per run such as
+    {"rpcs": 10, "reads": 500}; None disables the check for that page. With
+    `textfile`, the metrics are rewritten there at most every
+    `textfile_interval` seconds, at the end of a run.
+    """
+
+    def __init__(self, budgets=None, textfile=None, textfile_interval=10.0):
+        self.budgets = budgets or {}
+        self.textfile, self.textfile_interval, self._written = textfile, textfile_interval, 0.0
+        self._lock = threading.Lock()
+        self._totals = defaultdict(Counter)        # (page, function, op) -> FIELDS
+        self._sessions = OrderedDict()             # session -> FIELDS
+        self._pages = defaultdict(Counter)         # page -> runs, budget_exceeded:<metric>
+
+    def record(self, op, **usage):
+        run = _current_run.get()
+        page, session = (run.page, run.session) if run else (UNLABELED, UNLABELED)
+        with self._lock:
+            self._totals[(page, _caller(), op)].update(usage)
+            if run:
+                run.usage.update(usage)
+                self._sessions.setdefault(session, Counter()).update(usage)
+                self._sessions.move_to_end(session)
+                while len(self._sessions) > MAX_SESSIONS:
+                    self._sessions.popitem(last=False)
+
+    # ✅ Runs: one per script execution, so budgets apply to what a single page load costs
+
+    @contextmanager
+    def run(self, page, session):
+        """Attributes the Firestore calls made inside the block to `page` and `session`, then checks the page budget."""
+        run = _Run(page, session)
+        token = _current_run.set(run)
+        try:
+            yield run
+        finally:
+            _current_run.reset(token)
+            self.finish(run)
+
+    @staticmethod
+    def current():
+        return _current_run.get()
+
+    @staticmethod
+    def set_page(page):
+        """Names the page of the current run once it is known (e.g. after the menu choice)."""
+        run = _current_run.get()
+        if run:
+            run.page = page
+
+    def finish(self, run):
+        """Counts the run and logs a warning for every budget it exceeded; returns the exceeded metrics."""
+        budget = self.budgets.get(run.page, self.budgets.get("*"))
+        exceeded = [metric for metric, limit in (budget or {}).items() if limit is not None and run.usage[metric] > limit]
+        with self._lock:
+            self._pages[run.page]["runs"] += 1
+            for metric in exceeded:
+                self._pages[run.page][f"budget_exceeded:{metric}"] += 1
+            due = self.textfile and time.monotonic() - self._written >= self.textfile_interval
+            if due:
+                self._written = time.monotonic()
+        if due:
+            self.write_textfile(self.textfile)
+        for metric in exceeded:
+            print(f"⚠️ Firestore budget exceeded on '{run.page}': {run.usage[metric]:g} {metric} > {budget[metric]} "
+                  f"({', '.join(f'{field}={run.usage[field]:g}' for field in FIELDS if run.usage[field])})")
+        return exceeded
+
+    # ✅ Export
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "totals": {key: dict(value) for key, value in self._totals.items()},
+                "sessions": {key: dict(value) for key, value in self._sessions.items()},
+                "pages": {key: dict(value) for key, value in self._pages.items()}
+            }
+
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format."""
+        data = self.snapshot()
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{suffix}{{{_labels(labels)}}} {value:g}" for suffix, labels, value in samples)
+
+        totals = sorted(data["totals"].items())
+        for field, name, help_text in [
+            ("rpcs", "optishift_firestore_rpcs_total", "Firestore calls (queries, point reads, writes, batch commits)."),
+            ("reads", "optishift_firestore_document_reads_total", "Billed document reads (at least one per query)."),
+            ("writes", "optishift_firestore_document_writes_total", "Document writes (set, create, update)."),
+            ("deletes", "optishift_firestore_document_deletes_total", "Document deletes."),
+            ("read_bytes", "optishift_firestore_read_bytes_total", "Approximate bytes of documents read."),
+            ("write_bytes", "optishift_firestore_write_bytes_total", "Approximate bytes of documents written.")
+        ]:
+            family(name, "counter", help_text, [
+                ("", {"page": page, "function": function, "op": op}, usage.get(field, 0))
+                for (page, function, op), usage in totals if usage.get(field)
+            ])
+        family("optishift_firestore_latency_seconds", "summary", "Time spent waiting on Firestore per call.", [
+            (suffix, {"page": page, "function": function, "op": op}, usage.get(field, 0))
+            for (page, function, op), usage in totals for suffix, field in (("_sum", "seconds"), ("_count", "rpcs"))
+        ])
+        for field in ("rpcs", "reads", "writes", "deletes"):
+            family(f"optishift_firestore_session_{field}_total", "counter", f"Firestore {field} per session (most recent {MAX_SESSIONS}).", [
+                ("", {"session": session}, usage.get(field, 0)) for session, usage in sorted(data["sessions"].items())
+            ])
+        family("optishift_page_runs_total", "counter", "Script runs per page.", [
+            ("", {"page": page}, counts.get("runs", 0)) for page, counts in sorted(data["pages"].items())
+        ])
+        family("optishift_page_budget_exceeded_total", "counter", "Runs that exceeded the page's Firestore budget.", [
+            ("", {"page": page, "metric": key.split(":", 1)[1]}, count)
+            for page, counts in sorted(data["pages"].items()) for key, count in sorted(counts.items()) if key.startswith("budget_exceeded:")
+        ])
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """Writes the metrics atomically (e.g. for node_exporter's textfile collector)."""
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(temp, path)
+
+    def serve(self, port, host="0.0.0.0"):
+        """Serves GET /metrics from a daemon thread; returns the server."""
+        meter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = meter.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"📈 Firestore metrics on http://{host}:{port}/metrics")
+        return server
+
+
+def _labels(labels):
+    escape = lambda value: str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Client wrapper: references and queries stay wrapped, so every read and write they issue is counted
+
+_CHAINED = {"collection", "document", "where", "order_by", "limit", "limit_to_last", "offset", "select",
+            "start_at", "start_after", "end_at", "end_before"}
+
+
+class MeteredClient:
+    """Firestore client whose collections, queries, documents and batches report to a Meter."""
+
+    def __init__(self, db, meter):
+        self.client, self.meter = db, meter
+
+    def collection(self, name):
+        return _Metered(self.client.collection(name), self.meter)
+
+    def batch(self):
+        return _MeteredBatch(self.client.batch(), self.meter)
+
+    def get_all(self, references, *args, **kwargs):
+        started = time.perf_counter()
+        snapshots = list(self.client.get_all(references, *args, **kwargs))
+        self.meter.record("get_all", rpcs=1, reads=max(len(snapshots), 1), read_bytes=sum(map(_snapshot_size, snapshots)),
+                          seconds=time.perf_counter() - started)
+        return snapshots
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)  # transaction(), write_option()...: transaction writes are not counted
+
+
+class _Metered:
+    """A collection, query or document reference; other attributes are the wrapped object's."""
+
+    def __init__(self, target, meter):
+        self.target, self.meter = target, meter
+
+    def __getattr__(self, name):
+        value = getattr(self.target, name)
+        if name in _CHAINED and callable(value):
+            return lambda *args, **kwargs: _Metered(value(*args, **kwargs), self.meter)
+        return value
+
+    def stream(self, *args, **kwargs):
+        """Yields the snapshots; latency is the time spent fetching them, not the caller's processing."""
+        iterator, count, size, seconds = iter(self.target.stream(*args, **kwargs)), 0, 0, 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    snapshot = next(iterator)
+                except StopIteration:
+                    seconds += time.perf_counter() - started
+                    break
+                seconds += time.perf_counter() - started
+                count, size = count + 1, size + _snapshot_size(snapshot)
+                yield snapshot
+        finally:
+            self.meter.record("query", rpcs=1, reads=max(count, 1), read_bytes=size, seconds=seconds)
+
+    def get(self, *args, **kwargs):
+        if hasattr(self.target, "stream"):
+            return list(self.stream(*args, **kwargs))  # Query.get()
+        started = time.perf_counter()
+        snapshot = self.target.get(*args, **kwargs)
+        self.meter.record("get", rpcs=1, reads=1, read_bytes=_snapshot_size(snapshot), seconds=time.perf_counter() - started)
+        return snapshot
+
+    def _write(self, op, method, data, *args, **kwargs):
+        started = time.perf_counter()
+        result = getattr(self.target, method)(*args, **kwargs)
+        usage = {"deletes": 1} if op == "delete" else {"writes": 1, "write_bytes": document_size(data)}
+        self.meter.record(op, rpcs=1, seconds=time.perf_counter() - started, **usage)
+        return result
+
+    def set(self, document_data, *args, **kwargs):
+        return self._write("set", "set", document_data, document_data, *args, **kwargs)
+
+    def create(self, document_data, *args, **kwargs):
+        return self._write("create", "create", document_data, document_data, *args, **kwargs)
+
+    def update(self, field_updates, *args, **kwargs):
+        return self._write("update", "update", field_updates, field_updates, *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._write("delete", "delete", None, *args, **kwargs)
+
+    def add(self, document_data, *args, **kwargs):
+        return self._write("add", "add", document_data, document_data, *args, **kwargs)
+
+
+class _MeteredBatch:
+    """Counts a batch's writes and deletes when it commits (one RPC)."""
+
+    def __init__(self, batch, meter):
+        self.batch, self.meter = batch, meter
+        self.usage = Counter()
+
+    def set(self, reference, document_data, *args, **kwargs):
+        self.usage.update(writes=1, write_bytes=document_size(document_data))
+        return self.batch.set(reference, document_data, *args, **kwargs)
+
+    def create(self, reference, document_data):
+        self.usage.update(writes=1, write_bytes=document_size(document_data))
+        return self.batch.create(reference, document_data)
+
+    def update(self, reference, field_updates, *args, **kwargs):
+        self.usage.update(writes=1, write_bytes=document_size(field_updates))
+        return self.batch.update(reference, field_updates, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self.usage.update(deletes=1)
+        return self.batch.delete(reference, *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self.batch.commit(*args, **kwargs)
+        self.meter.record("batch", rpcs=1, seconds=time.perf_counter() - started, **self.usage)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.batch, name)
@@ -0,0 +1,66 @@
+import hashlib
+import re
+import threading
+
+
+def normalize_address(address):
+    """Canonical form used as the cache key (case, spacing and punctuation insensitive)."""
+    address = re.sub(r"[^\w\s]", " ", (address or "").lower())
+    return re.sub(r"\s+", " ", address).strip()
+
+
+class GeocodeCache:
+    """
+    Address -> (lat, lon) cache in tiers: process memory, an optional SharedCache
+    (warm across app replicas), then a Firestore collection.
+    Only cache misses reach the `geocoder` callable (e.g. Google Maps with an OSM fallback).
+    """
+
+    def __init__(self, db, geocoder, collection="geocode_cache", shared_cache=None, shared_ttl=7 * 24 * 3600):
+        self.geocoder = geocoder
+        self.shared_cache = shared_cache
+        self.shared_ttl = shared_ttl
+        self.collection_ref = db.collection(collection)
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(address):
+        return hashlib.sha1(normalize_address(address).encode("utf-8")).hexdigest()
+
+    def get(self, address):
+        """Returns (lat, lon), or (None, None) when the address cannot be resolved."""
+        if not normalize_address(address):
+            return None, None
+
+        key = self.key(address)
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+
+        coords = self.shared_cache.get(f"geocode:{key}") if self.shared_cache else None
+        if coords is not None:
+            with self._lock:
+                self._memory[key] = coords
+            return coords
+
+        doc = self.collection_ref.document(key).get()
+        if doc.exists:
+            data = doc.to_dict()
+            coords = (data.get("latitude"), data.get("longitude"))
+        else:
+            coords = self.geocoder(address)
+            if None not in coords:
+                # ✅ Persist only successful lookups so failures are retried later
+                self.collection_ref.document(key).set({
+                    "address": address,
+                    "latitude": coords[0],
+                    "longitude": coords[1]
+                })
+
+        if None not in coords:
+            with self._lock:
+                self._memory[key] = coords
+            if self.shared_cache:
+                self.shared_cache.set(f"geocode:{key}", coords, self.shared_ttl)
+        return coords
@@ -0,0 +1,351 @@
+import copy
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import DELETE_FIELD
+
+
+class FakeFirestore:
+    """
+    In-memory stand-in for the Firestore client surface the app uses, with
+    simulated per-RPC latency and operation counters (reads, writes, RPCs).
+
+    Reads are billed like Firestore: one per returned document, at least one per query.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, seed=0):
+        self.latency_ms, self.jitter_ms = latency_ms, jitter_ms
+        self._collections = {}  # "employees" or "a/b/slots" -> {doc_id: [data, create_time, update_time]}
+        self._lock = threading.RLock()
+        self._transaction_lock = threading.RLock()
+        self._clock = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self._random = random.Random(seed)
+        self.ops = Counter()
+
+    # ✅ Cost model
+
+    def _rpc(self, reads=0, writes=0):
+        with self._lock:
+            self.ops["rpcs"] += 1
+            self.ops["reads"] += reads
+            self.ops["writes"] += writes
+            delay = self.latency_ms + (self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+
+    def _tick(self):
+        self._clock += timedelta(microseconds=1)
+        return self._clock
+
+    def reset_ops(self):
+        with self._lock:
+            self.ops = Counter()
+
+    # ✅ Client API
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def write_option(self, last_update_time=None, exists=None):
+        return _WriteOption(last_update_time, exists)
+
+    def get_all(self, refs, field_paths=None, transaction=None):
+        refs = list(refs)
+        self._rpc(reads=max(len(refs), 1))
+        return [ref._snapshot(field_paths) for ref in refs]
+
+    # ✅ Storage helpers (callers hold no lock)
+
+    def _docs(self, path):
+        return self._collections.setdefault(path, {})
+
+    def _apply(self, writes):
+        """Validates then applies a list of (kind, ref, data, option) atomically."""
+        with self._lock:
+            for kind, ref, data, option in writes:
+                stored = self._docs(ref._parent_path).get(ref.id)
+                if kind == "create" and stored is not None:
+                    raise AlreadyExists(f"Document already exists: {ref.path}")
+                if kind == "update" and stored is None:
+                    raise NotFound(f"No document to update: {ref.path}")
+                if option and option.last_update_time is not None and (stored is None or stored[2] != option.last_update_time):
+                    raise FailedPrecondition(f"Update time mismatch: {ref.path}")
+
+            for kind, ref, data, option in writes:
+                docs = self._docs(ref._parent_path)
+                if kind == "delete":
+                    docs.pop(ref.id, None)
+                    continue
+                now = self._tick()
+                stored = docs.get(ref.id)
+                if kind in ("set", "create") or stored is None:
+                    docs[ref.id] = [copy.deepcopy(data), now, now]
+                    continue
+                merged = copy.deepcopy(stored[0])
+                if kind == "merge":
+                    _merge_maps(merged, data)
+                    docs[ref.id] = [merged, stored[1], now]
+                    continue
+                for field, value in data.items():
+                    if value is DELETE_FIELD:
+                        _delete_path(merged, field)
+                    else:
+                        _set_path(merged, field, copy.deepcopy(value))
+                docs[ref.id] = [merged, stored[1], now]
+
+
+class _WriteOption:
+    def __init__(self, last_update_time=None, exists=None):
+        self.last_update_time, self.exists = last_update_time, exists
+
+
+def _get_path(data, field):
+    for part in field.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def _merge_maps(data, updates):
+    """set(merge=True): nested maps merge key by key, any other value replaces the stored one."""
+    for key, value in updates.items():
+        if value is DELETE_FIELD:
+            data.pop(key, None)
+        elif isinstance(value, dict) and isinstance(data.get(key), dict):
+            _merge_maps(data[key], value)
+        else:
+            data[key] = copy.deepcopy(value)
+
+
+def _set_path(data, field, value):
+    parts = field.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    data[parts[-1]] = value
+
+
+def _delete_path(data, field):
+    parts = field.split(".")
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def _project(data, field_paths):
+    if field_paths is None:
+        return copy.deepcopy(data)
+    projected = {}
+    for field in field_paths:
+        value = _get_path(data, field)
+        if value is not None:
+            _set_path(projected, field, copy.deepcopy(value))
+    return projected
+
+
+#----------------------------------------------------------------------------------------
+
+class FakeSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None):
+        self.reference, self._data = reference, data
+        self.id = reference.id
+        self.exists = data is not None
+        self.create_time, self.update_time = create_time, update_time
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        if self._data is None:
+            raise KeyError(field)
+        return _get_path(self._data, field)
+
+
+class FakeDocument:
+    def __init__(self, db, parent_path, doc_id):
+        self._db, self._parent_path, self.id = db, parent_path, doc_id
+        self.path = f"{parent_path}/{doc_id}"
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocument) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def collection(self, name):
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+    def _snapshot(self, field_paths=None):
+        with self._db._lock:
+            stored = self._db._docs(self._parent_path).get(self.id)
+            if stored is None:
+                return FakeSnapshot(self, None)
+            return FakeSnapshot(self, _project(stored[0], field_paths), stored[1], stored[2])
+
+    def get(self, field_paths=None, transaction=None, **kwargs):
+        self._db._rpc(reads=1)
+        return self._snapshot(field_paths)
+
+    def set(self, data, merge=False):
+        self._db._rpc(writes=1)
+        self._db._apply([("merge" if merge else "set", self, data, None)])
+
+    def create(self, data):
+        self._db._rpc(writes=1)
+        self._db._apply([("create", self, data, None)])
+
+    def update(self, data, option=None):
+        self._db._rpc(writes=1)
+        self._db._apply([("update", self, data, option)])
+
+    def delete(self, option=None):
+        self._db._rpc(writes=1)
+        self._db._apply([("delete", self, None, option)])
+
+
+#----------------------------------------------------------------------------------------
+
+_OPERATORS = {
+    "==": lambda value, operand: value == operand,
+    "!=": lambda value, operand: value is not None and value != operand,
+    "<": lambda value, operand: value is not None and value < operand,
+    "<=": lambda value, operand: value is not None and value <= operand,
+    ">": lambda value, operand: value is not None and value > operand,
+    ">=": lambda value, operand: value is not None and value >= operand,
+    "in": lambda value, operand: value in operand,
+    "not-in": lambda value, operand: value is not None and value not in operand,
+    "array_contains": lambda value, operand: isinstance(value, list) and operand in value,
+    "array_contains_any": lambda value, operand: isinstance(value, list) and any(item in value for item in operand),
+}
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), orders=(), limit_to=None, fields=None, cursor=None):
+        self._collection = collection
+        self._filters, self._orders = list(filters), list(orders)
+        self._limit, self._fields, self._cursor = limit_to, fields, cursor
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, limit_to=self._limit, fields=self._fields, cursor=self._cursor)
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count):
+        return self._copy(limit_to=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def start_after(self, document_fields):
+        values = document_fields.to_dict() if isinstance(document_fields, FakeSnapshot) else document_fields
+        return self._copy(cursor=values)
+
+    def _matches(self):
+        db = self._collection._db
+        with db._lock:
+            items = [(doc_id, stored) for doc_id, stored in db._docs(self._collection._path).items()]
+        rows = [
+            (doc_id, stored) for doc_id, stored in items
+            if all(_OPERATORS[op](_get_path(stored[0], field), value) for field, op, value in self._filters)
+        ]
+        orders = self._orders or [("__name__", "ASCENDING")]
+        for field, direction in reversed(orders):
+            rows.sort(
+                key=lambda row: (row[0] if field == "__name__" else _get_path(row[1][0], field)) or "",
+                reverse=str(direction).upper().startswith("DESC")
+            )
+        if self._cursor is not None:
+            field = orders[0][0]
+            cursor_value = self._cursor.get(field)
+            rows = [row for row in rows if ((row[0] if field == "__name__" else _get_path(row[1][0], field)) or "") > cursor_value]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return rows
+
+    def stream(self, transaction=None, **kwargs):
+        rows = self._matches()
+        self._collection._db._rpc(reads=max(len(rows), 1))
+        for doc_id, stored in rows:
+            yield FakeSnapshot(self._collection.document(doc_id), _project(stored[0], self._fields), stored[1], stored[2])
+
+    def get(self, transaction=None, **kwargs):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, path):
+        self._db, self._path = db, path
+        self.id = path.rsplit("/", 1)[-1]
+        super().__init__(self)
+
+    def document(self, document_id=None):
+        return FakeDocument(self._db, self._path, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        ref = self.document()
+        ref.create(data)
+        return None, ref
+
+    def list_documents(self):
+        with self._db._lock:
+            return [self.document(doc_id) for doc_id in list(self._db._docs(self._path))]
+
+
+#----------------------------------------------------------------------------------------
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db, self._writes = db, []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(("merge" if merge else "set", reference, document_data, None))
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference, document_data, None))
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(("update", reference, field_updates, option))
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference, None, option))
+
+    def commit(self):
+        self._db._rpc(writes=len(self._writes))
+        self._db._apply(self._writes)
+        return self._writes
+
+
+class FakeTransaction(FakeBatch):
+    """Writes are buffered and applied on commit; transactions are serialized by a lock."""
+
+
+def transactional(fn):
+    """Drop-in for firestore.transactional: runs `fn(transaction, ...)` under the fake's transaction lock and commits."""
+    def wrapper(transaction, *args, **kwargs):
+        with transaction._db._transaction_lock:
+            result = fn(transaction, *args, **kwargs)
+            if transaction._writes:
+                transaction.commit()
+            return result
+    return wrapper
@@ -0,0 +1,143 @@
+import socketserver
+import threading
+import time
+
+from shared_cache import RedisBackend
+
+
+class FakeRedisServer:
+    """
+    Local stand-in for a Redis server: speaks RESP2 over TCP and implements the
+    commands RedisBackend sends (AUTH, SELECT, GET, SET with PX/NX, DEL, INCR and
+    EVAL of its lock release script), so the shared cache and the distributed run
+    lock can be exercised without a real server.
+
+        with FakeRedisServer() as server:
+            cache = SharedCache(backend_from_url(server.url))
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, password=None):
+        self.password = password
+        self._data = {}  # db number -> {key: (value, expires_at or None)}
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._lose_reply_to = None  # Command whose next reply is dropped along with the connection
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                fake._handle(self)
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address
+
+    @property
+    def url(self):
+        return f"redis://{':' + self.password + '@' if self.password else ''}{self.host}:{self.port}/0"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.drop_connections()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def drop_connections(self):
+        """Closes every client connection, as a server restart or an idle timeout would."""
+        with self._lock:
+            connections, self._connections = list(self._connections), set()
+        for connection in connections:
+            try:
+                connection.shutdown(2)
+                connection.close()
+            except OSError:
+                pass
+
+    def lose_next_reply(self, command):
+        """Runs the next `command` but closes the connection instead of replying, as a timeout after the write would."""
+        self._lose_reply_to = command.upper().encode()
+
+    # ✅ Protocol
+
+    @staticmethod
+    def _read_command(reader):
+        line = reader.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(reader.readline()[1:-2])
+            args.append(reader.read(length + 2)[:-2])
+        return args
+
+    def _handle(self, handler):
+        with self._lock:
+            self._connections.add(handler.connection)
+        session = {"db": 0, "authenticated": self.password is None}
+        try:
+            while True:
+                args = self._read_command(handler.rfile)
+                if args is None:
+                    return
+                reply = self._execute(session, args)
+                if args[0].upper() == self._lose_reply_to:
+                    self._lose_reply_to = None
+                    return
+                handler.wfile.write(reply)
+        except (OSError, ValueError):
+            return
+        finally:
+            with self._lock:
+                self._connections.discard(handler.connection)
+
+    def _execute(self, session, args):
+        command = args[0].upper()
+        if command == b"AUTH":
+            session["authenticated"] = args[-1].decode() == self.password
+            return b"+OK\r\n" if session["authenticated"] else b"-WRONGPASS invalid password\r\n"
+        if not session["authenticated"]:
+            return b"-NOAUTH Authentication required.\r\n"
+        if command == b"SELECT":
+            session["db"] = int(args[1])
+            return b"+OK\r\n"
+
+        with self._lock:
+            data = self._data.setdefault(session["db"], {})
+            now = time.monotonic()
+            for key in [key for key, (_, expires_at) in data.items() if expires_at is not None and expires_at <= now]:
+                del data[key]
+
+            if command == b"PING":
+                return b"+PONG\r\n"
+            if command == b"GET":
+                entry = data.get(args[1])
+                return b"$-1\r\n" if entry is None else b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+            if command == b"SET":
+                options = [arg.upper() for arg in args[3:]]
+                if b"NX" in options and args[1] in data:
+                    return b"$-1\r\n"
+                expires_at = now + int(args[3 + options.index(b"PX") + 1]) / 1000 if b"PX" in options else None
+                data[args[1]] = (args[2], expires_at)
+                return b"+OK\r\n"
+            if command == b"DEL":
+                return b":%d\r\n" % sum(data.pop(key, None) is not None for key in args[1:])
+            if command == b"INCR":
+                value, expires_at = data.get(args[1], (b"0", None))
+                data[args[1]] = (str(int(value) + 1).encode(), expires_at)
+                return b":%d\r\n" % (int(value) + 1)
+            if command == b"EVAL" and args[1].decode() == RedisBackend.RELEASE_SCRIPT:
+                key, token = args[3], args[4]
+                if data.get(key, (None,))[0] == token:
+                    del data[key]
+                    return b":1\r\n"
+                return b":0\r\n"
+        return b"-ERR unknown command '%s'\r\n" % command
@@ -0,0 +1,350 @@
+"""
+Concurrent-session load test for app.py.
+
+Runs the real app with Streamlit's AppTest against FakeFirestore (configurable
+latency) with the identity endpoints stubbed, and reports page latency
+percentiles, Firestore operations per page and memory per session.
+
+    python -m loadtest.harness --sessions 10,50,100 --latency-ms 20 --workers 2000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+
+import firebase_admin
+from firebase_admin import auth, credentials, firestore
+
+from loadtest.fake_firestore import FakeFirestore, transactional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+PASSWORD = "loadtest-password"
+ROLES = ["Cleaner", "Labour", "Painter"]
+SHIFTS = ["7:00-15:30", "14:00-22:00", "22:00-06:00"]
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Environment: fake Firestore, stubbed identity endpoints, process-wide Streamlit runtime
+
+class FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeIdentity:
+    """Stands in for identitytoolkit/securetoken: tokens are "<uid>|<expiry>" strings."""
+
+    def __init__(self, latency_ms=0.0):
+        self.users = {}  # email -> uid
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def _tokens(self, uid):
+        return {"idToken": f"{uid}|{time.time() + 3600}", "refreshToken": f"refresh|{uid}", "expiresIn": "3600", "localId": uid}
+
+    def post(self, url, params=None, json=None, data=None, timeout=None):
+        self.calls += 1
+        time.sleep(self.latency_ms / 1000)
+        if "signInWithPassword" in url:
+            uid = self.users.get(json["email"])
+            if uid is None or json["password"] != PASSWORD:
+                return FakeResponse({"error": {"message": "INVALID_LOGIN_CREDENTIALS"}})
+            return FakeResponse(self._tokens(uid))
+        if "signUp" in url:
+            uid = f"uid-{len(self.users)}"
+            self.users[json["email"]] = uid
+            return FakeResponse(self._tokens(uid))
+        uid = data["refresh_token"].split("|", 1)[1]
+        tokens = self._tokens(uid)
+        return FakeResponse({"id_token": tokens["idToken"], "refresh_token": tokens["refreshToken"], "expires_in": "3600"})
+
+    @staticmethod
+    def verify_id_token(id_token, app=None, check_revoked=False, clock_skew_seconds=0):
+        uid, expiry = id_token.split("|")
+        if float(expiry) < time.time():
+            raise auth.ExpiredIdTokenError("Token expired", None)
+        return {"uid": uid}
+
+
+def install(db, identity):
+    """Points firebase_admin, the identity endpoints and Streamlit's AppTest globals at the fakes (once per process)."""
+    firestore.transactional = transactional  # Before id_allocator & co. are imported by app.py
+    firestore.client = lambda *args, **kwargs: db
+    credentials.Certificate = lambda *args, **kwargs: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    auth.verify_id_token = identity.verify_id_token
+    os.environ.setdefault("OPTISHIFT_CACHE_URL", "memory://")
+
+    sys.path.insert(0, ROOT)
+    import auth_session
+    auth_session.http.post = identity.post
+
+    # AppTest swaps Runtime._instance, st.secrets and a config option around every run.
+    # A server shares those between sessions, so they are installed once and the swaps disabled,
+    # which lets sessions run in parallel threads.
+    import streamlit as st
+    from streamlit.logger import get_logger
+    from unittest.mock import MagicMock
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.secrets import Secrets
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    for name in ("streamlit.deprecation_util", "streamlit.runtime.scriptrunner_utils.script_run_context"):
+        get_logger(name).disabled = True  # Repeats on every rerun of every session
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+
+    class SharedRuntime:
+        """Stand-in for Runtime inside app_test: reads give the shared mock, writes are ignored."""
+        def __setattr__(self, name, value):
+            pass
+
+    Runtime._instance = runtime
+    app_test.Runtime = SharedRuntime()
+    app_test.MagicMock = lambda spec=None: runtime
+    app_test.patch_config_options = lambda options: nullcontext()
+    script_cache = ScriptCache()  # One compiled app for all sessions, as on a server
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    from streamlit import config
+    config.set_option("global.appTest", True)
+
+    secrets = Secrets()
+    secrets._secrets = {"FIREBASE_CREDENTIALS": "{}"}
+    st.secrets = secrets
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Seed data: workers with accounts, active sites, one published run
+
+def seed(db, identity, num_workers, num_admins=5, seed_value=0):
+    rng = random.Random(seed_value)
+    now = datetime(2026, 1, 5, 7, 0)
+    sites = []
+    for s in range(max(num_workers // 20, 1)):
+        site_id = f"SITE{10000 + s}"
+        sites.append(site_id)
+        db.collection("job_sites").document(site_id).set({
+            "site_id": site_id, "site_name": f"Site {s}", "site_company": "Acme", "site_superintendent": f"Super {s % 7}",
+            "site_contact_number": "+14165550000", "address": f"{100 + s} King St W, Toronto, ON",
+            "job_status": "Active", "job_status_key": "active", "work_start_date": "2026-01-05", "work_end_date": "2026-06-30",
+            "latitude": 43.6 + rng.random() * 0.3, "longitude": -79.6 + rng.random() * 0.4,
+            "required_roles": {role: {"num_workers": 5, "work_schedule": [SHIFTS[0]]} for role in ROLES}
+        })
+
+    db.collection("assignment_runs").document("current").set({"run_id": "loadtest-run", "completed_at": now, "num_assignments": num_workers})
+    users = []
+    for i in range(num_workers + num_admins):
+        uid, email = f"uid-{i}", f"user{i}@loadtest.local"
+        is_admin = i >= num_workers
+        identity.users[email] = uid
+        users.append((email, "admin" if is_admin else "employee"))
+        db.collection("users").document(uid).set({"email": email, "role": "admin" if is_admin else "employee"})
+        if is_admin:
+            continue
+        worker_id, role, site_id = f"W{i + 1:08d}", rng.choice(ROLES), sites[i % len(sites)]
+        db.collection("employees").document(uid).set({
+            "worker_id": worker_id, "email": email, "first_name": f"First{i}", "middle_name": "", "sur_name": f"Last{i}",
+            "phone_number": f"+1416555{i % 10000:04d}", "home_address": f"{i} Queen St E, Toronto, ON", "have_car": rng.choice(["Yes", "No"]),
+            "role": [role], "availability": [SHIFTS[0]], "skills": [], "certificates": {}, "rating": 3.0, "rating_locked": True,
+            "latitude": 43.6 + rng.random() * 0.3, "longitude": -79.6 + rng.random() * 0.4
+        })
+        assignment = {
+            "run_id": "loadtest-run", "employee_id": worker_id, "job_site_id": site_id, "role": role,
+            "shift": SHIFTS[0], "distance": round(rng.random() * 30, 2), "assigned_date": now
+        }
+        db.collection("assignments").document(f"a{i}").set(assignment)
+        db.collection("my_assignments").document(uid).set({
+            **assignment, "worker_id": worker_id, "site_name": f"Site {sites.index(site_id)}", "address": "King St W"
+        })
+    return users
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Session scripts: each step is one page load / interaction, timed separately
+
+def _find(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"No widget labelled {label!r} on the page")
+
+
+def _button(at, label):
+    return _find(at.button, label)
+
+
+def _text_input(at, label):
+    return _find(at.text_input, label)
+
+
+def worker_session(at, email):
+    yield "open", lambda: at.run()
+    yield "login", lambda: _button(at, "🔐 Login").click().run()
+    _text_input(at, "Enter Email Address").input(email)
+    _text_input(at, "Enter Password").input(PASSWORD)
+    yield "dashboard", lambda: _button(at, "Login").click().run()
+    yield "dashboard_rerun", lambda: at.run()
+    yield "profile", lambda: _button(at, "📝 Update your Information").click().run()
+    _text_input(at, "Phone Number").input(f"+1647555{random.randint(0, 9999):04d}")
+    yield "profile_submit", lambda: _button(at, "✅ Update Profile").click().run()
+
+
+def admin_session(at, email):
+    yield "open", lambda: at.run()
+    yield "login", lambda: _button(at, "🔐 Login").click().run()
+    _text_input(at, "Enter Email Address").input(email)
+    _text_input(at, "Enter Password").input(PASSWORD)
+    yield "admin_dashboard", lambda: _button(at, "Login").click().run()
+    for section, choice, page in [
+        ("👥 Employees", "View Employees", "view_employees"),
+        ("🏗️ Job Sites", "View Job Sites", "view_job_sites"),
+        ("📋 Assignments", "View Assignments", "view_assignments")
+    ]:
+        _find(at.radio, "Navigation:").set_value(section)
+        yield f"{page}_nav", lambda: at.run()
+        yield page, lambda: _find(at.selectbox, "Select an option").select(choice).run()
+
+
+def run_session(email, role, timings, errors, timeout):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    script = admin_session if role == "admin" else worker_session
+    page = "start"
+    try:
+        for page, step in script(at, email):
+            started = time.perf_counter()
+            step()
+            timings[page].append((time.perf_counter() - started) * 1000)
+            if at.exception:
+                errors[page].append(at.exception[0].message)
+                return at
+    except Exception as e:  # Missing widget or step timeout: count it against the last page and end the session
+        errors[page].append(f"{type(e).__name__}: {e}")
+    return at
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Measurements
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    index = min(int(round(q / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def ops_per_page(db, users, timeout):
+    """Runs one worker and one admin session alone and attributes Firestore ops to each step."""
+    results = {}
+    from streamlit.testing.v1 import AppTest
+    for email, role in [next(u for u in users if u[1] == "employee"), next(u for u in users if u[1] == "admin")]:
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        for page, step in (admin_session if role == "admin" else worker_session)(at, email):
+            db.reset_ops()
+            step()
+            results[page] = dict(db.ops)
+    return results
+
+
+def memory_per_session(users, count, timeout):
+    """Average traced memory retained per logged-in worker session (AppTest + session state)."""
+    workers = [email for email, role in users if role == "employee"][:count]
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    sessions = [run_session(email, "employee", defaultdict(list), defaultdict(list), timeout) for email in workers]
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del sessions
+    return retained / max(len(workers), 1)
+
+
+def run_level(users, num_sessions, admin_share, timeout):
+    workers = [u for u in users if u[1] == "employee"]
+    admins = [u for u in users if u[1] == "admin"]
+    num_admins = min(len(admins), math.ceil(num_sessions * admin_share))
+    chosen = random.sample(workers, num_sessions - num_admins) + admins[:num_admins]
+
+    timings, errors = defaultdict(list), defaultdict(list)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_sessions) as pool:
+        list(pool.map(lambda user: run_session(user[0], user[1], timings, errors, timeout), chosen))
+    return timings, errors, time.perf_counter() - started
+
+
+def report(level, timings, errors, elapsed):
+    print(f"\n=== {level} concurrent sessions ({elapsed:.1f}s wall) ===")
+    print(f"{'page':<24}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for page, values in timings.items():
+        print(f"{page:<24}{len(values):>6}{percentile(values, 50):>10.0f}{percentile(values, 95):>10.0f}"
+              f"{percentile(values, 99):>10.0f}{max(values):>10.0f}")
+    for page, messages in errors.items():
+        print(f"❌ {page}: {len(messages)} errors, e.g. {messages[0]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="10,50,100", help="Comma-separated concurrency levels")
+    parser.add_argument("--workers", type=int, default=1000, help="Seeded workers (each with an account and an assignment)")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated latency per Firestore RPC")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--identity-latency-ms", type=float, default=80.0, help="Simulated latency of the sign-in endpoint")
+    parser.add_argument("--admin-share", type=float, default=0.05, help="Fraction of sessions that are admins browsing tables")
+    parser.add_argument("--memory-sessions", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-step AppTest timeout in seconds")
+    parser.add_argument("--json", help="Write the full results to this file")
+    args = parser.parse_args(argv)
+
+    db, identity = FakeFirestore(), FakeIdentity(args.identity_latency_ms)
+    install(db, identity)
+    users = seed(db, identity, args.workers)
+    db.latency_ms, db.jitter_ms = args.latency_ms, args.jitter_ms  # Seeding itself runs without latency
+    print(f"✅ Seeded {args.workers} workers; Firestore latency {args.latency_ms}±{args.jitter_ms} ms")
+
+    results = {"config": vars(args), "ops_per_page": ops_per_page(db, users, args.timeout), "levels": {}}
+    print(f"\n{'page':<24}{'reads':>8}{'writes':>8}{'rpcs':>8}   (Firestore ops, single session)")
+    for page, ops in results["ops_per_page"].items():
+        print(f"{page:<24}{ops.get('reads', 0):>8}{ops.get('writes', 0):>8}{ops.get('rpcs', 0):>8}")
+
+    for level in [int(value) for value in args.sessions.split(",")]:
+        timings, errors, elapsed = run_level(users, level, args.admin_share, args.timeout)
+        report(level, timings, errors, elapsed)
+        results["levels"][level] = {
+            "elapsed_s": elapsed,
+            "pages": {page: {q: percentile(values, q) for q in (50, 95, 99)} | {"n": len(values)} for page, values in timings.items()},
+            "errors": {page: len(messages) for page, messages in errors.items()}
+        }
+
+    results["memory_per_session_bytes"] = memory_per_session(users, args.memory_sessions, args.timeout)
+    print(f"\n🧠 ~{results['memory_per_session_bytes'] / 1024:.0f} KiB retained per logged-in session")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
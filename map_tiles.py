@@ -0,0 +1,181 @@
+import math
+
+import numpy as np
+
+from assignment_inputs import load_active_job_sites
+
+# ✅ Web Mercator zoom levels as used by the map (deck.gl: the world is 512 px wide at zoom 0)
+WORLD_PIXELS = 512
+MIN_ZOOM, MAX_ZOOM = 6, 16
+CELL_PIXELS = 48        # Points within one cell of this size on screen are drawn as one cluster
+MAX_LINES = 3000        # Heaviest aggregated assignment lines sent per view
+MAX_LATITUDE = 85.05112878
+
+
+def _coordinates(records):
+    """(lat, lon) float arrays, and the positions of the records that have both."""
+    rows = [i for i, r in enumerate(records) if r.get('latitude') is not None and r.get('longitude') is not None]
+    lat = np.array([records[i]['latitude'] for i in rows], dtype=float)
+    lon = np.array([records[i]['longitude'] for i in rows], dtype=float)
+    return lat, lon, rows
+
+
+def _mercator(lat, lon):
+    """Web Mercator position in world units ([0, 1) on both axes, y grows southwards)."""
+    lat = np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    return (np.asarray(lon) + 180.0) / 360.0, 0.5 - np.log(np.tan(np.pi / 4 + lat / 2)) / (2 * np.pi)
+
+
+def _latitude(y):
+    return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.asarray(y)))))
+
+
+def load_points(db, run_id):
+    """
+    Located workers, active sites with their coverage counters, and the
+    (worker, site) pairs of run `run_id`, as flat arrays; a few projected
+    queries, read once per run.
+    """
+    employees = [doc.to_dict() for doc in db.collection("employees").select(["worker_id", "latitude", "longitude"]).stream()]
+    sites = load_active_job_sites(db, ["site_id", "site_name", "latitude", "longitude"])
+    coverage = {doc.id: doc.to_dict() for doc in db.collection("site_coverage").select(["required", "filled", "open"]).stream()}
+    pairs = [
+        (doc.get("employee_id"), doc.get("job_site_id"))
+        for doc in db.collection("assignments").where("run_id", "==", run_id).select(["employee_id", "job_site_id"]).stream()
+    ] if run_id else []
+    return points(employees, sites, coverage, pairs)
+
+
+def points(employees, sites, coverage, pairs):
+    """Arrays behind every zoom level: positions in world units, ids, coverage counts and assignment endpoints."""
+    worker_lat, worker_lon, worker_rows = _coordinates(employees)
+    site_lat, site_lon, site_rows = _coordinates(sites)
+    worker_ids = [employees[i].get('worker_id') for i in worker_rows]
+    site_ids = [sites[i].get('site_id') for i in site_rows]
+    worker_index = {worker_id: i for i, worker_id in enumerate(worker_ids)}
+    site_index = {site_id: i for i, site_id in enumerate(site_ids)}
+    lines = np.array(
+        [(worker_index[w], site_index[s]) for w, s in pairs if w in worker_index and s in site_index],
+        dtype=np.int64
+    ).reshape(-1, 2)
+    counters = np.array([[coverage.get(site_id, {}).get(field, 0) for field in ("required", "filled", "open")] for site_id in site_ids],
+                        dtype=np.int64).reshape(-1, 3)
+
+    worker_x, worker_y = _mercator(worker_lat, worker_lon)
+    site_x, site_y = _mercator(site_lat, site_lon)
+    return {
+        "workers": {"x": worker_x, "y": worker_y, "lat": worker_lat, "lon": worker_lon, "ids": worker_ids,
+                    "assigned": np.bincount(lines[:, 0], minlength=len(worker_ids)).clip(max=1)},
+        "sites": {"x": site_x, "y": site_y, "lat": site_lat, "lon": site_lon, "ids": site_ids,
+                  "required": counters[:, 0], "filled": counters[:, 1], "open": counters[:, 2]},
+        "lines": lines
+    }
+
+
+def _cluster(layer, zoom, sums=()):
+    """Bins points into CELL_PIXELS cells at `zoom`; returns (clusters, cell of each point)."""
+    cells = WORLD_PIXELS * 2 ** zoom / CELL_PIXELS
+    keys = np.floor(layer["x"] * cells).astype(np.int64) * (1 << 32) + np.floor(layer["y"] * cells).astype(np.int64)
+    _, first, inverse, count = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    clusters = {
+        "lat": np.bincount(inverse, weights=layer["lat"]) / count,  # Centroid of the members, not the cell centre
+        "lon": np.bincount(inverse, weights=layer["lon"]) / count,
+        "count": count,
+        "first": first  # A member's position, to label single points by id
+    }
+    for field in sums:
+        clusters[field] = np.bincount(inverse, weights=layer[field], minlength=len(count)).astype(np.int64)
+    return clusters, inverse
+
+
+def build_level(points, zoom):
+    """
+    Clusters of one zoom level: workers and sites per cell (centroid, count,
+    summed counters) and assignment lines aggregated per (worker cell, site cell).
+    """
+    workers, worker_cell = _cluster(points["workers"], zoom, ["assigned"])
+    sites, site_cell = _cluster(points["sites"], zoom, ["required", "filled", "open"])
+    lines = points["lines"]
+    pair_keys = worker_cell[lines[:, 0]].astype(np.int64) * (len(sites["count"]) + 1) + site_cell[lines[:, 1]]
+    pairs, count = np.unique(pair_keys, return_counts=True)
+    source, target = pairs // (len(sites["count"]) + 1), pairs % (len(sites["count"]) + 1)
+    return {
+        "zoom": zoom,
+        "workers": workers,
+        "sites": sites,
+        "lines": {
+            "from_lat": workers["lat"][source], "from_lon": workers["lon"][source],
+            "to_lat": sites["lat"][target], "to_lon": sites["lon"][target],
+            "count": count
+        }
+    }
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Viewport queries: only the clusters (and lines) around the visible area are sent to the browser
+
+def clamp_zoom(zoom):
+    return int(min(max(round(zoom), MIN_ZOOM), MAX_ZOOM))
+
+
+def bounds(view, width, height, margin=1.0):
+    """(south, west, north, east) of a view (latitude, longitude, zoom) of `width` x `height` pixels, padded by `margin` views per side."""
+    x, y = _mercator(view["latitude"], view["longitude"])
+    scale = WORLD_PIXELS * 2 ** view["zoom"]
+    half_x, half_y = (0.5 + margin) * width / scale, (0.5 + margin) * height / scale
+    return (float(_latitude(min(y + half_y, 1.0))), float(x - half_x) * 360 - 180,
+            float(_latitude(max(y - half_y, 0.0))), float(x + half_x) * 360 - 180)
+
+
+def fit(points, width, height):
+    """View (latitude, longitude, zoom) that shows every site and worker."""
+    x = np.concatenate([points["sites"]["x"], points["workers"]["x"]])
+    y = np.concatenate([points["sites"]["y"], points["workers"]["y"]])
+    if not len(x):
+        return {"latitude": 43.7, "longitude": -79.4, "zoom": 9}  # Toronto
+    span = max((x.max() - x.min()) * WORLD_PIXELS / width, (y.max() - y.min()) * WORLD_PIXELS / height, 1e-9)
+    return {
+        "latitude": float(_latitude((y.min() + y.max()) / 2)),
+        "longitude": float((x.min() + x.max()) / 2 * 360 - 180),
+        "zoom": clamp_zoom(math.floor(-math.log2(span)))
+    }
+
+
+def _inside(lat, lon, box):
+    south, west, north, east = box
+    return (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+
+
+def _records(clusters, mask, ids, fields):
+    rows = np.flatnonzero(mask)
+    return [
+        {"latitude": float(clusters["lat"][i]), "longitude": float(clusters["lon"][i]), "count": int(clusters["count"][i]),
+         "label": ids[clusters["first"][i]] if clusters["count"][i] == 1 else "",
+         **{field: int(clusters[field][i]) for field in fields}}
+        for i in rows
+    ]
+
+
+def visible(points, level, box):
+    """Worker clusters, site clusters and the heaviest assignment lines of `level` that fall inside `box`."""
+    workers, sites, lines = level["workers"], level["sites"], level["lines"]
+    south, west, north, east = box
+    # A line is kept if its bounding box overlaps the view (it may cross it without an endpoint inside)
+    line_mask = (
+        (np.maximum(lines["from_lat"], lines["to_lat"]) >= south) & (np.minimum(lines["from_lat"], lines["to_lat"]) <= north)
+        & (np.maximum(lines["from_lon"], lines["to_lon"]) >= west) & (np.minimum(lines["from_lon"], lines["to_lon"]) <= east)
+    )
+    line_rows = np.flatnonzero(line_mask)
+    line_rows = line_rows[np.argsort(-lines["count"][line_rows], kind="stable")[:MAX_LINES]]
+    return {
+        "workers": _records(workers, _inside(workers["lat"], workers["lon"], box), points["workers"]["ids"], ["assigned"]),
+        "sites": _records(sites, _inside(sites["lat"], sites["lon"], box), points["sites"]["ids"], ["required", "filled", "open"]),
+        "lines": [
+            {"from": [float(lines["from_lon"][i]), float(lines["from_lat"][i])], "to": [float(lines["to_lon"][i]), float(lines["to_lat"][i])],
+             "count": int(lines["count"][i])}
+            for i in line_rows
+        ],
+        "lines_total": int(np.count_nonzero(line_mask))
+    }
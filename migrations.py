@@ -0,0 +1,142 @@
+import sys
+import time
+from datetime import datetime
+
+from firebase_admin import firestore
+
+from document_schema import SCHEMA_VERSIONS, schema_version, upgrade
+from firestore_batch import MAX_BATCH_SIZE, commit_in_chunks
+from tenants import DEFAULT_TENANT, TenantClient
+
+CHECKPOINTS = "migrations"  # One progress document per collection: migrations/{collection}
+CHUNK_SIZE = 400            # Documents per page; a page's updates plus its checkpoint commit as one batch
+FINISHED_RECHECK_SECONDS = 60  # How long an unfinished migration is assumed to stay unfinished before its checkpoint is re-read
+
+_finished = {}  # (tenant_id, collection, schema version) -> (finished, monotonic time checked)
+
+
+def changes(before, after):
+    """Field updates turning `before` into `after`: new or changed fields, and DELETE_FIELD for dropped ones."""
+    updates = {field: value for field, value in after.items() if field not in before or before[field] != value}
+    updates.update({field: firestore.DELETE_FIELD for field in before if field not in after})
+    return updates
+
+
+def migrate(db, collection, dry_run=False, restart=False, chunk_size=CHUNK_SIZE, on_progress=None):
+    """
+    Rewrites the documents of `collection` below SCHEMA_VERSIONS[collection] into the canonical shape.
+
+    Pages through the collection in document ID order. Each page's updates
+    commit in one batch together with a checkpoint (`migrations/{collection}`:
+    cursor and counts), so a stopped run resumes after the last committed page
+    and `restart` starts over. Documents already at the current version are
+    skipped, which also makes re-running safe. A `dry_run` reads the whole
+    collection, writes nothing and ignores the checkpoint. Returns the summary
+    dict; `fields` counts the updates per field.
+    """
+    version = SCHEMA_VERSIONS[collection]
+    chunk_size = min(chunk_size, MAX_BATCH_SIZE - 1)
+    checkpoint_ref = db.collection(CHECKPOINTS).document(collection)
+    state = {
+        "tenant_id": getattr(db, "tenant_id", DEFAULT_TENANT), "collection": collection, "schema_version": version,
+        "cursor": None, "scanned": 0, "upgraded": 0, "fields": {}, "dry_run": dry_run, "started_at": datetime.now().isoformat(timespec="seconds"), "finished_at": None
+    }
+    if not dry_run and not restart:
+        snapshot = checkpoint_ref.get()
+        saved = snapshot.to_dict() if snapshot.exists else None
+        if saved and saved.get("schema_version") == version:
+            if saved.get("finished_at"):
+                _finished[_finished_key(db, collection)] = (True, time.monotonic())
+                return saved  # Already migrated to this version
+            state = saved
+
+    query = db.collection(collection).order_by("__name__").limit(chunk_size)
+    while True:
+        page = query.start_after({"__name__": state["cursor"]}) if state["cursor"] else query
+        docs = list(page.stream())
+        if not docs:
+            break
+
+        operations = []
+        for doc in docs:
+            data = doc.to_dict()
+            if schema_version(data) >= version:
+                continue
+            updates = changes(data, upgrade(collection, data))
+            for field in updates:
+                state["fields"][field] = state["fields"].get(field, 0) + 1
+            operations.append(("update", doc.reference, updates))
+
+        state["scanned"] += len(docs)
+        state["upgraded"] += len(operations)
+        state["cursor"] = docs[-1].id
+        if not dry_run:
+            commit_in_chunks(db, operations + [("set", checkpoint_ref, state)])
+        if on_progress:
+            on_progress(state)
+        if len(docs) < chunk_size:
+            break
+
+    state["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    if not dry_run:
+        checkpoint_ref.set(state)
+        _finished[_finished_key(db, collection)] = (True, time.monotonic())
+    return state
+
+
+def _finished_key(db, collection):
+    return getattr(db, "tenant_id", DEFAULT_TENANT), collection, SCHEMA_VERSIONS[collection]
+
+
+def finished(db, collection):
+    """
+    True once `migrate` has completed `collection` at the current schema version (from its checkpoint).
+
+    Read on every page load, so the answer is kept per process: True for good
+    (a migration does not become unfinished at the same schema version), False
+    for FINISHED_RECHECK_SECONDS. A stale False only means readers keep
+    upgrading documents in memory a little longer.
+    """
+    key = _finished_key(db, collection)
+    cached = _finished.get(key)
+    if cached and (cached[0] or time.monotonic() - cached[1] < FINISHED_RECHECK_SECONDS):
+        return cached[0]
+    snapshot = db.collection(CHECKPOINTS).document(collection).get()
+    saved = snapshot.to_dict() if snapshot.exists else {}
+    done = bool(saved.get("finished_at")) and saved.get("schema_version") == SCHEMA_VERSIONS[collection]
+    _finished[key] = (done, time.monotonic())
+    return done
+
+
+def tenant_ids(db):
+    """The default tenant and every tenant registered in `tenants`."""
+    return [DEFAULT_TENANT] + [doc.id for doc in db.collection("tenants").select([]).stream()]
+
+
+def migrate_all(db, dry_run=False, restart=False, on_progress=None):
+    """Runs `migrate` for every versioned collection of every tenant; returns {(tenant_id, collection): summary}."""
+    return {
+        (tenant_id, collection): migrate(TenantClient(db, tenant_id), collection, dry_run, restart, on_progress=on_progress)
+        for tenant_id in tenant_ids(db)
+        for collection in SCHEMA_VERSIONS
+    }
+
+
+def _print_progress(state):
+    print(f"⏳ {state['tenant_id']}/{state['collection']}: {state['scanned']} scanned, "
+          f"{state['upgraded']} {'to upgrade' if state.get('dry_run') else 'upgraded'}")
+
+
+if __name__ == "__main__":
+    flags = set(sys.argv[1:])
+    if not flags <= {"--dry-run", "--restart"}:
+        print("Usage: python migrations.py [--dry-run] [--restart]")
+        sys.exit(1)
+
+    from firebase_admin import credentials
+    import firebase_admin
+    firebase_admin.initialize_app(credentials.Certificate("serviceAccountKey.json"))
+    for (tenant_id, collection), summary in migrate_all(firestore.client(), "--dry-run" in flags, "--restart" in flags, _print_progress).items():
+        fields = ", ".join(f"{field}: {count}" for field, count in sorted(summary["fields"].items())) or "no changes"
+        print(f"✅ {tenant_id}/{collection} at schema v{summary['schema_version']}: "
+              f"{summary['upgraded']} of {summary['scanned']} documents {'to upgrade' if summary.get('dry_run') else 'upgraded'} ({fields})")
@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import FailedPrecondition, NotFound
+
+from firestore_batch import commit_in_chunks
+
+
+class StaleEditError(Exception):
+    """Raised when the document changed after the edit form loaded it."""
+
+
+# ✅ Change listeners (cache invalidation, change log, incremental solvers)
+_listeners = {}  # key -> (callback, tenant_id)
+
+
+def subscribe(callback, key=None, tenant_id=None):
+    """
+    Registers `callback(event)` to be called after every successful write made through this module.
+
+    A later subscription with the same `key` replaces this one (app.py re-registers on every
+    script rerun, so its keys name the tenant); with `tenant_id`, only writes made through that
+    tenant's client are delivered.
+    """
+    _listeners[callback if key is None else key] = (callback, tenant_id)
+    return callback
+
+
+def emit(event):
+    """Delivers a change event to every listener of its tenant; a failing listener never fails the write."""
+    for callback, tenant_id in list(_listeners.values()):
+        if tenant_id is not None and tenant_id != event.get("tenant_id"):
+            continue
+        try:
+            callback(event)
+        except Exception as e:
+            print(f"⚠️ Change listener {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+def change_event(entity, entity_id, changed_fields, actor=None, operation="update"):
+    """Builds the compact change event passed to listeners."""
+    return {
+        "entity": entity,
+        "entity_id": entity_id,
+        "operation": operation,
+        "changed_fields": sorted(changed_fields),
+        "actor": actor,
+        "timestamp": datetime.now(timezone.utc)
+    }
+
+
+def diff_fields(original, updated):
+    """Returns only the fields of `updated` whose value differs from `original`."""
+    return {field: value for field, value in updated.items() if original.get(field) != value}
+
+
+def update_changed_fields(db, doc_ref, entity, original, updated, loaded_update_time=None, actor=None, related=None):
+    """
+    Writes only the fields that changed since `original` was loaded.
+
+    No write (and no event) happens when nothing changed. With
+    `loaded_update_time` the write is conditional on the document still having
+    that update time, so a concurrent edit raises StaleEditError instead of
+    being overwritten. `related(changes)` may return more batch operations
+    (e.g. refreshed denormalized copies), committed in the same batch as the
+    update. Returns the dict of fields written.
+    """
+    changes = diff_fields(original, updated)
+    if not changes:
+        return {}
+
+    option = db.write_option(last_update_time=loaded_update_time) if loaded_update_time else None
+    try:
+        if related is None:
+            doc_ref.update(changes, option=option)
+        else:
+            commit_in_chunks(db, [("update", doc_ref, changes, option)] + list(related(changes)))
+    except (FailedPrecondition, NotFound):
+        raise StaleEditError(f"{entity} {doc_ref.id} was modified or deleted by someone else. Reload it and try again.")
+
+    emit({**change_event(entity, doc_ref.id, changes.keys(), actor), "tenant_id": getattr(db, "tenant_id", None)})
+    return changes
@@ -0,0 +1,191 @@
+from datetime import datetime
+
+from firebase_admin import firestore
+
+from assignment_engine import score_candidates
+from concurrent_loader import stream_queries
+from explanations import STATUS_NOT_REACHED, replaced_columns, table_rows
+from worker_stats import updated_stats, vacated_stats
+
+IN_QUERY_LIMIT = 30  # Firestore limit for "in" filters
+
+
+class ReplacementConflict(Exception):
+    """The vacated position or the chosen replacement changed since the candidates were listed."""
+
+
+def find_vacated(db, run_id, worker_id):
+    """Returns the worker's assignment snapshot in the run and their employee doc ID, or (None, None)."""
+    docs = list(
+        db.collection("assignments").where("run_id", "==", run_id).where("employee_id", "==", worker_id).limit(1).stream()
+    )
+    if not docs:
+        return None, None
+    employees = list(db.collection("employees").where("worker_id", "==", worker_id).select([]).limit(1).stream())
+    return docs[0], employees[0].id if employees else None
+
+
+def _employees_by_worker_id(db, worker_ids):
+    employees_ref, found = db.collection("employees"), {}
+    queries = (employees_ref.where("worker_id", "in", worker_ids[start:start + IN_QUERY_LIMIT]) for start in range(0, len(worker_ids), IN_QUERY_LIMIT))
+    for docs in stream_queries(queries):
+        for doc in docs:
+            found[doc.get("worker_id")] = {**doc.to_dict(), "doc_id": doc.id}
+    return found
+
+
+def _is_eligible(employee, role, shift):
+    return role in employee.get("role", []) and (not shift or shift in employee.get("availability", []))
+
+
+def _free(db, run_id, employees):
+    """Drops employees who already hold an assignment in the run (one batched read of their my_assignments docs)."""
+    refs = [db.collection("my_assignments").document(employee["doc_id"]) for employee in employees]
+    taken = {snap.id for snap in db.get_all(refs) if snap.exists and snap.get("run_id") == run_id}
+    return [employee for employee in employees if employee["doc_id"] not in taken]
+
+
+def _candidate(employee, score, distance, rank, source):
+    return {
+        "worker_id": employee["worker_id"],
+        "doc_id": employee["doc_id"],
+        "name": " ".join(filter(None, [employee.get("first_name"), employee.get("sur_name")])) or employee["worker_id"],
+        "phone_number": employee.get("phone_number", ""),
+        "score": score,
+        "distance": distance,
+        "rank": rank,
+        "source": source
+    }
+
+
+def find_replacements(db, explanation_store, run_id, assignment, limit=5):
+    """
+    Best free, eligible replacements for a vacated assignment (dict with job_site_id, role, shift, employee_id).
+
+    Reads the run's stored top-K ranking of the slot and keeps candidates who
+    match the role and shift and hold no assignment in the run. Only when the
+    top K runs dry is the slot rescored against all employees.
+    """
+    site_id, role, shift = assignment["job_site_id"], assignment["role"], assignment.get("shift")
+    exclude = {assignment["employee_id"]}
+    results = []
+
+    table = explanation_store.slot(run_id, site_id, role)
+    if table:
+        rows = [
+            row for row, status in zip(table_rows(table), table["status"])
+            if status == STATUS_NOT_REACHED and row["worker_id"] not in exclude
+        ]
+        employees = _employees_by_worker_id(db, [row["worker_id"] for row in rows])
+        eligible = [employees[row["worker_id"]] for row in rows if row["worker_id"] in employees and _is_eligible(employees[row["worker_id"]], role, shift)]
+        free = {employee["worker_id"] for employee in _free(db, run_id, eligible)}
+        results = [
+            _candidate(employees[row["worker_id"]], row["score"], row["distance"], row["rank"], "ranking")
+            for row in rows if row["worker_id"] in free
+        ][:limit]
+        exclude |= {row["worker_id"] for row in table_rows(table)}
+
+    if len(results) < limit:
+        # ✅ Fallback: the stored top K is exhausted, rescore this one slot only
+        site_docs = list(db.collection("job_sites").where("site_id", "==", site_id).limit(1).stream())
+        if site_docs:
+            site = site_docs[0].to_dict()
+            role_data = site.get("required_roles", {}).get(role, {})
+            employees = [
+                {**doc.to_dict(), "doc_id": doc.id} for doc in db.collection("employees").stream()
+                if doc.get("worker_id") not in exclude
+            ]
+            ranking = [c for c in score_candidates(site, role, role_data, employees) if _is_eligible(c["employee"], role, shift)]
+            for start in range(0, len(ranking), 100):
+                if len(results) >= limit:
+                    break
+                chunk = ranking[start:start + 100]
+                free = {employee["doc_id"] for employee in _free(db, run_id, [c["employee"] for c in chunk])}
+                results.extend(
+                    _candidate(c["employee"], c["score"], round(c["distance"], 2), None, "rescored")
+                    for c in chunk if c["employee"]["doc_id"] in free
+                )
+            results = results[:limit]
+
+    return results
+
+
+#----------------------------------------------------------------------------------------
+
+@firestore.transactional
+def _swap(transaction, db, run_id, assignment_ref, vacated_worker_id, vacated_doc_id, candidate, site, log_op, slot_ref):
+    snapshot = assignment_ref.get(transaction=transaction)
+    if not snapshot.exists or snapshot.get("employee_id") != vacated_worker_id or snapshot.get("run_id") != run_id:
+        raise ReplacementConflict("This position was already changed. Reload and try again.")
+
+    candidate_ref = db.collection("my_assignments").document(candidate["doc_id"])
+    current = candidate_ref.get(transaction=transaction)
+    if current.exists and current.get("run_id") == run_id:
+        raise ReplacementConflict(f"{candidate['worker_id']} was assigned elsewhere in the meantime.")
+
+    # ✅ Both workers' fairness aggregates move with the assignment (reads before any write)
+    stats_ref = db.collection("worker_stats")
+    candidate_stats_ref, vacated_stats_ref = stats_ref.document(candidate["worker_id"]), stats_ref.document(vacated_worker_id)
+    candidate_stats, vacated = (snap.to_dict() if snap.exists else {} for snap in (
+        candidate_stats_ref.get(transaction=transaction), vacated_stats_ref.get(transaction=transaction)
+    ))
+    slot = slot_ref.get(transaction=transaction) if slot_ref else None
+
+    assignment = snapshot.to_dict()
+    assigned_date = datetime.now()
+    transaction.update(assignment_ref, {
+        "employee_id": candidate["worker_id"],
+        "distance": candidate["distance"],
+        "assigned_date": assigned_date,
+        "replaced_worker_id": vacated_worker_id
+    })
+    if vacated_doc_id:
+        transaction.delete(db.collection("my_assignments").document(vacated_doc_id))
+    transaction.set(candidate_ref, {
+        "run_id": run_id,
+        "worker_id": candidate["worker_id"],
+        "job_site_id": assignment["job_site_id"],
+        "site_name": site.get("site_name", "Unknown"),
+        "address": site.get("address", "Unknown"),
+        "role": assignment["role"],
+        "shift": assignment.get("shift"),
+        "distance": candidate["distance"],
+        "assigned_date": assigned_date
+    })
+    transaction.set(candidate_stats_ref, updated_stats(candidate_stats, candidate["worker_id"], assignment.get("shift"), assigned_date.date()))
+    if vacated:
+        counted_on = assignment.get("assigned_date") or assigned_date
+        transaction.set(vacated_stats_ref, vacated_stats(vacated, assignment.get("shift"), counted_on, assigned_date.date()))
+    if slot and slot.exists:
+        # ✅ The slot's stored explanation follows the replacement
+        transaction.update(slot_ref, replaced_columns(slot.to_dict(), vacated_worker_id, candidate["worker_id"]))
+    if log_op:
+        transaction.create(log_op[1], log_op[2])
+
+
+def assign_replacement(db, run_id, assignment_snapshot, vacated_doc_id, candidate, change_log=None, actor=None, notify=None,
+                       explanation_store=None):
+    """
+    Moves one assignment to `candidate` in a single transaction: the assignment
+    document, both workers' my_assignments and worker_stats documents, the
+    slot's stored explanation and the change-log entry.
+    No other assignment is touched. `notify(phone, message)` is called after the commit.
+    """
+    assignment = assignment_snapshot.to_dict()
+    site_docs = list(db.collection("job_sites").where("site_id", "==", assignment["job_site_id"]).limit(1).stream())
+    site = site_docs[0].to_dict() if site_docs else {}
+    log_op = change_log.operation(
+        "assignment", assignment_snapshot.id, ["employee_id", "distance", "assigned_date"], actor, "replace",
+        run_id=run_id, replaced_worker_id=assignment["employee_id"], worker_id=candidate["worker_id"]
+    ) if change_log else None
+
+    slot_ref = explanation_store.slot_ref(run_id, assignment["job_site_id"], assignment["role"]) if explanation_store else None
+
+    _swap(db.transaction(), db, run_id, assignment_snapshot.reference, assignment["employee_id"], vacated_doc_id, candidate, site, log_op, slot_ref)
+
+    if notify and candidate.get("phone_number"):
+        shift = f" ({assignment['shift']} shift)" if assignment.get("shift") else ""
+        notify(candidate["phone_number"],
+               f"OptiShift: you have been assigned as {assignment['role']}{shift} at {site.get('site_name', assignment['job_site_id'])}, "
+               f"{site.get('address', '')}.")
+    return assignment
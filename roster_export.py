@@ -0,0 +1,232 @@
+import csv
+import os
+import re
+
+from concurrent_loader import stream_queries
+from tenants import DEFAULT_TENANT
+
+EXPORT_DIR = ".exports"
+
+SITE_FIELDS = ["site_id", "site_name", "site_company", "site_superintendent", "site_contact_number", "address"]
+EMPLOYEE_FIELDS = ["worker_id", "first_name", "middle_name", "sur_name", "phone_number"]
+
+ROSTER_COLUMNS = [
+    "Group", "Site ID", "Site Name", "Company", "Address", "Superintendent", "Site Contact",
+    "Required Role", "Shift", "Worker ID", "Full Name", "Phone Number", "Distance (km)"
+]
+
+GROUP_KEYS = {
+    "site": lambda site: f"{site.get('site_name', 'N/A')} ({site.get('site_id', 'N/A')})",
+    "superintendent": lambda site: site.get("site_superintendent") or "Unassigned"
+}
+
+# Firestore limits "in" filters to 30 values
+IN_QUERY_LIMIT = 30
+SITE_WINDOW = 16  # Sites whose assignments are fetched concurrently
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Row generator: one window of sites' assignments in memory at a time
+
+def _employees_by_worker_id(employees_ref, worker_ids):
+    queries = (
+        employees_ref.where("worker_id", "in", worker_ids[start:start + IN_QUERY_LIMIT]).select(EMPLOYEE_FIELDS)
+        for start in range(0, len(worker_ids), IN_QUERY_LIMIT)
+    )
+    employees = {}
+    for docs in stream_queries(queries):  # "in" chunks are fetched concurrently
+        for doc in docs:
+            data = doc.to_dict()
+            employees[data.get("worker_id")] = data
+    return employees
+
+
+def iter_roster_rows(db, run_id, group_by="site"):
+    """
+    Yields the roster rows of an assignment run (dicts keyed by ROSTER_COLUMNS) ordered by group.
+    Assignments of other runs, still present while a new run replaces them, are left out.
+
+    Sites are sorted by the group key, then each site's assignments and just
+    the employees they reference are fetched, SITE_WINDOW sites at a time and
+    concurrently, so memory does not grow with the size of the run.
+    """
+    group_key = GROUP_KEYS[group_by]
+    sites = [doc.to_dict() for doc in db.collection("job_sites").select(SITE_FIELDS).stream()]
+    sites.sort(key=lambda site: (group_key(site).lower(), site.get("site_id", "")))
+
+    assignments_ref, employees_ref = db.collection("assignments"), db.collection("employees")
+    if run_id:
+        assignments_ref = assignments_ref.where("run_id", "==", run_id)
+    for start in range(0, len(sites), SITE_WINDOW):
+        window = sites[start:start + SITE_WINDOW]
+        site_docs = stream_queries(assignments_ref.where("job_site_id", "==", site.get("site_id")) for site in window)
+        window_assignments = [[doc.to_dict() for doc in docs] for docs in site_docs]
+        employees = _employees_by_worker_id(
+            employees_ref, sorted({a.get("employee_id") for assignments in window_assignments for a in assignments})
+        )
+        yield from _site_rows(group_key, window, window_assignments, employees)
+
+
+def _site_rows(group_key, sites, sites_assignments, employees):
+    for site, assignments in zip(sites, sites_assignments):
+        if not assignments:
+            continue
+        assignments.sort(key=lambda a: (a.get("role", ""), a.get("shift") or "", a.get("employee_id", "")))
+
+        for assignment in assignments:
+            employee = employees.get(assignment.get("employee_id"), {})
+            full_name = " ".join(
+                part for part in (employee.get("first_name"), employee.get("middle_name"), employee.get("sur_name")) if part
+            )
+            distance = assignment.get("distance")
+            yield {
+                "Group": group_key(site),
+                "Site ID": site.get("site_id", "N/A"),
+                "Site Name": site.get("site_name", "N/A"),
+                "Company": site.get("site_company", "N/A"),
+                "Address": site.get("address", "N/A"),
+                "Superintendent": site.get("site_superintendent", "N/A"),
+                "Site Contact": site.get("site_contact_number", "N/A"),
+                "Required Role": assignment.get("role", "N/A"),
+                "Shift": assignment.get("shift") or "N/A",
+                "Worker ID": assignment.get("employee_id", "N/A"),
+                "Full Name": full_name or "N/A",
+                "Phone Number": employee.get("phone_number", "N/A"),
+                "Distance (km)": round(distance, 2) if isinstance(distance, (int, float)) else None
+            }
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Writers: each consumes the row generator and streams to disk
+
+def write_csv(rows, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=ROSTER_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+def _sheet_title(group, used_titles):
+    """Excel sheet titles: max 31 chars, no []:*?/\\ and unique within the workbook."""
+    base = re.sub(r"[\[\]:*?/\\]", " ", group).strip()[:28] or "Roster"
+    title, suffix = base, 2
+    while title.lower() in used_titles:
+        title, suffix = f"{base[:26]} {suffix}", suffix + 1
+    used_titles.add(title.lower())
+    return title
+
+
+def write_xlsx(rows, path):
+    """One roster sheet per group, written in openpyxl's write-only (streaming) mode."""
+    from openpyxl import Workbook  # Optional dependency, only needed for Excel exports
+
+    workbook = Workbook(write_only=True)
+    used_titles, current_group, sheet = set(), None, None
+    for row in rows:
+        if row["Group"] != current_group:
+            current_group = row["Group"]
+            sheet = workbook.create_sheet(_sheet_title(current_group, used_titles))
+            sheet.append(ROSTER_COLUMNS[1:])
+        sheet.append([row[col] for col in ROSTER_COLUMNS[1:]])
+    if sheet is None:
+        workbook.create_sheet("Roster").append(ROSTER_COLUMNS[1:])
+    workbook.save(path)
+
+
+PDF_COLUMNS = [("Required Role", 70), ("Shift", 75), ("Worker ID", 80), ("Full Name", 170), ("Phone Number", 95), ("Distance (km)", 60)]
+
+
+def write_pdf(rows, path):
+    """Printable roster sheets, one page (or more) per group."""
+    try:
+        from reportlab.lib.pagesizes import letter
+        from reportlab.pdfgen import canvas
+    except ImportError:
+        raise RuntimeError("PDF export requires the 'reportlab' package.")
+
+    pdf = canvas.Canvas(path, pagesize=letter)
+    width, height = letter
+    margin, line_height = 40, 14
+    current_group, y = None, None
+
+    def start_page(row, continued=False):
+        pdf.setFont("Helvetica-Bold", 13)
+        pdf.drawString(margin, height - margin, f"{row['Site Name']} ({row['Site ID']})" + (" - continued" if continued else ""))
+        pdf.setFont("Helvetica", 9)
+        pdf.drawString(margin, height - margin - 16, f"{row['Address']}  |  {row['Company']}")
+        pdf.drawString(margin, height - margin - 28, f"Superintendent: {row['Superintendent']}  |  Contact: {row['Site Contact']}")
+        x, header_y = margin, height - margin - 50
+        pdf.setFont("Helvetica-Bold", 9)
+        for col, col_width in PDF_COLUMNS:
+            pdf.drawString(x, header_y, col)
+            x += col_width
+        pdf.setFont("Helvetica", 9)
+        return header_y - line_height
+
+    current_site = None
+    for row in rows:
+        if (row["Group"], row["Site ID"]) != (current_group, current_site):
+            if current_group is not None:
+                pdf.showPage()
+            current_group, current_site = row["Group"], row["Site ID"]
+            y = start_page(row)
+        elif y < margin:
+            pdf.showPage()
+            y = start_page(row, continued=True)
+
+        x = margin
+        for col, col_width in PDF_COLUMNS:
+            value = row[col]
+            pdf.drawString(x, y, "" if value is None else str(value)[:40])
+            x += col_width
+        y -= line_height
+
+    if current_group is None:
+        pdf.drawString(margin, height - margin, "No assignments found.")
+    pdf.save()
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "pdf": write_pdf}
+MIME_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf"
+}
+
+
+#----------------------------------------------------------------------------------------
+
+def export_roster(db, run_id, group_by="site", fmt="csv", shared_cache=None, shared_ttl=24 * 3600, revision=0):
+    """
+    Returns the path of the roster file for an assignment run, generating it on first request.
+    Files are cached on disk by tenant, run id and `revision` (bumped when a replacement changes the run's
+    assignments), so repeated downloads of the same run cost no Firestore reads.
+    With a `shared_cache`, a file generated by one app replica is reused by the others.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if group_by not in GROUP_KEYS:
+        raise ValueError(f"Unsupported grouping: {group_by}")
+
+    run_dir = os.path.join(EXPORT_DIR, getattr(db, "tenant_id", DEFAULT_TENANT), run_id or "unversioned", f"r{revision}")
+    path = os.path.join(run_dir, f"roster_by_{group_by}.{fmt}")
+    if run_id and os.path.exists(path):
+        return path
+
+    os.makedirs(run_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    shared_key = f"roster:{run_id}:{revision}:{group_by}:{fmt}"
+    data = shared_cache.get(shared_key) if shared_cache and run_id else None
+    if data is not None:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+    else:
+        WRITERS[fmt](iter_roster_rows(db, run_id, group_by), tmp_path)
+        if shared_cache and run_id:
+            with open(tmp_path, "rb") as f:
+                shared_cache.set(shared_key, f.read(), shared_ttl)
+    os.replace(tmp_path, path)  # Never serve a half-written file
+    return path
@@ -0,0 +1,129 @@
+import math
+import random
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from assignment_engine import candidate_priority, solve_greedy
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(a, b):
+    """Great-circle distance between two (lat, lon) points; cheap enough for shard routing."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def _location(entity):
+    lat, lon = entity.get('latitude'), entity.get('longitude')
+    return None if lat is None or lon is None else (lat, lon)
+
+
+def kmeans(points, k, iterations=25, seed=0):
+    """Lloyd's k-means on (lat, lon) points with k-means++ seeding; returns (centroids, labels)."""
+    rng = random.Random(seed)
+    centroids = [rng.choice(points)]
+    while len(centroids) < k:
+        weights = [min(haversine_km(p, c) for c in centroids) ** 2 for p in points]
+        if not any(weights):
+            break
+        centroids.append(rng.choices(points, weights=weights)[0])
+
+    labels = [0] * len(points)
+    for _ in range(iterations):
+        labels = [min(range(len(centroids)), key=lambda i: haversine_km(p, centroids[i])) for p in points]
+        members = defaultdict(list)
+        for point, label in zip(points, labels):
+            members[label].append(point)
+        updated = [
+            (sum(p[0] for p in members[i]) / len(members[i]), sum(p[1] for p in members[i]) / len(members[i]))
+            if members[i] else centroids[i]
+            for i in range(len(centroids))
+        ]
+        if updated == centroids:
+            break
+        centroids = updated
+    return centroids, labels
+
+
+def partition(employees, job_sites, num_shards, overlap_km=10.0, seed=0):
+    """
+    Splits the problem into geographic shards of (employees, job_sites).
+
+    Sites are clustered by location. Each worker joins the shard with the nearest
+    centroid, plus every other shard whose centroid is at most `overlap_km`
+    farther away, so border workers can be used on either side.
+    """
+    located_sites = [site for site in job_sites if _location(site)]
+    num_shards = max(1, min(num_shards, len(located_sites)))
+    if num_shards == 1:
+        return [(employees, job_sites)]
+
+    centroids, labels = kmeans([_location(site) for site in located_sites], num_shards, seed=seed)
+    shard_sites = defaultdict(list)
+    for site, label in zip(located_sites, labels):
+        shard_sites[label].append(site)
+    shard_sites[labels[0]].extend(site for site in job_sites if not _location(site))  # Never drop a site silently
+
+    shard_employees = defaultdict(list)
+    for employee in employees:
+        location = _location(employee)
+        if location is None:
+            continue
+        distances = [haversine_km(location, centroid) for centroid in centroids]
+        nearest = min(distances)
+        for shard, distance in enumerate(distances):
+            if distance <= nearest + overlap_km:
+                shard_employees[shard].append(employee)
+
+    return [(shard_employees[shard], shard_sites[shard]) for shard in sorted(shard_sites)]
+
+
+def _solve_shard(shard):
+    employees, job_sites = shard
+    return solve_greedy(employees, job_sites)
+
+
+def reconcile(shard_results):
+    """
+    Merges per-shard picks. A worker claimed by several shards keeps the pick
+    with the best priority; each losing slot is refilled from its own ranking
+    with the next worker not already placed.
+    """
+    rankings, claims = {}, defaultdict(list)
+    for picks, shard_rankings in shard_results:
+        rankings.update(shard_rankings)
+        for pick in picks:
+            claims[pick['employee']['worker_id']].append(pick)
+
+    accepted, vacated, taken = [], [], set()
+    for worker_id, worker_picks in claims.items():
+        best = min(worker_picks, key=candidate_priority)
+        accepted.append(best)
+        taken.add(worker_id)
+        vacated.extend(pick for pick in worker_picks if pick is not best)
+
+    for pick in vacated:
+        for candidate in rankings.get((pick['site']['site_id'], pick['role']), []):
+            worker_id = candidate['employee']['worker_id']
+            if worker_id not in taken:
+                accepted.append({**candidate, 'site': pick['site'], 'role': pick['role']})
+                taken.add(worker_id)
+                break
+
+    return accepted, rankings
+
+
+def solve_sharded(employees, job_sites, num_shards=4, overlap_km=10.0, parallel=True, max_workers=None):
+    """Solves each geographic shard independently (in parallel processes) and reconciles the results."""
+    shards = partition(employees, job_sites, num_shards, overlap_km)
+    if len(shards) == 1:
+        return solve_greedy(employees, job_sites)
+
+    if parallel:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_solve_shard, shards))
+    else:
+        results = [_solve_shard(shard) for shard in shards]
+    return reconcile(results)
@@ -0,0 +1,251 @@
+import pickle
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+class LockBusy(Exception):
+    """Raised when a distributed lock is already held by another process."""
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Backends: raw bytes in, raw bytes out
+
+class InProcessBackend:
+    """Dict-backed backend for a single app process (the default)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None, only_if_missing=False):
+        with self._lock:
+            if only_if_missing and self._live(key):
+                return False
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def incr(self, key):
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[0]) + 1 if entry else 1
+            self._data[key] = (str(value).encode(), entry[1] if entry else None)
+            return value
+
+    def delete_if_equals(self, key, value):
+        with self._lock:
+            entry = self._live(key)
+            if entry and entry[0] == value:
+                del self._data[key]
+                return True
+            return False
+
+
+class RedisBackend:
+    """
+    Minimal client for the Redis protocol (RESP2) over one socket per thread.
+    Works with Redis, Valkey, KeyDB or any local stand-in that speaks the protocol.
+    """
+
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, host="localhost", port=6379, db=0, password=None, timeout=5.0):
+        self.host, self.port, self.db, self.password, self.timeout = host, port, db, password, timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._local.sock, self._local.reader = sock, sock.makefile("rb")
+        if self.password:
+            self._send_command("AUTH", self.password)
+        if self.db:
+            self._send_command("SELECT", self.db)
+
+    def _close(self):
+        for attr in ("reader", "sock"):
+            handle = getattr(self._local, attr, None)
+            if handle is not None:
+                try:
+                    handle.close()
+                except OSError:
+                    pass
+                setattr(self._local, attr, None)
+
+    @staticmethod
+    def _encode(args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Cache server error: {payload.decode()}")
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"Unexpected reply from cache server: {line!r}")
+
+    def _send_command(self, *args):
+        self._local.sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def execute(self, *args, idempotent=True):
+        """
+        Runs one command, reconnecting once if the connection was dropped. A
+        command that was already written may have run even if its reply was
+        lost, so it is only sent again when it is `idempotent`.
+        """
+        for attempt in range(2):
+            sent = False
+            try:
+                if getattr(self._local, "sock", None) is None:
+                    self._connect()
+                self._local.sock.sendall(self._encode(args))
+                sent = True
+                return self._read_reply()
+            except (ConnectionError, OSError):
+                self._close()
+                if attempt or (sent and not idempotent):
+                    raise
+
+    def get(self, key):
+        return self.execute("GET", key)
+
+    def set(self, key, value, ttl=None, only_if_missing=False):
+        args = ["SET", key, value]
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+        if not only_if_missing:
+            return self.execute(*args) == "OK"
+        args.append("NX")
+        try:
+            return self.execute(*args, idempotent=False) == "OK"
+        except (ConnectionError, OSError):
+            # ✅ The reply was lost, not necessarily the write: finding our own value means the SET ran
+            stored = self.execute("GET", key)
+            if stored is not None:
+                return stored == (value if isinstance(value, bytes) else str(value).encode("utf-8"))
+            return self.execute(*args, idempotent=False) == "OK"
+
+    def delete(self, *keys):
+        return self.execute("DEL", *keys) if keys else 0
+
+    def incr(self, key):
+        return self.execute("INCR", key)  # Version bumps only: a second increment after a lost reply still invalidates
+
+    def delete_if_equals(self, key, value):
+        return self.execute("EVAL", self.RELEASE_SCRIPT, 1, key, value) == 1
+
+
+def backend_from_url(url):
+    """memory:// for the in-process backend, redis://[:password@]host:port/db for a shared one."""
+    parsed = urlparse(url or "memory://")
+    if parsed.scheme in ("", "memory"):
+        return InProcessBackend()
+    if parsed.scheme == "redis":
+        return RedisBackend(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            db=int(parsed.path.lstrip("/") or 0),
+            password=parsed.password
+        )
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+
+#----------------------------------------------------------------------------------------
+
+class SharedCache:
+    """
+    Pickled values, versioned namespaces and distributed locks on top of a backend.
+
+    Replicas pointed at the same backend share warm entries, see each other's
+    invalidations through version counters, and serialize runs with `lock()`.
+    """
+
+    def __init__(self, backend, prefix="optishift"):
+        self.backend = backend
+        self.prefix = prefix
+
+    def _key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def scoped(self, namespace):
+        """A view on the same backend whose keys, versions and locks live under `namespace`."""
+        return SharedCache(self.backend, f"{self.prefix}:{namespace}")
+
+    def get(self, key, default=None):
+        data = self.backend.get(self._key(key))
+        return default if data is None else pickle.loads(data)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(self._key(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+
+    def delete(self, *keys):
+        return self.backend.delete(*(self._key(key) for key in keys))
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Returns the cached value, or calls `loader()` once and shares the result."""
+        data = self.backend.get(self._key(key))
+        if data is not None:
+            return pickle.loads(data)
+        value = loader()
+        self.set(key, value, ttl)
+        return value
+
+    def version(self, namespace):
+        """Current version of a namespace; include it in cache keys so a bump invalidates every replica."""
+        data = self.backend.get(self._key(f"version:{namespace}"))
+        return int(data) if data is not None else 0
+
+    def bump(self, namespace):
+        return self.backend.incr(self._key(f"version:{namespace}"))
+
+    @contextmanager
+    def lock(self, name, ttl=600):
+        """
+        Distributed lock; raises LockBusy if another holder has it.
+        The TTL frees the lock if its holder dies; only the holder's token can release it.
+        """
+        key, token = self._key(f"lock:{name}"), uuid.uuid4().hex.encode()
+        if not self.backend.set(key, token, ttl, only_if_missing=True):
+            raise LockBusy(f"'{name}' is already running elsewhere.")
+        try:
+            yield
+        finally:
+            self.backend.delete_if_equals(key, token)
@@ -0,0 +1,45 @@
+DEFAULT_TENANT = "default"  # Data written before tenants existed: the root collections
+GLOBAL_COLLECTIONS = frozenset({"users", "tenants", "geocode_cache"})  # Shared by all tenants (login looks users up before the tenant is known)
+
+
+class TenantClient:
+    """
+    Firestore client scoped to one tenant (a staffing client company).
+
+    `collection(name)` resolves to `tenants/{tenant_id}/{name}`, so every
+    module that takes `db` reads and writes only that tenant's partition and
+    scans, searches and runs scale with the tenant's size. The default tenant
+    keeps the root collections, and GLOBAL_COLLECTIONS stay at the root for
+    everyone. Everything else (batch, transaction, get_all...) is the
+    underlying client.
+    """
+
+    def __init__(self, db, tenant_id=DEFAULT_TENANT):
+        self.client = db.client if isinstance(db, TenantClient) else db
+        self.tenant_id = tenant_id or DEFAULT_TENANT
+
+    def collection(self, name):
+        if name in GLOBAL_COLLECTIONS or self.tenant_id == DEFAULT_TENANT:
+            return self.client.collection(name)
+        return self.client.collection("tenants").document(self.tenant_id).collection(name)
+
+    def for_tenant(self, tenant_id):
+        return TenantClient(self.client, tenant_id)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def for_tenant(db, tenant_id):
+    """`db` scoped to `tenant_id`; a plain client is only ever the default tenant."""
+    return db.for_tenant(tenant_id) if isinstance(db, TenantClient) else db
+
+
+def exists(db, tenant_id):
+    """True for the default tenant and for tenants registered in `tenants/{tenant_id}`."""
+    return tenant_id == DEFAULT_TENANT or db.collection("tenants").document(tenant_id).get().exists
+
+
+def cache_namespace(tenant_id):
+    """SharedCache namespace of a tenant: its versions, values and run locks never collide with another tenant's."""
+    return f"tenant:{tenant_id or DEFAULT_TENANT}"
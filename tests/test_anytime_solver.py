@@ -0,0 +1,121 @@
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anytime_solver import solve_anytime
+from assignment_engine import solve_greedy
+
+ROLES = ["General Labour", "Carpenter", "Painter", "Cleaner"]
+SHIFTS = ["Morning", "Afternoon", "Night"]
+
+
+def make_problem(seed, num_workers, num_sites, max_workers_per_role=4):
+    rng = random.Random(seed)
+    employees = [{
+        "worker_id": f"W{i:08d}",
+        "role": rng.sample(ROLES, rng.randint(1, 2)),
+        "availability": rng.sample(SHIFTS, rng.randint(0, 2)),
+        "have_car": rng.choice(["Yes", "No"]),
+        "latitude": 43.5 + rng.random() * 0.4,
+        "longitude": -79.7 + rng.random() * 0.6,
+        "rating": rng.randint(1, 5),
+        "fairness_penalty": round(rng.random(), 2)
+    } for i in range(num_workers)]
+    job_sites = [{
+        "site_id": f"S{j:08d}",
+        "latitude": 43.5 + rng.random() * 0.4,
+        "longitude": -79.7 + rng.random() * 0.6,
+        "required_roles": {
+            role: {"num_workers": rng.randint(1, max_workers_per_role), "work_schedule": rng.sample(SHIFTS, 2)}
+            for role in rng.sample(ROLES, 2)
+        }
+    } for j in range(num_sites)]
+    return employees, job_sites
+
+
+def as_previous(picks):
+    return [(pick["employee"]["worker_id"], pick["site"]["site_id"], pick["role"]) for pick in picks]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_no_worker_is_placed_twice(seed):
+    employees, job_sites = make_problem(seed, num_workers=150, num_sites=40)
+    picks, _ = solve_anytime(employees, job_sites, time_budget=0.5, seed=seed)
+
+    workers = Counter(pick["employee"]["worker_id"] for pick in picks)
+    assert workers and max(workers.values()) == 1
+    per_slot = Counter((pick["site"]["site_id"], pick["role"]) for pick in picks)
+    for pick in picks:
+        assert pick["role"] in pick["employee"]["role"]
+        assert per_slot[(pick["site"]["site_id"], pick["role"])] <= pick["site"]["required_roles"][pick["role"]]["num_workers"]
+
+
+def test_warm_start_keeps_valid_placements():
+    employees, job_sites = make_problem(3, num_workers=200, num_sites=30)
+    picks, _ = solve_anytime(employees, job_sites, time_budget=0.5)
+    valid = as_previous(picks)
+    lacking_role = next(e["worker_id"] for e in employees if "Cleaner" not in e["role"])
+    stale = [
+        ("W99999999", job_sites[0]["site_id"], "Painter"),  # Employee gone
+        (valid[0][0], "S99999999", valid[0][2]),  # Site gone
+        (lacking_role, job_sites[0]["site_id"], "Cleaner")  # Role no longer held
+    ]
+
+    reports = []
+    rerun, _ = solve_anytime(employees, job_sites, previous=stale + valid, time_budget=0, on_progress=reports.append)
+
+    assert reports[-1]["kept"] == len(valid)
+    assert set(valid) <= set(as_previous(rerun))
+
+
+def test_budget_is_respected():
+    employees, job_sites = make_problem(4, num_workers=3000, num_sites=400)
+    started = time.monotonic()
+    solve_anytime(employees, job_sites, time_budget=0)
+    setup = time.monotonic() - started  # Ranking and the fills, which always complete
+
+    reports = []
+    started = time.monotonic()
+    solve_anytime(employees, job_sites, time_budget=0.5, on_progress=reports.append)
+
+    assert time.monotonic() - started < 2 * setup + 0.5 + 0.5
+    assert reports[-1]["done"]
+
+
+@pytest.mark.parametrize("seed", [5, 6, 7, 8])
+def test_fill_is_never_below_greedy(seed):
+    # Scarce: more positions than workers, so the fill order decides coverage
+    employees, job_sites = make_problem(seed, num_workers=120, num_sites=60)
+    greedy, _ = solve_greedy(employees, job_sites)
+    picks, _ = solve_anytime(employees, job_sites, time_budget=0.2, seed=seed)
+
+    assert len(picks) >= len(greedy)
+
+
+def test_every_slot_is_ranked_on_a_cold_start_without_budget():
+    employees, job_sites = make_problem(9, num_workers=2000, num_sites=200, max_workers_per_role=2)
+    picks, rankings = solve_anytime(employees, job_sites, time_budget=0)
+
+    demand = sum(role["num_workers"] for site in job_sites for role in site["required_roles"].values())
+    assert len(rankings) == sum(len(site["required_roles"]) for site in job_sites)
+    assert len(picks) == demand
+
+
+def test_progress_reports_the_current_incumbent():
+    employees, job_sites = make_problem(10, num_workers=300, num_sites=60)
+    picks, _ = solve_anytime(employees, job_sites, time_budget=0)
+    previous = as_previous(picks)
+
+    reports = []
+    final, _ = solve_anytime(employees, job_sites, previous=previous, time_budget=0.5, on_progress=reports.append, seed=1)
+
+    for report in reports:
+        assert len(report["picks"]) == report["filled"]
+        assert report["kept"] == len(set(previous) & set(as_previous(report["picks"])))
+    assert as_previous(reports[-1]["picks"]) == as_previous(final)
@@ -0,0 +1,162 @@
+import io
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulk_import
+from bulk_import import EmployeeIndex, RowError, import_records, normalize_employee_row, normalize_job_site_row
+from loadtest.fake_firestore import FakeFirestore
+
+EMPLOYEE = {
+    "worker_id": "", "first_name": " Ana ", "middle_name": "", "sur_name": "Silva", "phone_number": "(416) 555-0101",
+    "home_address": "12  King St W", "have_car": "y", "role": "labourer; Painter", "availability": "day, night",
+    "certificates": "whmis", "skills": "", "rating": ""
+}
+JOB_SITE = {
+    "site_id": "", "site_name": "Tower A", "site_company": "Acme", "site_superintendent": "Sam", "site_contact_number": "1-416-555-0199",
+    "address": "1 Front St", "job_status": "", "work_start_date": "2026-03-01", "work_end_date": "March 31 2026",
+    "Cleaner_workers": "2", "Cleaner_schedule": "day", "Painter_workers": "0", "Labour_workers": ""
+}
+
+
+class Allocator:
+    def __init__(self):
+        self.next, self.calls = 1, []
+
+    def __call__(self, count):
+        self.calls.append(count)
+        first, self.next = self.next, self.next + count
+        return [f"W{value:08d}" for value in range(first, self.next)]
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_import, "CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    return FakeFirestore()
+
+
+def csv_file(rows):
+    return io.BytesIO(pd.DataFrame(rows).to_csv(index=False).encode("utf-8"))
+
+
+def employees(db):
+    return {doc.get("phone_number"): doc.to_dict() for doc in db.collection("employees").stream()}
+
+
+def test_normalize_employee_row():
+    record = normalize_employee_row(EMPLOYEE)
+
+    assert record["first_name"] == "Ana" and record["home_address"] == "12 King St W"
+    assert record["phone_number"] == "+14165550101"
+    assert record["role"] == ["Labour", "Painter"]
+    assert record["availability"] == ["7:00-15:30", "22:00-06:00"]
+    assert record["certificates"] == {"WHMIS": {"issue_date": None, "expiration_date": None}}
+    assert (record["have_car"], record["rating"]) == ("Yes", 3.0)
+
+    for field, value, message in [
+        ("sur_name", "", "required"), ("role", "welder", "Unknown role"), ("phone_number", "555-0101", "Invalid phone"),
+        ("rating", "7", "out of range"), ("home_address", "Toronto", "Invalid home_address")
+    ]:
+        with pytest.raises(RowError, match=message):
+            normalize_employee_row({**EMPLOYEE, field: value})
+
+
+def test_normalize_job_site_row():
+    site = normalize_job_site_row(JOB_SITE)
+
+    assert site["site_contact_number"] == "+14165550199"
+    assert (site["job_status"], site["job_status_key"]) == ("Active", "active")
+    assert site["work_end_date"] == "2026-03-31"
+    assert site["required_roles"] == {"Cleaner": {"work_schedule": ["7:00-15:30"], "num_workers": 2}}
+
+    with pytest.raises(RowError, match="site_company"):
+        normalize_job_site_row({**JOB_SITE, "site_company": " "})
+    with pytest.raises(RowError, match="Cleaner_workers"):
+        normalize_job_site_row({**JOB_SITE, "Cleaner_workers": "two"})
+
+
+def test_employee_index_match(db):
+    db.collection("employees").document("a").set({"worker_id": "W00000001", "phone_number": "+14165550101"})
+    db.collection("employees").document("b").set({"worker_id": "W00000002", "phone_number": "416-555-0102"})
+    index = EmployeeIndex(db.collection("employees"))
+    record = lambda worker_id, phone: {"worker_id": worker_id, "phone_number": phone}
+
+    assert index.match(record("W00000001", "+14165550101")).id == "a"
+    assert index.match(record("", "+14165550102")).id == "b"  # Phone stored in another format
+    assert index.match(record("W00000003", "+14165550103")) is None
+    with pytest.raises(RowError, match="different employees"):
+        index.match(record("W00000001", "+14165550102"))
+    with pytest.raises(RowError, match="belongs to worker_id W00000002"):
+        index.match(record("W00000042", "+14165550102"))  # Would overwrite the stored worker_id
+
+
+def test_update_keeps_stored_certificate_dates(db):
+    dates = {"issue_date": "2025-01-10", "expiration_date": "2028-01-10"}
+    db.collection("employees").document("a").set({
+        "worker_id": "W00000007", "first_name": "Ana", "phone_number": "+14165550101", "certificates": {"WHMIS": dates}
+    })
+
+    result = import_records(db, "employees", csv_file([{**EMPLOYEE, "certificates": "WHMIS; 4 steps"}]), "staff.csv", Allocator())
+
+    assert (result["created"], result["updated"], result["errors"]) == (0, 1, [])
+    stored = employees(db)["+14165550101"]
+    assert stored["worker_id"] == "W00000007"
+    assert stored["certificates"] == {"WHMIS": dates, "4 Steps": {"issue_date": None, "expiration_date": None}}
+
+
+def test_blank_cells_keep_stored_values_on_update(db):
+    stored = {"have_car": "Yes", "availability": ["22:00-06:00"], "rating": 4.5, "skills": ["Forklift"], "middle_name": "Maria"}
+    db.collection("employees").document("a").set({"worker_id": "W00000007", "phone_number": "+14165550101", **stored})
+    sparse = {**EMPLOYEE, "have_car": "", "availability": "", "rating": "", "skills": "", "middle_name": ""}
+
+    result = import_records(db, "employees", csv_file([sparse, {**sparse, "phone_number": "416-555-0102"}]), "staff.csv", Allocator())
+
+    assert (result["created"], result["updated"], result["errors"]) == (1, 1, [])
+    updated, created = employees(db)["+14165550101"], employees(db)["+14165550102"]
+    assert {field: updated[field] for field in stored} == stored
+    assert updated["first_name"] == "Ana"
+    assert (created["have_car"], created["availability"], created["rating"]) == ("No", [], 3.0)  # Defaults on create
+
+
+def test_new_records_get_allocated_ids_once_per_chunk(db):
+    rows = [
+        {**EMPLOYEE, "worker_id": "W00000042", "phone_number": "416-555-0101"},
+        {**EMPLOYEE, "phone_number": "416-555-0102"},
+        {**EMPLOYEE, "phone_number": "416-555-0102", "certificates": "4 steps"},  # Same new worker again
+        {**EMPLOYEE, "phone_number": "416-555-0103"}
+    ]
+    allocate = Allocator()
+
+    result = import_records(db, "employees", csv_file(rows), "staff.csv", allocate, chunk_size=2)
+
+    assert (result["created"], result["updated"]) == (3, 1)
+    assert allocate.calls == [2, 1]  # The repeated worker of chunk 2 needs no ID
+    stored = employees(db)
+    assert sorted(record["worker_id"] for record in stored.values()) == ["W00000001", "W00000002", "W00000003"]
+    assert set(stored["+14165550102"]["certificates"]) == {"WHMIS", "4 Steps"}
+
+
+def test_checkpoint_resumes_after_a_failed_chunk(db):
+    rows = [{**EMPLOYEE, "phone_number": f"416-555-01{i:02d}"} for i in range(5)]
+    rows[1]["role"] = "welder"
+    allocate = Allocator()
+
+    def failing(count):
+        if len(allocate.calls) == 1:
+            raise ConnectionError("Firestore unavailable")
+        return allocate(count)
+
+    with pytest.raises(ConnectionError):
+        import_records(db, "employees", csv_file(rows), "staff.csv", failing, chunk_size=2)
+    assert len(employees(db)) == 1
+
+    result = import_records(db, "employees", csv_file(rows), "staff.csv", allocate, chunk_size=2)
+
+    assert (result["created"], result["rows_done"]) == (4, 5)
+    assert result["errors"] == [{"row": 2, "error": "Unknown role: 'welder'"}]
+    assert len(employees(db)) == 4
+    assert not os.listdir(os.path.join(bulk_import.CHECKPOINT_DIR, "default"))  # Cleared once finished
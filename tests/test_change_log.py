@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import change_log
+from change_log import ChangeLog
+from loadtest.fake_firestore import FakeFirestore
+
+SECOND = 10 ** 9
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000 * SECOND]
+    monkeypatch.setattr(change_log.time, "time_ns", lambda: now[0])
+    return now
+
+
+def test_sequence_ids_sort_in_write_order(clock):
+    log = ChangeLog(FakeFirestore())
+    written = []
+    for step in (1, 9, 90, 900):
+        clock[0] += step
+        written.append(log.append("employee", f"e{step}"))
+
+    assert written == sorted(written)
+    clock[0] += 10 * SECOND
+    entries, _ = log.read()
+    assert [entry["entity_id"] for entry in entries] == ["e1", "e9", "e90", "e900"]
+
+
+def test_read_holds_back_entries_younger_than_the_settle_horizon(clock):
+    log = ChangeLog(FakeFirestore())
+    old = log.append("employee", "a")
+    clock[0] += 5 * SECOND
+    log.append("job_site", "b")
+    clock[0] += 1 * SECOND  # "b" is 1 s old, inside the 2 s horizon
+
+    entries, cursor = log.read(settle_seconds=2.0)
+    assert [entry["entity_id"] for entry in entries] == ["a"] and cursor == old
+
+    clock[0] += 2 * SECOND
+    entries, cursor = log.read(cursor, settle_seconds=2.0)
+    assert [entry["entity_id"] for entry in entries] == ["b"]
+    assert log.read(cursor, settle_seconds=2.0) == ([], cursor)  # Caught up: the cursor stays put
+
+
+def test_cursor_pages_and_entity_filter(clock):
+    log = ChangeLog(FakeFirestore())
+    for i in range(5):
+        clock[0] += 1
+        log.append("employee" if i % 2 else "job_site", str(i))
+    clock[0] += 10 * SECOND
+
+    entries, cursor = log.read(limit=3, entities={"employee"})
+    assert [entry["entity_id"] for entry in entries] == ["1"]  # Filtered after paging, the cursor still covers all 3
+    assert [entry["entity_id"] for entry, _ in log.tail(cursor, batch_size=1)] == ["3", "4"]
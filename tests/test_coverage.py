@@ -0,0 +1,74 @@
+import os
+import sys
+
+from firebase_admin import firestore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firestore_batch import commit_in_chunks
+from loadtest.fake_firestore import FakeFirestore, transactional
+
+firestore.transactional = transactional  # Before coverage is imported, as the load test harness does
+from coverage import UNSCHEDULED, CoverageStore, filled_counts
+
+DAY, NIGHT = "7:00-15:30", "22:00-06:00"
+
+
+def site(site_id, roles):
+    return {"site_id": site_id, "site_name": site_id, "job_status_key": "active", "required_roles": roles}
+
+
+def picks(site_doc, *slots):
+    return [{"site": site_doc, "role": role, "shift": shift} for role, shift in slots]
+
+
+def coverage(store):
+    return {doc["site_id"]: doc for doc in store.sites()}
+
+
+def test_a_new_run_replaces_the_counters_of_the_old_one():
+    db = FakeFirestore()
+    store = CoverageStore(db)
+    s1 = site("S1", {"Cleaner": {"num_workers": 3, "work_schedule": [DAY, NIGHT]}, "Painter": {"num_workers": 1}})
+    s2 = site("S2", {"Cleaner": {"num_workers": 1, "work_schedule": [DAY]}})
+
+    run_1 = picks(s1, ("Cleaner", DAY), ("Cleaner", DAY), ("Painter", None)) + picks(s2, ("Cleaner", DAY))
+    commit_in_chunks(db, store.operations("run-1", [s1, s2], run_1))
+    commit_in_chunks(db, store.operations("run-2", [s1], picks(s1, ("Cleaner", NIGHT))))
+
+    docs = coverage(store)
+    assert list(docs) == ["S1"]  # S2 left the run's sites
+    s1_doc = docs["S1"]
+    assert (s1_doc["run_id"], s1_doc["required"], s1_doc["filled"], s1_doc["open"]) == ("run-2", 4, 1, 3)
+    assert s1_doc["roles"]["Cleaner"]["shifts"] == {DAY: 0, NIGHT: 1}  # Not added to run-1's counts
+    assert (s1_doc["roles"]["Painter"]["filled"], s1_doc["roles"]["Painter"]["open"]) == (0, 1)
+    assert store.totals(docs.values()) == {"required": 4, "filled": 1, "open": 3}
+
+
+def test_surplus_in_one_role_never_covers_another():
+    db = FakeFirestore()
+    store = CoverageStore(db)
+    s1 = site("S1", {"Cleaner": {"num_workers": 1}, "Painter": {"num_workers": 2}})
+
+    commit_in_chunks(db, store.operations("run-1", [s1], picks(s1, ("Cleaner", None), ("Cleaner", None), ("Painter", None))))
+
+    doc = coverage(store)["S1"]
+    assert (doc["required"], doc["filled"], doc["open"]) == (3, 3, 1)
+    assert doc["roles"]["Cleaner"]["shifts"] == {UNSCHEDULED: 2}
+    assert [d["site_id"] for d in store.sites(understaffed_only=True)] == ["S1"]
+
+
+def test_editing_required_roles_keeps_filled_counts():
+    db = FakeFirestore()
+    store = CoverageStore(db)
+    s1 = site("S1", {"Cleaner": {"num_workers": 2, "work_schedule": [DAY]}})
+    commit_in_chunks(db, store.operations("run-1", [s1], picks(s1, ("Cleaner", DAY))))
+
+    store.refresh_site(site("S1", {"Cleaner": {"num_workers": 1, "work_schedule": [DAY]}, "Labour": {"num_workers": 2}}))
+
+    doc = coverage(store)["S1"]
+    assert (doc["run_id"], doc["required"], doc["filled"], doc["open"]) == ("run-1", 3, 1, 2)
+    assert filled_counts(doc) == {("Cleaner", DAY): 1}
+
+    store.refresh_site({**s1, "job_status_key": "completed"})
+    assert coverage(store) == {}
@@ -0,0 +1,75 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import feasibility
+from feasibility import STATUS_FEW_NEARBY, STATUS_OK, STATUS_ROLE_SHORT, _max_flow
+
+DAY = "7:00-15:30"
+
+
+def worker(worker_id, roles, lat=43.65, lon=-79.38):
+    return {"worker_id": worker_id, "role": roles, "availability": [DAY], "latitude": lat, "longitude": lon}
+
+
+def site(site_id, roles, lat=43.65, lon=-79.38):
+    return {
+        "site_id": site_id, "site_name": site_id, "latitude": lat, "longitude": lon,
+        "required_roles": {role: {"num_workers": needed, "work_schedule": [DAY]} for role, needed in roles.items()}
+    }
+
+
+def statuses(result):
+    return {(row["site_id"], row["role"]): row["status"] for row in result["slots"]}
+
+
+def test_max_flow_value_and_residual_reach():
+    capacity = {"s": {"a": 2, "b": 1}, "a": {"t": 1, "b": 5}, "b": {"t": 3}}
+
+    value, reaches_sink = _max_flow(capacity, "s", "t")
+
+    assert value == 3
+    assert reaches_sink == {"t", "a", "b"}  # Both can still push to t; the saturated source cannot
+    assert _max_flow({"s": {"a": 4}}, "s", "t") == (0, {"t"})
+
+
+def test_exact_fit_is_not_short():
+    employees = [worker("W1", ["Cleaner"]), worker("W2", ["Cleaner"]), worker("W3", ["Cleaner", "Painter"]), worker("W4", ["Painter"])]
+    job_sites = [site("S1", {"Cleaner": 3, "Painter": 1})]
+
+    result = feasibility.check(employees, job_sites)
+
+    assert (result["fillable"], result["demand"]) == (4, 4)
+    assert result["short_roles"] == []
+    assert statuses(result) == {("S1", "Cleaner"): STATUS_OK, ("S1", "Painter"): STATUS_OK}
+    assert feasibility.shortfalls(result) == []
+
+
+def test_hall_violation_across_roles_that_share_workers():
+    # Each role alone has enough workers, but Cleaner and Painter need 3 of the same 2 people
+    employees = [worker("W1", ["Cleaner", "Painter"]), worker("W2", ["Cleaner", "Painter"]), worker("W3", ["Labour"])]
+    job_sites = [site("S1", {"Cleaner": 2, "Labour": 1}), site("S2", {"Painter": 1})]
+
+    result = feasibility.check(employees, job_sites)
+
+    assert (result["fillable"], result["demand"]) == (3, 4)
+    assert result["short_roles"] == ["Cleaner", "Painter"]
+    assert (result["short_roles_needed"], result["short_roles_workers"]) == (3, 2)
+    assert {row["role"]: row["short"] for row in result["roles"]} == {"Cleaner": True, "Labour": False, "Painter": True}
+    assert statuses(result) == {
+        ("S1", "Cleaner"): STATUS_ROLE_SHORT, ("S1", "Labour"): STATUS_OK, ("S2", "Painter"): STATUS_ROLE_SHORT
+    }
+
+
+def test_site_without_coordinates_has_nobody_nearby():
+    employees = [worker("W1", ["Cleaner"]), worker("W2", ["Cleaner"], lat=None, lon=None)]
+    job_sites = [site("S1", {"Cleaner": 1}, lat=None, lon=None), site("S2", {"Cleaner": 1})]
+
+    result = feasibility.check(employees, job_sites)
+
+    rows = {row["site_id"]: row for row in result["slots"]}
+    assert (rows["S1"]["available_nearby"], rows["S1"]["site_available_nearby"]) == (0, 0)
+    assert rows["S1"]["status"] == STATUS_FEW_NEARBY
+    assert (rows["S2"]["available_nearby"], rows["S2"]["status"]) == (1, STATUS_OK)  # The worker without coordinates is not near
+    assert result["fillable"] == 2
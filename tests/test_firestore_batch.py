@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+from google.api_core.exceptions import AlreadyExists
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firestore_batch import commit_groups
+from loadtest.fake_firestore import FakeFirestore
+
+
+def test_groups_are_never_split_across_batches():
+    db = FakeFirestore()
+    batches = []
+    batch = db.batch
+
+    def counted():
+        batches.append(batch())
+        return batches[-1]
+
+    db.batch = counted
+    docs = db.collection("docs")
+    groups = [[("set", docs.document(f"{i}-{j}"), {"i": i}) for j in range(3)] for i in range(5)]
+
+    assert commit_groups(db, groups, chunk_size=7) == 15
+    assert len(batches) == 3  # 6 + 6 + 3 writes: a third group never fits beside two others
+    with pytest.raises(ValueError):
+        commit_groups(db, [[("set", docs.document(str(j)), {}) for j in range(8)]], chunk_size=7)
+
+
+def test_a_failed_batch_leaves_earlier_groups_committed_and_later_ones_unwritten():
+    db = FakeFirestore()
+    docs = db.collection("docs")
+    docs.document("taken").set({})
+    groups = [
+        [("set", docs.document("a"), {}), ("set", docs.document("b"), {})],
+        [("set", docs.document("c"), {}), ("create", docs.document("taken"), {})],
+        [("set", docs.document("d"), {})]
+    ]
+
+    with pytest.raises(AlreadyExists):
+        commit_groups(db, groups, chunk_size=2)
+
+    assert sorted(doc.id for doc in docs.stream()) == ["a", "b", "taken"]
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+from firebase_admin import firestore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest.fake_firestore import FakeFirestore, transactional
+
+firestore.transactional = transactional  # Before id_allocator is imported, as the load test harness does
+from id_allocator import IdAllocator
+
+
+@pytest.fixture
+def db():
+    db = FakeFirestore()
+    transaction = db.transaction
+    db.transactions = 0
+
+    def counted():
+        db.transactions += 1
+        return transaction()
+
+    db.transaction = counted
+    return db
+
+
+def test_next_id_leases_one_block_per_block_size(db):
+    allocator = IdAllocator(db, "worker_id", prefix="W", width=8, block_size=5)
+
+    ids = [allocator.next_id() for _ in range(12)]
+
+    assert ids[:3] == ["W00000001", "W00000002", "W00000003"]
+    assert len(set(ids)) == 12
+    assert db.transactions == 3
+    assert db.collection("counters").document("worker_id").get().get("next_value") == 16
+
+
+def test_allocate_uses_the_rest_of_a_block_before_leasing(db):
+    allocator = IdAllocator(db, "site_id", prefix="SITE", start=10000, block_size=10)
+    first = allocator.next_id()
+
+    ids = allocator.allocate(25)
+
+    assert first == "SITE10000"
+    assert ids == [f"SITE{value}" for value in range(10001, 10026)]
+    assert db.transactions == 2  # The first block, then only the 16 IDs the block could not cover
+    assert allocator.next_id() == "SITE10026"
+    assert db.transactions == 3
+    assert allocator.allocate(0) == []
+
+
+def test_two_allocators_never_reuse_an_id(db):
+    first = IdAllocator(db, "worker_id", prefix="W", width=8, block_size=4)
+    second = IdAllocator(db, "worker_id", prefix="W", width=8, block_size=4)
+
+    ids = [first.next_id(), second.next_id(), first.next_id(), *second.allocate(6), *first.allocate(3), second.next_id()]
+
+    assert len(ids) == len(set(ids))
+    assert ids[:2] == ["W00000001", "W00000005"]  # Each leased its own block
@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations
+from document_schema import SCHEMA_VERSIONS
+from loadtest.fake_firestore import FakeFirestore
+
+LEGACY_EMPLOYEE = {"worker_id": "W1", "role": "labourer", "certificates": ["whmis"], "have_car": True, "rating": "4"}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(migrations, "_finished", {})
+    db = FakeFirestore()
+    for i in range(5):
+        db.collection("employees").document(f"e{i}").set({**LEGACY_EMPLOYEE, "worker_id": f"W{i}"})
+    db.collection("employees").document("new").set({"worker_id": "W9", "role": ["Painter"], "schema_version": SCHEMA_VERSIONS["employees"]})
+    return db
+
+
+def test_migrate_upgrades_once_and_a_rerun_is_a_no_op(db):
+    first = migrations.migrate(db, "employees", chunk_size=2)
+
+    assert (first["scanned"], first["upgraded"]) == (6, 5)
+    stored = db.collection("employees").document("e0").get().to_dict()
+    assert (stored["role"], stored["have_car"], stored["rating"]) == (["Labour"], "Yes", 4.0)
+    assert stored["certificates"] == {"WHMIS": {"issue_date": None, "expiration_date": None}}
+
+    db.reset_ops()
+    assert migrations.migrate(db, "employees") == first  # Finished at this version: only the checkpoint is read
+    assert db.ops["writes"] == 0
+
+    again = migrations.migrate(db, "employees", restart=True)
+    assert (again["scanned"], again["upgraded"], again["fields"]) == (6, 0, {})
+
+
+def test_a_dry_run_writes_nothing(db):
+    summary = migrations.migrate(db, "employees", dry_run=True)
+
+    assert summary["upgraded"] == 5 and summary["fields"]["role"] == 5
+    assert db.collection("employees").document("e0").get().to_dict()["role"] == "labourer"
+    assert not migrations.finished(db, "employees")
+
+
+class Stopped(Exception):
+    pass
+
+
+def stop_after_first_page(state):
+    if state["scanned"] >= 2:
+        raise Stopped()
+
+
+def test_finished_gates_on_a_completed_checkpoint_at_the_current_version(db):
+    assert not migrations.finished(db, "employees")
+
+    with pytest.raises(Stopped):
+        migrations.migrate(db, "employees", chunk_size=2, on_progress=stop_after_first_page)
+    migrations._finished.clear()
+    assert not migrations.finished(db, "employees")  # Stopped halfway: readers keep upgrading in memory
+
+    resumed = migrations.migrate(db, "employees", chunk_size=2)
+    assert (resumed["scanned"], resumed["upgraded"]) == (6, 5)  # Continued after the committed page
+    db.reset_ops()
+    assert migrations.finished(db, "employees")
+    assert db.ops["reads"] == 0  # Known finished: page loads no longer read the checkpoint
+
+    checkpoint = db.collection(migrations.CHECKPOINTS).document("employees")
+    checkpoint.update({"schema_version": SCHEMA_VERSIONS["employees"] - 1})
+    migrations._finished.clear()  # As in a process started after the schema version changed
+    assert not migrations.finished(db, "employees")  # Finished at an older version only
+
+
+def test_an_unfinished_answer_is_rechecked_after_a_while(db, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(migrations.time, "monotonic", lambda: now[0])
+    assert not migrations.finished(db, "employees")
+
+    # Another process (the migration CLI) finishes the migration
+    db.collection(migrations.CHECKPOINTS).document("employees").set({"finished_at": "2026-01-01T00:00:00", "schema_version": SCHEMA_VERSIONS["employees"]})
+
+    db.reset_ops()
+    assert not migrations.finished(db, "employees") and db.ops["reads"] == 0
+    now[0] += migrations.FINISHED_RECHECK_SECONDS
+    assert migrations.finished(db, "employees")
@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import record_updates
+from loadtest.fake_firestore import FakeFirestore
+from record_updates import StaleEditError, update_changed_fields
+
+
+@pytest.fixture
+def events(monkeypatch):
+    received = []
+    monkeypatch.setattr(record_updates, "_listeners", {})
+    record_updates.subscribe(received.append, key="test")
+    return received
+
+
+def test_only_changed_fields_are_written(events):
+    db = FakeFirestore()
+    ref = db.collection("employees").document("a")
+    ref.set({"first_name": "Ana", "rating": 3.0})
+    original = ref.get().to_dict()
+
+    assert update_changed_fields(db, ref, "employee", original, {**original}) == {}
+    assert update_changed_fields(db, ref, "employee", original, {**original, "rating": 4.5}, actor="admin") == {"rating": 4.5}
+    assert ref.get().to_dict() == {"first_name": "Ana", "rating": 4.5}
+    assert [(e["entity_id"], e["changed_fields"], e["actor"]) for e in events] == [("a", ["rating"], "admin")]
+
+
+@pytest.mark.parametrize("with_related", [False, True])
+def test_a_concurrent_edit_raises_stale_edit_error(events, with_related):
+    db = FakeFirestore()
+    copy_ref = db.collection("my_assignments").document("a")
+    related = (lambda changes: [("merge", copy_ref, changes)]) if with_related else None
+    ref = db.collection("employees").document("a")
+    ref.set({"first_name": "Ana", "rating": 3.0})
+    loaded = ref.get()
+    ref.update({"rating": 5.0})  # Someone else saves first
+
+    with pytest.raises(StaleEditError, match="modified or deleted"):
+        update_changed_fields(db, ref, "employee", loaded.to_dict(), {**loaded.to_dict(), "first_name": "Anna"},
+                              loaded_update_time=loaded.update_time, related=related)
+
+    assert ref.get().to_dict() == {"first_name": "Ana", "rating": 5.0}
+    assert not copy_ref.get().exists  # Related writes share the failed batch
+    assert events == []
+
+
+def test_an_edit_of_a_deleted_record_raises_stale_edit_error(events):
+    db = FakeFirestore()
+    ref = db.collection("employees").document("a")
+    ref.set({"first_name": "Ana"})
+    loaded = ref.get()
+    ref.delete()
+
+    with pytest.raises(StaleEditError):
+        update_changed_fields(db, ref, "employee", loaded.to_dict(), {"first_name": "Anna"}, loaded_update_time=loaded.update_time)
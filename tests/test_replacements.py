@@ -0,0 +1,45 @@
+import os
+import sys
+
+from firebase_admin import firestore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest.fake_firestore import FakeFirestore, transactional
+
+firestore.transactional = transactional  # Before replacements is imported, as the load test harness does
+from explanations import STATUS_ASSIGNED, STATUS_NOT_REACHED, STATUS_REPLACED, ExplanationStore, describe
+from replacements import assign_replacement, find_vacated
+
+RUN_ID = "run-1"
+SITE = {"site_id": "S00000001", "site_name": "Tower A", "address": "1 Front St", "required_roles": {"Cleaner": {"num_workers": 1}}}
+
+
+def employee(worker_id):
+    return {"worker_id": worker_id, "first_name": worker_id, "role": ["Cleaner"], "availability": ["7:00-15:30"]}
+
+
+def test_replacement_rewrites_the_slot_explanation():
+    db = FakeFirestore()
+    store = ExplanationStore(db)
+    db.collection("job_sites").document("site").set(SITE)
+    for worker_id in ("W1", "W2", "W3"):
+        db.collection("employees").document(f"doc-{worker_id}").set(employee(worker_id))
+    db.collection("assignments").add({
+        "run_id": RUN_ID, "employee_id": "W1", "job_site_id": SITE["site_id"], "role": "Cleaner", "shift": "7:00-15:30"
+    })
+    db.collection("my_assignments").document("doc-W1").set({"run_id": RUN_ID, "worker_id": "W1"})
+    ranking = [{"employee": employee(worker_id), "score": 9 - rank, "distance": 1.0 + rank} for rank, worker_id in enumerate(("W1", "W2", "W3"))]
+    picks = [{"employee": ranking[0]["employee"], "site": SITE, "role": "Cleaner"}]
+    for _, ref, table in store.operations(RUN_ID, picks, {(SITE["site_id"], "Cleaner"): ranking}):
+        ref.set(table)
+
+    snapshot, vacated_doc_id = find_vacated(db, RUN_ID, "W1")
+    candidate = {"worker_id": "W2", "doc_id": "doc-W2", "distance": 2.0}
+    assign_replacement(db, RUN_ID, snapshot, vacated_doc_id, candidate, explanation_store=store)
+
+    table = store.slot(RUN_ID, SITE["site_id"], "Cleaner")
+    assert table["status"] == [STATUS_REPLACED, STATUS_ASSIGNED, STATUS_NOT_REACHED]
+    assert describe(table, "W2").endswith("Assigned here.")
+    assert describe(table, "W1").endswith("then replaced by another worker.")
+    assert [row["worker_id"] for row in store.next_best(RUN_ID, SITE["site_id"], "Cleaner")] == ["W3"]
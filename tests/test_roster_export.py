@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest.fake_firestore import FakeFirestore
+from roster_export import iter_roster_rows
+
+
+def test_rows_of_other_runs_are_left_out():
+    db = FakeFirestore()
+    db.collection("job_sites").add({"site_id": "S1", "site_name": "Tower A", "site_superintendent": "Sam"})
+    db.collection("employees").add({"worker_id": "W1", "first_name": "Ana", "sur_name": "Silva", "phone_number": "+14165550101"})
+    db.collection("employees").add({"worker_id": "W2", "first_name": "Ben", "sur_name": "Cole", "phone_number": "+14165550102"})
+    for run_id, worker_id in (("old", "W1"), ("new", "W2")):  # Both present until the old run is deleted
+        db.collection("assignments").add({"run_id": run_id, "job_site_id": "S1", "employee_id": worker_id, "role": "Cleaner", "distance": 1.234})
+
+    rows = list(iter_roster_rows(db, "new"))
+
+    assert [(row["Worker ID"], row["Full Name"], row["Distance (km)"]) for row in rows] == [("W2", "Ben Cole", 1.23)]
+    assert rows[0]["Group"] == "Tower A (S1)"
@@ -0,0 +1,147 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest.fake_redis import FakeRedisServer
+from shared_cache import InProcessBackend, LockBusy, RedisBackend, SharedCache, backend_from_url
+
+
+@pytest.fixture
+def redis_server():
+    with FakeRedisServer() as server:
+        yield server
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    if request.param == "memory":
+        yield SharedCache(backend_from_url("memory://"))
+    else:
+        server = request.getfixturevalue("redis_server")
+        yield SharedCache(backend_from_url(server.url))
+
+
+def test_backend_from_url(redis_server):
+    assert isinstance(backend_from_url(None), InProcessBackend)
+    backend = backend_from_url("redis://:secret@cache.internal:6380/2")
+    assert isinstance(backend, RedisBackend)
+    assert (backend.host, backend.port, backend.db, backend.password) == ("cache.internal", 6380, 2, "secret")
+    with pytest.raises(ValueError):
+        backend_from_url("memcached://localhost")
+
+
+def test_values_round_trip(cache):
+    assert cache.get("missing", "default") == "default"
+    cache.set("frame", {"rows": [1, 2, 3]})
+    assert cache.get("frame") == {"rows": [1, 2, 3]}
+    assert cache.delete("frame", "missing") == 1
+    assert cache.get("frame") is None
+
+
+def test_ttl_expires(cache):
+    cache.set("short", 1, ttl=0.05)
+    assert cache.get("short") == 1
+    time.sleep(0.1)
+    assert cache.get("short") is None
+
+
+def test_get_or_load_calls_loader_once(cache):
+    calls = []
+    loader = lambda: calls.append(1) or "value"
+    assert cache.get_or_load("key", loader) == "value"
+    assert cache.get_or_load("key", loader) == "value"
+    assert len(calls) == 1
+
+
+def test_versions_are_shared_between_instances(cache):
+    other = SharedCache(cache.backend)  # A second replica on the same backend
+    assert cache.version("employees") == 0
+    assert cache.bump("employees") == 1
+    assert other.version("employees") == 1
+
+
+def test_scoped_namespaces_do_not_collide(cache):
+    acme, globex = cache.scoped("tenant:acme"), cache.scoped("tenant:globex")
+    acme.set("table", "acme rows")
+    acme.bump("employees")
+    assert globex.get("table") is None
+    assert globex.version("employees") == 0
+    with acme.lock("run"):
+        with globex.lock("run"):
+            pass
+
+
+def test_lock_is_exclusive_and_released(cache):
+    with cache.lock("run"):
+        with pytest.raises(LockBusy):
+            with cache.lock("run"):
+                pass
+    with cache.lock("run"):  # Released on exit
+        pass
+
+
+def test_lock_expires_and_only_holder_releases(cache):
+    with cache.lock("run", ttl=0.05):
+        time.sleep(0.1)  # Holder stalls past the TTL; another process takes over
+        with cache.lock("run"):
+            pass
+    with cache.lock("run", ttl=5):
+        other = SharedCache(cache.backend)
+        with pytest.raises(LockBusy):
+            with other.lock("run"):
+                pass
+
+
+def test_lock_is_exclusive_across_threads(cache):
+    acquired, barrier = [], threading.Barrier(8)
+
+    def contend():
+        barrier.wait()
+        try:
+            with cache.lock("run"):
+                acquired.append(1)
+                time.sleep(0.05)
+        except LockBusy:
+            pass
+
+    threads = [threading.Thread(target=contend) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(acquired) >= 1
+    assert len(acquired) < 8
+
+
+def test_redis_reconnects_after_dropped_connection(redis_server):
+    cache = SharedCache(backend_from_url(redis_server.url))
+    cache.set("key", "before")
+    redis_server.drop_connections()
+    assert cache.get("key") == "before"
+
+
+def test_redis_password_and_db(redis_server):
+    redis_server.password = "secret"
+    with pytest.raises(RuntimeError):
+        SharedCache(RedisBackend(redis_server.host, redis_server.port, password="wrong")).get("key")
+    db0 = SharedCache(RedisBackend(redis_server.host, redis_server.port, password="secret"))
+    db1 = SharedCache(RedisBackend(redis_server.host, redis_server.port, db=1, password="secret"))
+    db0.set("key", "zero")
+    assert db1.get("key") is None
+
+
+def test_redis_lock_survives_a_lost_reply(redis_server):
+    cache = SharedCache(backend_from_url(redis_server.url))
+    redis_server.lose_next_reply("SET")  # SET ... NX runs, then the connection drops before its reply
+    with cache.lock("assignment_run", ttl=60):
+        with pytest.raises(LockBusy):
+            with cache.lock("assignment_run"):
+                pass
+    with cache.lock("assignment_run"):  # Released by its holder, not left to the TTL
+        pass
+
@@ -0,0 +1,80 @@
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest.fake_firestore import FakeFirestore
+from worker_stats import (
+    FAIRNESS_LOAD_POINTS, HALF_LIFE_DAYS, STREAK_POINTS, fairness_penalties, shift_hours, update_operations, updated_stats,
+    vacated_stats
+)
+
+DAY, NIGHT = "7:00-15:30", "22:00-06:00"
+START = date(2026, 3, 2)
+
+
+def test_shift_hours():
+    assert shift_hours(DAY) == 8.5
+    assert shift_hours(NIGHT) == 8  # Wraps past midnight
+    assert shift_hours("Morning") == 8  # Unparseable: the default
+
+
+def test_hours_decay_by_half_life_when_a_new_day_rolls_over():
+    first = updated_stats({}, "W1", DAY, START)
+    later = updated_stats(first, "W1", DAY, START + timedelta(days=HALF_LIFE_DAYS))
+
+    assert (first["hours_assigned"], first["consecutive_days"], first["total_assignments"]) == (8.5, 1, 1)
+    assert later["hours_assigned"] == 8.5 / 2 + 8.5
+    assert (later["hours_on_last_date"], later["consecutive_days"], later["total_assignments"]) == (8.5, 1, 2)
+    assert later["previous_assigned_date"] == START.isoformat()
+
+
+def test_consecutive_days_and_same_day_reruns():
+    first = updated_stats({}, "W1", DAY, START)
+    second = updated_stats(first, "W1", DAY, START + timedelta(days=1))
+    rerun = updated_stats(second, "W1", NIGHT, START + timedelta(days=1))  # Replaces that day's hours
+
+    assert second["consecutive_days"] == 2
+    assert (rerun["hours_assigned"], rerun["consecutive_days"], rerun["total_assignments"]) == (second["hours_assigned"] - 0.5, 2, 2)
+    assert rerun["previous_assigned_date"] == START.isoformat()
+
+
+def test_a_dropped_same_day_assignment_is_undone_at_the_previous_date():
+    first = updated_stats({}, "W1", DAY, START)
+    today = START + timedelta(days=HALF_LIFE_DAYS)
+    current = updated_stats(first, "W1", DAY, today)
+
+    (_, _, rolled_back), = update_operations(FakeFirestore(), {"W1": current}, [], today)
+
+    assert rolled_back["hours_assigned"] == pytest.approx(8.5)  # The remaining half, re-expressed at START
+    assert (rolled_back["last_assigned_date"], rolled_back["hours_on_last_date"]) == (START.isoformat(), None)
+    assert (rolled_back["consecutive_days"], rolled_back["total_assignments"]) == (1, 1)
+    # The next update decays from START once, as if the dropped day never happened
+    again = updated_stats(rolled_back, "W1", DAY, today)
+    assert again["hours_assigned"] == current["hours_assigned"]
+
+
+def test_vacating_an_older_shift_takes_off_its_decayed_hours():
+    first = updated_stats({}, "W1", DAY, START)
+    current = updated_stats(first, "W1", DAY, START + timedelta(days=HALF_LIFE_DAYS))
+
+    vacated = vacated_stats(current, DAY, START, START + timedelta(days=HALF_LIFE_DAYS))
+
+    assert vacated["hours_assigned"] == 8.5  # Today's shift only
+    assert vacated["last_assigned_date"] == current["last_assigned_date"]
+
+
+def test_fairness_penalties():
+    today = START + timedelta(days=5)
+    loaded = {"hours_assigned": 80.0, "last_assigned_date": today.isoformat(), "hours_on_last_date": 0.0}
+    streak = {"hours_assigned": 0.0, "last_assigned_date": (today - timedelta(days=1)).isoformat(), "consecutive_days": 5}
+    faded = {"hours_assigned": 40.0, "last_assigned_date": (today - timedelta(days=2 * HALF_LIFE_DAYS)).isoformat()}
+    employees = [{"worker_id": worker_id} for worker_id in ("loaded", "streak", "faded", "new")]
+
+    penalties = fairness_penalties(employees, {"loaded": loaded, "streak": streak, "faded": faded}, today)
+
+    assert list(penalties) == [FAIRNESS_LOAD_POINTS, STREAK_POINTS, FAIRNESS_LOAD_POINTS / 4, 0.0]
+
@@ -0,0 +1,174 @@
+from datetime import date, datetime
+
+import numpy as np
+
+# ✅ Fairness weights (subtracted from the assignment score)
+FAIRNESS_LOAD_POINTS = 3      # Penalty for a worker at (or above) FULL_LOAD_HOURS of recent work
+FULL_LOAD_HOURS = 40
+STREAK_POINTS = 2             # Penalty once a worker has worked MAX_CONSECUTIVE_DAYS in a row
+MAX_CONSECUTIVE_DAYS = 5
+HALF_LIFE_DAYS = 14           # Recent hours halve every two weeks, so old work stops counting
+DEFAULT_SHIFT_HOURS = 8
+
+
+def shift_hours(shift):
+    """Length of a "7:00-15:30" style shift in hours (overnight shifts wrap); DEFAULT_SHIFT_HOURS if unparseable."""
+    try:
+        start, end = [datetime.strptime(part.strip(), "%H:%M") for part in str(shift).split("-")]
+    except ValueError:
+        return DEFAULT_SHIFT_HOURS
+    minutes = (end - start).total_seconds() / 60 % (24 * 60)
+    return minutes / 60 or DEFAULT_SHIFT_HOURS
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value) if value else None
+
+
+def _decayed(hours, since, today):
+    if not since or not hours:
+        return 0.0
+    return hours * 0.5 ** (max((today - since).days, 0) / HALF_LIFE_DAYS)
+
+
+def load(db, collection="worker_stats"):
+    """All rolling aggregates keyed by worker_id (one small document per worker, no assignment history)."""
+    return {doc.id: doc.to_dict() for doc in db.collection(collection).stream()}
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Vectorized penalties, computed once per run
+
+def fairness_penalties(employees, stats, today=None):
+    """Penalty per employee (numpy array aligned with `employees`) from their rolling aggregates."""
+    today = today or date.today()
+    rows = [stats.get(employee.get('worker_id')) or {} for employee in employees]
+    hours = np.array([row.get('hours_assigned', 0.0) for row in rows], dtype=float)
+    days_since = np.array([
+        (today - last).days if (last := _as_date(row.get('last_assigned_date'))) else np.inf
+        for row in rows
+    ], dtype=float)
+    streak = np.array([row.get('consecutive_days', 0) for row in rows], dtype=float)
+
+    # ✅ A rerun on the same day ignores that day's own earlier assignment
+    same_day = days_since == 0
+    hours = hours - np.where(same_day, [row.get('hours_on_last_date') or 0.0 for row in rows], 0.0)
+    streak = np.where(same_day, streak - 1, streak)
+    decay_days = np.where(same_day, 0.0, days_since)  # Stored hours are already decayed to that day
+    days_since = np.where(same_day, [
+        (today - prev).days if (prev := _as_date(row.get('previous_assigned_date'))) else np.inf
+        for row in rows
+    ], days_since)
+
+    recent_hours = np.where(np.isinf(decay_days), 0.0, hours * np.power(0.5, np.clip(decay_days, 0, 1e6) / HALF_LIFE_DAYS))
+    load_penalty = FAIRNESS_LOAD_POINTS * np.minimum(recent_hours / FULL_LOAD_HOURS, 1.0)
+    streak_penalty = np.where((streak >= MAX_CONSECUTIVE_DAYS) & (days_since <= 1), STREAK_POINTS, 0.0)
+    return np.round(load_penalty + streak_penalty, 2)
+
+
+def apply_fairness(employees, stats, today=None):
+    """Stores each employee's penalty on the employee dict, where score_candidates() picks it up."""
+    for employee, penalty in zip(employees, fairness_penalties(employees, stats, today)):
+        employee['fairness_penalty'] = float(penalty)
+    return employees
+
+
+#----------------------------------------------------------------------------------------
+
+# ✅ Incremental updates, written in the same batches as the assignments
+
+def updated_stats(current, worker_id, shift, today):
+    """
+    New aggregates after assigning one shift on `today`. A rerun on the same
+    day replaces that day's hours instead of adding to them.
+    """
+    current = current or {}
+    last = _as_date(current.get('last_assigned_date'))
+    hours_today = shift_hours(shift)
+    if last == today:
+        base = current.get('hours_assigned', 0.0) - (current.get('hours_on_last_date') or 0.0)
+        consecutive = current.get('consecutive_days', 1)
+        total = current.get('total_assignments', 1)
+    else:
+        base = _decayed(current.get('hours_assigned', 0.0), last, today)
+        consecutive = current.get('consecutive_days', 0) + 1 if last and (today - last).days == 1 else 1
+        total = current.get('total_assignments', 0) + 1
+    return {
+        'worker_id': worker_id,
+        'hours_assigned': round(base + hours_today, 2),
+        'hours_on_last_date': hours_today,
+        'last_assigned_date': today.isoformat(),
+        'previous_assigned_date': current.get('previous_assigned_date') if last == today else current.get('last_assigned_date'),
+        'consecutive_days': consecutive,
+        'total_assignments': total
+    }
+
+
+def _unassigned_today(current, today):
+    """
+    Undoes the latest assignment day (an earlier same-day run that no longer
+    assigns this worker, or a vacated shift on that day). The remaining hours
+    are re-expressed at the previous date, which becomes the latest again, so
+    the next update decays them only once. The day before it is not kept:
+    the rolled-back aggregates have no previous date and an unknown
+    `hours_on_last_date` (None).
+    """
+    last, previous = _as_date(current.get('last_assigned_date')), _as_date(current.get('previous_assigned_date'))
+    remaining = max(current.get('hours_assigned', 0.0) - (current.get('hours_on_last_date') or 0.0), 0.0)
+    return {
+        **current,
+        'hours_assigned': round(remaining * 0.5 ** (-(last - previous).days / HALF_LIFE_DAYS), 2) if last and previous else 0.0,
+        'hours_on_last_date': None,
+        'last_assigned_date': previous.isoformat() if previous else None,
+        'previous_assigned_date': None,
+        'consecutive_days': max(current.get('consecutive_days', 1) - 1, 1 if previous else 0),
+        'total_assignments': max(current.get('total_assignments', 1) - 1, 0)
+    }
+
+
+def update_operations(db, stats, picks, today=None, collection="worker_stats"):
+    """
+    Batch operations that roll the aggregates forward for a run's picks: one
+    per pick, in pick order, then one per worker whose same-day assignment the run dropped.
+    """
+    today = today or date.today()
+    stats_ref = db.collection(collection)
+    picked = set()
+    operations = []
+    for pick in picks:
+        worker_id = pick['employee']['worker_id']
+        picked.add(worker_id)
+        current = stats.get(worker_id) or {}
+        data = updated_stats(current, worker_id, pick['shift'], today)
+        operations.append(("set", stats_ref.document(worker_id), data))
+
+    for worker_id, current in stats.items():
+        if worker_id not in picked and current.get('last_assigned_date') == today.isoformat():
+            operations.append(("set", stats_ref.document(worker_id), _unassigned_today(current, today)))
+    return operations
+
+
+def vacated_stats(current, shift, assigned_on, today):
+    """
+    Aggregates after a worker drops a shift that was counted on `assigned_on`
+    (date or datetime):
+    that day is undone if it is still their latest (and its hours are known),
+    otherwise the shift's hours (decayed to their latest assignment day) are
+    taken off.
+    """
+    current, assigned_on = current or {}, _as_date(assigned_on)
+    last = _as_date(current.get('last_assigned_date'))
+    if not last:
+        return current
+    if last == assigned_on and current.get('hours_on_last_date') is not None:
+        return _unassigned_today(current, today)
+    return {
+        **current,
+        'hours_assigned': round(max(current.get('hours_assigned', 0.0) - _decayed(shift_hours(shift), assigned_on, last), 0.0), 2),
+        'total_assignments': max(current.get('total_assignments', 1) - 1, 0)
+    }